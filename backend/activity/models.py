@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
@@ -19,6 +20,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # pagination keyset
+        ]
+
     def __str__(self):
         return f"Comment by {self.user.username} on {self.content_object}"
 
@@ -69,7 +75,17 @@ class AuditLog(models.Model):
     content_object = GenericForeignKey('content_type', 'object_id')
     
     details = models.JSONField(default=dict)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=500, blank=True)
+    # When the event was recorded, not when its buffered row was written (audit.pipeline)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id']),  # pagination keyset
+            # Activity feed for a given object, newest first
+            models.Index(fields=['content_type', 'object_id', 'timestamp'], name='auditlog_object_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username if self.user else 'System'} - {self.action} at {self.timestamp}"
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
 from .models import Comment, Attachment, AuditLog
 from users.serializers import UserSerializer
@@ -37,9 +38,66 @@ class AttachmentSerializer(serializers.ModelSerializer):
             validated_data['content_type'] = content_type
         return super().create(validated_data)
 
+def _references(details):
+    """Foreign key changes (see audit.pipeline.change) in an event's details"""
+    if not isinstance(details, dict):
+        return
+    for key, value in details.items():
+        if key == 'changes':
+            yield from _references(value)
+        elif isinstance(value, dict) and 'ref' in value:
+            yield value
+
+
+def reference_names(logs):
+    """{(model label, id): name} for the foreign keys changed in `logs`, one query per model"""
+    ids = {}
+    for log in logs:
+        for delta in _references(log.details):
+            ids.setdefault(delta['ref'], set()).update(pk for pk in (delta['old'], delta['new']) if pk is not None)
+    names = {}
+    for label, pks in ids.items():
+        objects = apps.get_model(label)._default_manager.in_bulk(pks)
+        names.update({(label, pk): str(obj) for pk, obj in objects.items()})
+    return names
+
+
+def readable_details(details, names):
+    """Copy of `details` with foreign key ids replaced by names; deleted rows keep their id"""
+    def name(label, pk):
+        if pk is None:
+            return 'Unassigned' if label == 'users.user' else 'None'
+        return names.get((label, pk), str(pk))
+
+    def resolve(value):
+        if isinstance(value, dict) and 'ref' in value:
+            return {'old': name(value['ref'], value['old']), 'new': name(value['ref'], value['new'])}
+        if isinstance(value, dict):
+            return {key: resolve(item) for key, item in value.items()}
+        return value
+
+    return resolve(details)
+
+
+class AuditLogListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        logs = list(data.all() if hasattr(data, 'all') else data)
+        self.context['reference_names'] = reference_names(logs)
+        return super().to_representation(logs)
+
+
 class AuditLogSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
     
     class Meta:
         model = AuditLog
         fields = ['id', 'user', 'user_details', 'action', 'content_type', 'object_id', 'details', 'timestamp']
+        list_serializer_class = AuditLogListSerializer
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        names = self.context.get('reference_names')
+        if names is None:
+            names = reference_names([instance])
+        data['details'] = readable_details(instance.details, names)
+        return data
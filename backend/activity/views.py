@@ -45,6 +45,7 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = AuditLog.objects.all().order_by('-timestamp')
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from audit import pipeline
+
+
+class Command(BaseCommand):
+    help = "Bulk load audit events spilled to AUDIT_SPILL_DIR during past hours into the audit log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Segment directory (defaults to AUDIT_SPILL_DIR)")
+
+    def handle(self, *args, **options):
+        spill_dir = options['dir'] or getattr(settings, 'AUDIT_SPILL_DIR', None)
+        if not spill_dir:
+            raise CommandError("Set AUDIT_SPILL_DIR or pass --dir")
+        loaded = pipeline.load_segments(spill_dir)
+        self.stdout.write(f"Loaded {loaded} audit event(s)")
@@ -0,0 +1,12 @@
+from . import pipeline
+
+
+class AuditContextMiddleware:
+    """Opens the audit context of each request; its events are written in one insert at the end"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with pipeline.context(request):
+            return self.get_response(request)
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 11:49
+
+from django.db import migrations
+
+
+def copy_to_activity(apps, schema_editor):
+    """Move rows of the retired audit.AuditLog into activity.AuditLog, the single audit store"""
+    OldAuditLog = apps.get_model('audit', 'AuditLog')
+    AuditLog = apps.get_model('activity', 'AuditLog')
+    logs = []
+    for old in OldAuditLog.objects.iterator(chunk_size=1000):
+        details = {'changes': old.changes}
+        object_id = int(old.object_id) if old.object_id.isdigit() else None
+        if object_id is None and old.object_id:
+            details['object_id'] = old.object_id
+        logs.append(AuditLog(
+            user_id=old.actor_id,
+            action=old.action,
+            content_type_id=old.content_type_id,
+            object_id=object_id,
+            details=details,
+            ip_address=old.ip_address,
+            user_agent=old.user_agent,
+            timestamp=old.timestamp,
+        ))
+    AuditLog.objects.bulk_create(logs, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0007_auditlog_ip_address_auditlog_user_agent_and_more'),
+        ('audit', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_activity, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='AuditLog',
+        ),
+    ]
@@ -0,0 +1,183 @@
+"""
+Audit pipeline: every audit event is written through `record()`.
+
+activity.AuditLog is the single audit store. AuditContextMiddleware opens a
+context for each request. Events recorded inside it take the actor (unless
+one is given), IP address and user agent from the request. They are held
+until their transaction commits (events of a rolled back transaction are
+dropped) and written with one bulk_create when the request finishes, or
+earlier with `flush()`. Outside any context, committed events are written
+straight away; `with context():` gives commands and workers the same batching.
+
+With AUDIT_SPILL_DIR set, events are appended to hourly JSONL segment files
+instead of the table, and `manage.py load_audit_segments` bulk loads the
+segments of past hours.
+"""
+import contextvars
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import timezone as dt_timezone
+from functools import partial
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from activity.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+USER_AGENT_LENGTH = 500
+SPILL_FIELDS = ('user_id', 'action', 'content_type_id', 'object_id', 'details', 'ip_address', 'user_agent')
+
+
+def client_ip(request):
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR') or None
+
+
+class AuditContext:
+    """Request details and committed events waiting to be written"""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.ip_address = client_ip(request) if request is not None else None
+        self.user_agent = request.META.get('HTTP_USER_AGENT', '')[:USER_AGENT_LENGTH] if request is not None else ''
+        self.committed = []
+        self.closed = False
+
+    def actor(self):
+        # Read when the event is recorded: DRF authenticates inside the view, after middleware ran
+        user = getattr(self.request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+
+_current = contextvars.ContextVar('audit_context', default=None)
+
+
+@contextmanager
+def context(request=None):
+    """Collect the audit events recorded inside the block and write them together on exit"""
+    ctx = AuditContext(request)
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        pending = len(ctx.committed)
+        try:
+            flush()
+        except Exception:
+            # The audited changes are already committed; don't turn the response into an error
+            logger.exception("Could not write %d audit events", pending)
+        ctx.closed = True
+        _current.reset(token)
+
+
+def current_user():
+    """The authenticated user of the current request, if any"""
+    ctx = _current.get()
+    return ctx.actor() if ctx else None
+
+
+def record(action, target=None, details=None, user=None):
+    """Record an audit event; returns the (not yet saved) AuditLog"""
+    ctx = _current.get()
+    entry = AuditLog(
+        user=user if user is not None else (ctx.actor() if ctx else None),
+        action=action,
+        details=details or {},
+        ip_address=ctx.ip_address if ctx else None,
+        user_agent=ctx.user_agent if ctx else '',
+    )
+    if target is not None:
+        entry.content_type = ContentType.objects.get_for_model(target)
+        entry.object_id = target.pk
+    transaction.on_commit(partial(_committed, ctx, entry))
+    return entry
+
+
+def change(old, new, related_model=None):
+    """
+    One field change for an event's details. Foreign keys are given as ids
+    with their related model: they are stored as such and shown by name when
+    the log is read (activity.serializers), so a save never looks them up.
+    """
+    if related_model is None:
+        return {'old': str(old), 'new': str(new)}
+    return {'old': old, 'new': new, 'ref': related_model._meta.label_lower}
+
+
+def _committed(ctx, entry):
+    if ctx is None or ctx.closed:
+        write([entry])
+    else:
+        ctx.committed.append(entry)
+
+
+def flush():
+    """Write the committed events of the current context now; returns how many were written"""
+    ctx = _current.get()
+    if ctx is None or not ctx.committed:
+        return 0
+    entries, ctx.committed = ctx.committed, []
+    write(entries)
+    return len(entries)
+
+
+def write(entries):
+    spill_dir = getattr(settings, 'AUDIT_SPILL_DIR', None)
+    if spill_dir:
+        spill(entries, spill_dir)
+    else:
+        AuditLog.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def _segment_hour(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%d%H')
+
+
+def spill(entries, spill_dir):
+    """Append events to this process's segment file for the current hour"""
+    lines = []
+    for entry in entries:
+        data = {field: getattr(entry, field) for field in SPILL_FIELDS}
+        data['timestamp'] = entry.timestamp.isoformat()
+        lines.append(json.dumps(data) + '\n')
+    path = os.path.join(spill_dir, f'audit-{_segment_hour(timezone.now())}-{os.getpid()}.jsonl')
+    # One append per batch, so lines from concurrent flushes never interleave
+    with open(path, 'a', encoding='utf-8') as segment:
+        segment.write(''.join(lines))
+
+
+def load_segments(spill_dir, now=None):
+    """Bulk load the segments of past hours into AuditLog; returns the number of events loaded"""
+    current_hour = _segment_hour(now or timezone.now())
+    loaded = 0
+    for name in sorted(os.listdir(spill_dir)):
+        path = os.path.join(spill_dir, name)
+        if name.endswith('.jsonl') and name.split('-')[1] < current_hour:
+            # Take the segment out of the way first; a '.loading' file left by a crash is picked up next run
+            os.replace(path, path + '.loading')
+            path += '.loading'
+        elif not name.endswith('.jsonl.loading'):
+            continue
+
+        with open(path, encoding='utf-8') as segment:
+            entries = [_from_json(json.loads(line)) for line in segment if line.strip()]
+        with transaction.atomic():
+            AuditLog.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+        os.remove(path)
+        loaded += len(entries)
+    return loaded
+
+
+def _from_json(data):
+    timestamp = parse_datetime(data.pop('timestamp'))
+    return AuditLog(timestamp=timestamp, **data)
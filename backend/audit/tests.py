@@ -1,3 +1,90 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from activity.models import AuditLog
+from projects.models import Project, Task
+from tickets.models import Ticket
+from users.models import User
+from . import pipeline
+
+
+def audit_inserts(queries):
+    return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "activity_auditlog"')]
+
+
+class AuditPipelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auditor', password='pw', role='ADMIN')
+        self.project = Project.objects.create(name='Audit', created_by=self.user)
+        self.task = Task.objects.create(project=self.project, title='Ship', status='TODO')
+
+    def test_request_events_carry_actor_and_client(self):
+        ticket = Ticket.objects.create(title='Printer', description='', submitted_by=self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = client.patch(
+                f'/api/tickets/tickets/{ticket.id}/', {'status': 'IN_PROGRESS'}, format='json',
+                HTTP_USER_AGENT='pytest-agent', REMOTE_ADDR='10.1.2.3',
+            )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        log = AuditLog.objects.get(action='UPDATE')
+        # No patching of the latest row afterwards: the actor is recorded with the event
+        self.assertEqual(log.user, self.user)
+        self.assertEqual(log.ip_address, '10.1.2.3')
+        self.assertEqual(log.user_agent, 'pytest-agent')
+        self.assertEqual(log.content_object, ticket)
+
+    def test_context_writes_events_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries, pipeline.context():
+            with self.captureOnCommitCallbacks(execute=True):
+                for action in ('ACKNOWLEDGE_TASK', 'SNOOZE_TASK', 'MARK_DONE_TASK'):
+                    pipeline.record(action, target=self.task, user=self.user)
+            self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(len(audit_inserts(queries)), 1)
+        self.assertEqual(AuditLog.objects.filter(object_id=self.task.id, user=self.user).count(), 3)
+
+    def test_rolled_back_events_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pipeline.record('KEPT', target=self.task)
+            try:
+                with transaction.atomic():
+                    pipeline.record('DROPPED', target=self.task)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['KEPT'])
+
+    def test_timestamp_is_when_recorded(self):
+        before = timezone.now()
+        with pipeline.context():
+            with self.captureOnCommitCallbacks(execute=True):
+                entry = pipeline.record('ACKNOWLEDGE_TASK', target=self.task)
+            self.assertGreaterEqual(entry.timestamp, before)
+        self.assertEqual(AuditLog.objects.get().timestamp, entry.timestamp)
+
+    def test_spill_and_load_segments(self):
+        with tempfile.TemporaryDirectory() as spill_dir, override_settings(AUDIT_SPILL_DIR=spill_dir):
+            with self.captureOnCommitCallbacks(execute=True):
+                entry = pipeline.record('SNOOZE_TASK', target=self.task, details={'duration': 2}, user=self.user)
+            self.assertFalse(AuditLog.objects.exists())
+            self.assertEqual(len(os.listdir(spill_dir)), 1)
+
+            # The current hour's segment may still be written to
+            self.assertEqual(pipeline.load_segments(spill_dir), 0)
+            self.assertEqual(pipeline.load_segments(spill_dir, now=timezone.now() + timedelta(hours=1)), 1)
+            self.assertEqual(os.listdir(spill_dir), [])
+
+        log = AuditLog.objects.get()
+        self.assertEqual((log.action, log.user, log.details), ('SNOOZE_TASK', self.user, {'duration': 2}))
+        self.assertEqual(log.content_object, self.task)
+        self.assertEqual(log.timestamp, entry.timestamp)
@@ -0,0 +1,110 @@
+"""
+Five-field cron expressions (minute hour day-of-month month day-of-week).
+
+Supports `*`, lists, ranges, steps (`*/15`, `1-5/2`), month and weekday
+names and the @hourly/@daily/@weekly/@monthly/@yearly shortcuts. As in
+Vixie cron, when both day fields are restricted a day matches either one.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+MONTHS = {name: i for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1
+)}
+WEEKDAYS = {name: i for i, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+# (low, high, names) per field
+FIELDS = [(0, 59, {}), (0, 23, {}), (1, 31, {}), (1, 12, MONTHS), (0, 7, WEEKDAYS)]
+
+# Give up looking for a matching time after this long (e.g. "0 0 31 2 *" never fires)
+SEARCH_LIMIT = timedelta(days=366 * 5)
+
+
+class CronError(ValueError):
+    pass
+
+
+def _value(text, low, high, names):
+    value = names.get(text.lower()) if names else None
+    if value is None:
+        try:
+            value = int(text)
+        except ValueError:
+            raise CronError(f"Invalid value '{text}'")
+    if not low <= value <= high:
+        raise CronError(f"'{text}' is outside {low}-{high}")
+    return value
+
+
+def _parse_field(text, low, high, names):
+    values = set()
+    for part in text.split(','):
+        body, has_step, step = part.partition('/')
+        if has_step and (not step.isdigit() or int(step) == 0):
+            raise CronError(f"Invalid step in '{part}'")
+        step = int(step) if has_step else 1
+        if body == '*':
+            start, end = low, high
+        elif '-' in body:
+            start, end = (_value(v, low, high, names) for v in body.split('-', 1))
+        else:
+            start = end = _value(body, low, high, names)
+            if has_step:
+                end = high
+        if start > end:
+            raise CronError(f"Invalid range '{body}'")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronExpression:
+    def __init__(self, expression):
+        self.expression = expression
+        text = MACROS.get(expression.strip().lower(), expression)
+        parts = text.split()
+        if len(parts) != 5:
+            raise CronError("A cron expression needs five fields")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(part, *field) for part, field in zip(parts, FIELDS)
+        )
+        # 7 is Sunday too; Python's weekday() has Monday=0, cron has Sunday=0
+        self.weekdays = frozenset((d % 7 - 1) % 7 for d in weekdays)
+        self._any_day = parts[2].startswith('*')
+        self._any_weekday = parts[4].startswith('*')
+
+    def __repr__(self):
+        return f'CronExpression({self.expression!r})'
+
+    def _day_matches(self, day):
+        in_month = day.day in self.days
+        in_week = day.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, moment):
+        """First matching time strictly after the aware datetime `moment`, or None"""
+        current = timezone.localtime(moment).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = current + SEARCH_LIMIT
+        while current < limit:
+            if current.month not in self.months:
+                current = (current.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(current):
+                current = (current + timedelta(days=1)).replace(hour=0, minute=0)
+            elif current.hour not in self.hours:
+                current = (current + timedelta(hours=1)).replace(minute=0)
+            elif current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+            else:
+                return timezone.make_aware(current)
+        return None
@@ -0,0 +1,375 @@
+"""
+Compiled workflow rule engine.
+
+`trigger_conditions` JSON is compiled once into a predicate closure:
+
+    {"status": "DONE"}                              equality (the original format)
+    {"story_points": {"gte": 5}}                    eq ne in not_in gt gte lt lte contains is_null
+    {"project__key": {"in": ["OPS", "WEB"]}}        related fields with `__`
+    {"status": {"changed_from": "TODO", "changed_to": "DONE"}}   also "changed": true
+    {"any": [{...}, {...}]}, {"all": [...]}, {"not": {...}}
+
+Compiled rules live in a per-process registry keyed by
+(target content type id, trigger type), rebuilt when the rules version
+(projects.sequences, in the database so every process sees it) moves; any
+WorkflowRule save/delete bumps it. Within a bucket,
+rules with a top-level equality on a plain field are indexed by that value, so
+`dispatch()` only evaluates the rules that can match the saved object.
+
+Any user may create a rule and rules carry no project scope of their own, so
+a rule only runs on objects its creator can see through the API (see
+`scope_queryset()`); a rule whose creator is gone runs nowhere.
+"""
+import datetime
+import decimal
+import logging
+import threading
+import uuid
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+
+from projects import access, sequences
+from projects.models import Task
+from tickets.models import Ticket
+from users.utils import user_has_role, user_role_in
+from .models import WorkflowRule
+
+logger = logging.getLogger(__name__)
+
+VERSION_NAME = 'version:automation-rules'
+
+MISSING = object()
+
+# trigger_conditions keys read by automation.scheduler rather than matched against the object
+SCHEDULE_KEYS = ('within_hours',)
+
+CompiledRule = namedtuple('CompiledRule', ['rule', 'predicate'])
+
+# Roles that see every ticket (as in TicketViewSet)
+TICKET_STAFF_ROLES = ('ADMIN', 'DEVELOPER', 'PROJECT_MANAGER')
+
+
+class InvalidCondition(ValueError):
+    pass
+
+
+def _normalize(value):
+    """Bring model values to the JSON types conditions are written in"""
+    if isinstance(value, models.Model):
+        return value.pk
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _resolver(path):
+    parts = path.split('__')
+
+    def resolve(obj):
+        for part in parts:
+            if obj is None:
+                return None
+            obj = getattr(obj, part, MISSING)
+            if obj is MISSING:
+                return MISSING
+        return _normalize(obj)
+    return resolve
+
+
+def _compare(op):
+    def check(actual, expected):
+        if actual is None or actual is MISSING:
+            return False
+        try:
+            return op(actual, expected)
+        except TypeError:
+            return False
+    return check
+
+
+OPERATORS = {
+    'eq': lambda actual, expected: actual == expected,
+    'ne': lambda actual, expected: actual != expected,
+    'in': lambda actual, expected: actual in expected,
+    'not_in': lambda actual, expected: actual not in expected,
+    'gt': _compare(lambda a, b: a > b),
+    'gte': _compare(lambda a, b: a >= b),
+    'lt': _compare(lambda a, b: a < b),
+    'lte': _compare(lambda a, b: a <= b),
+    'contains': _compare(lambda a, b: b in a),
+    'is_null': lambda actual, expected: (actual is None) == bool(expected),
+}
+CHANGE_OPERATORS = ('changed', 'changed_from', 'changed_to')
+
+
+def _attname(model, path):
+    """Concrete column name for change tracking, e.g. `assigned_to` -> `assigned_to_id`"""
+    if model is None or '__' in path:
+        return path
+    try:
+        return model._meta.get_field(path).attname
+    except (FieldDoesNotExist, AttributeError):
+        return path
+
+
+def _compile_field(path, spec, model):
+    if not isinstance(spec, dict):
+        # Original flat format: plain equality, ignored when the object has no such field
+        resolve = _resolver(path)
+        return lambda obj, changes: (lambda actual: actual is MISSING or actual == spec)(resolve(obj))
+
+    checks = []
+    resolve = _resolver(path)
+    attname = _attname(model, path)
+    for op, expected in spec.items():
+        if op in CHANGE_OPERATORS:
+            checks.append(_compile_change(attname, op, expected))
+        elif op in OPERATORS:
+            if op in ('in', 'not_in') and not isinstance(expected, list):
+                raise InvalidCondition(f"'{op}' on '{path}' needs a list")
+            test = OPERATORS[op]
+            checks.append(lambda obj, changes, test=test, expected=expected: test(resolve(obj), expected))
+        else:
+            raise InvalidCondition(f"Unknown operator '{op}' on '{path}'")
+
+    if len(checks) == 1:
+        return checks[0]
+    return lambda obj, changes: all(check(obj, changes) for check in checks)
+
+
+def _compile_change(attname, op, expected):
+    def check(obj, changes):
+        change = changes.get(attname)
+        if op == 'changed':
+            return (change is not None) == bool(expected)
+        if change is None:
+            return False
+        old, new = change
+        return _normalize(old if op == 'changed_from' else new) == expected
+    return check
+
+
+def compile_conditions(conditions, model=None):
+    """Compile trigger_conditions into `predicate(obj, changes)`; raises InvalidCondition"""
+    if not conditions:
+        return lambda obj, changes: True
+    if not isinstance(conditions, dict):
+        raise InvalidCondition("Conditions must be an object")
+
+    checks = []
+    for key, spec in conditions.items():
+        if key in SCHEDULE_KEYS:
+            continue
+        if key in ('any', 'all'):
+            if not isinstance(spec, list):
+                raise InvalidCondition(f"'{key}' needs a list of conditions")
+            parts = [compile_conditions(part, model) for part in spec]
+            combine = any if key == 'any' else all
+            checks.append(lambda obj, changes, parts=parts, combine=combine: combine(p(obj, changes) for p in parts))
+        elif key == 'not':
+            inner = compile_conditions(spec, model)
+            checks.append(lambda obj, changes, inner=inner: not inner(obj, changes))
+        else:
+            checks.append(_compile_field(key, spec, model))
+
+    if not checks:
+        return lambda obj, changes: True
+    if len(checks) == 1:
+        return checks[0]
+    return lambda obj, changes: all(check(obj, changes) for check in checks)
+
+
+def _index_key(conditions, model):
+    """(attname, value) of a top-level equality on a plain field, used to pre-select rules"""
+    for key, spec in (conditions or {}).items():
+        if key in ('any', 'all', 'not') or '__' in key:
+            continue
+        if isinstance(spec, dict):
+            spec = spec.get('eq', spec.get('changed_to', MISSING)) if len(spec) == 1 else MISSING
+        if spec is MISSING or isinstance(spec, (dict, list)):
+            continue
+        try:
+            field = model._meta.get_field(key)
+        except (FieldDoesNotExist, AttributeError):
+            continue
+        if field.concrete and not field.many_to_many:
+            return field.attname, spec
+    return None
+
+
+class Bucket:
+    """Active rules of one (content type, trigger type)"""
+
+    def __init__(self):
+        self.indexed = defaultdict(lambda: defaultdict(list))
+        self.unindexed = []
+
+    def add(self, compiled, key):
+        if key is None:
+            self.unindexed.append(compiled)
+        else:
+            attname, value = key
+            self.indexed[attname][value].append(compiled)
+
+    def candidates(self, obj):
+        found = list(self.unindexed)
+        for attname, by_value in self.indexed.items():
+            found.extend(by_value.get(_normalize(getattr(obj, attname, None)), ()))
+        return found
+
+
+_registry = {'version': None, 'buckets': {}, 'content_types': frozenset()}
+_lock = threading.Lock()
+
+
+def rules_version():
+    """Shared version of the WorkflowRule table, bumped on every rule change"""
+    return sequences.version(VERSION_NAME)
+
+
+def invalidate():
+    sequences.bump_version(VERSION_NAME)
+
+
+def _build():
+    buckets = defaultdict(Bucket)
+    rules = WorkflowRule.objects.filter(is_active=True).order_by('-created_at', '-id')
+    for rule in rules.iterator(chunk_size=1000):
+        model = ContentType.objects.get_for_id(rule.target_content_type_id).model_class()
+        try:
+            predicate = compile_conditions(rule.trigger_conditions, model)
+        except InvalidCondition as exc:
+            logger.warning("Skipping workflow rule %s: %s", rule.id, exc)
+            continue
+        buckets[(rule.target_content_type_id, rule.trigger_type)].add(
+            CompiledRule(rule, predicate), _index_key(rule.trigger_conditions, model)
+        )
+    return dict(buckets)
+
+
+def _current():
+    version = rules_version()
+    if _registry['version'] != version:
+        with _lock:
+            if _registry['version'] != version:
+                buckets = _build()
+                _registry['buckets'] = buckets
+                _registry['content_types'] = frozenset(ct for ct, _ in buckets)
+                _registry['version'] = version
+    return _registry
+
+
+def rules_for(content_type_id, trigger_type):
+    """Bucket of compiled active rules, or None when no rule applies"""
+    return _current()['buckets'].get((content_type_id, trigger_type))
+
+
+_local = threading.local()
+
+
+@contextmanager
+def no_dispatch():
+    """Saves inside this block don't run workflow rules (used while applying rule actions)"""
+    previous = getattr(_local, 'running', False)
+    _local.running = True
+    try:
+        yield
+    finally:
+        _local.running = previous
+
+
+def matching_rules(instance, trigger_type, changes=None):
+    """Compiled rules of `trigger_type` whose conditions hold for `instance`"""
+    bucket = rules_for(ContentType.objects.get_for_model(instance).id, trigger_type)
+    if bucket is None:
+        return []
+    changes = changes or {}
+    matched = [c for c in bucket.candidates(instance) if c.predicate(instance, changes)]
+    # Same order whether a rule was found through the index or not
+    matched.sort(key=lambda c: (-c.rule.created_at.timestamp(), -c.rule.id))
+    return matched
+
+
+def scope_queryset(queryset, user):
+    """The objects of `queryset` that `user` can see through the API, i.e. that their rules may act on"""
+    if user is None:
+        return queryset.none()
+    if queryset.model is Task:
+        return access.filter_visible(queryset, user, project='project__')
+    if queryset.model is Ticket:
+        return queryset if user_role_in(user, TICKET_STAFF_ROLES) else queryset.filter(submitted_by=user)
+    return queryset if user_has_role(user, 'ADMIN') else queryset.none()
+
+
+def visible_to(user, instance):
+    """`scope_queryset()` for a single object, answered from memory and the access cache where possible"""
+    if user_has_role(user, 'ADMIN'):
+        return True
+    if isinstance(instance, Ticket):
+        return user_role_in(user, TICKET_STAFF_ROLES) or instance.submitted_by_id == user.pk
+    if isinstance(instance, Task):
+        if instance.project_id in access.accessible_project_ids(user):
+            return True
+        return bool(user.enterprise_id) and scope_queryset(Task.objects.filter(pk=instance.pk), user).exists()
+    return False
+
+
+def in_scope(compiled_rules, instance):
+    """The rules whose creator can see `instance`"""
+    creator_ids = {c.rule.created_by_id for c in compiled_rules} - {None}
+    if not creator_ids:
+        return []
+    creators = get_user_model().objects.in_bulk(creator_ids)
+    allowed = {user_id for user_id, user in creators.items() if visible_to(user, instance)}
+    return [c for c in compiled_rules if c.rule.created_by_id in allowed]
+
+
+def dispatch(instance, trigger_types, changes=None, triggered_by=None):
+    """
+    Run the rules of `trigger_types` that match `instance` and whose creator can
+    see it; returns their WorkflowExecutions.
+
+    The actions of all matching rules are written as one batch. Saves made by
+    rule actions don't dispatch again, so rules can't trigger each other in a loop.
+    """
+    from .utils import ActionBatch
+
+    if getattr(_local, 'running', False):
+        return []
+    batch = ActionBatch()
+    with no_dispatch():
+        for trigger_type in trigger_types:
+            for compiled in in_scope(matching_rules(instance, trigger_type, changes), instance):
+                batch.run_rule(compiled.rule, instance, triggered_by=triggered_by, conditions_met=True)
+    return batch.flush()
+
+
+def dispatch_save(instance, created, triggered_by=None):
+    """Fire CREATED/UPDATED/STATUS_CHANGE/ASSIGNMENT rules for a saved Task or Ticket"""
+    content_type_id = ContentType.objects.get_for_model(instance).id
+    if content_type_id not in _current()['content_types']:
+        return []
+
+    Trigger = WorkflowRule.TriggerType
+    changes = {} if created else (instance.saved_changes or {})
+    if created:
+        trigger_types = [Trigger.CREATED]
+        if getattr(instance, 'assigned_to_id', None):
+            trigger_types.append(Trigger.ASSIGNMENT)
+    else:
+        trigger_types = [Trigger.UPDATED]
+        if 'status' in changes:
+            trigger_types.append(Trigger.STATUS_CHANGE)
+        if changes.get('assigned_to_id', (None, None))[1] is not None:
+            trigger_types.append(Trigger.ASSIGNMENT)
+    return dispatch(instance, trigger_types, changes, triggered_by)
+
@@ -0,0 +1,189 @@
+"""
+Database-backed execution of BackgroundJob rows.
+
+Apps register a handler per job type:
+
+    @jobs.register(BackgroundJob.JobType.DATA_EXPORT, validate=check, output=file_of)
+    def export(job, progress):
+        ...
+        return {'rows': ...}          # stored in job.result
+
+`validate(parameters)` raises ValueError for parameters the handler cannot
+run; the API checks it when a job is created or changed. `output(job)` is
+the path, relative to JOB_FILES_ROOT, of the file the job writes, derived
+from the job's id and parameters. Downloads use it rather than anything in
+`result`. `manage.py run_jobs` claims PENDING rows and runs them. Claiming uses
+SELECT ... FOR UPDATE SKIP LOCKED where the database supports it and a
+conditional UPDATE (compare-and-swap on status) elsewhere, e.g. SQLite, so
+several workers can poll the same table without running a job twice.
+
+A claimed job holds a lease of JOB_LEASE_SECONDS, renewed by each
+`progress()` call, so handlers report progress at least that often. When a
+worker dies, its RUNNING job is claimed again once the lease expires, like
+webhook deliveries (automation.webhooks). The claim is identified by
+`started_at`: a worker whose job was reclaimed can no longer record
+progress or an outcome, and its `progress()` raises JobCancelled.
+
+Files a handler produces go under JOB_FILES_ROOT, outside MEDIA_ROOT, and
+are only served by the authenticated `jobs/<id>/download/` action.
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+VALIDATORS = {}
+OUTPUTS = {}
+DEFAULT_LEASE_SECONDS = 10 * 60
+
+
+class JobCancelled(Exception):
+    """Raised from `progress()` when the job was cancelled while running"""
+
+
+def register(job_type, validate=None, output=None):
+    def decorator(func):
+        HANDLERS[job_type] = func
+        if validate is not None:
+            VALIDATORS[job_type] = validate
+        if output is not None:
+            OUTPUTS[job_type] = output
+        return func
+    return decorator
+
+
+def validate_parameters(job_type, parameters):
+    """ValueError unless a handler runs `job_type` jobs and accepts `parameters`"""
+    if job_type not in HANDLERS:
+        raise ValueError(f"No handler runs {job_type} jobs")
+    if not isinstance(parameters, dict):
+        raise ValueError("Job parameters must be an object")
+    validate = VALIDATORS.get(job_type)
+    if validate is not None:
+        validate(parameters)
+
+
+def files_root():
+    return str(getattr(settings, 'JOB_FILES_ROOT', os.path.join(settings.BASE_DIR, 'job_files')))
+
+
+def file_path(relative_path):
+    """Absolute path of a job file; ValueError if `relative_path` escapes JOB_FILES_ROOT"""
+    root = os.path.realpath(files_root())
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Job file outside JOB_FILES_ROOT: {relative_path!r}")
+    return path
+
+
+def output_path(job):
+    """Absolute path of the file a completed job wrote, or None when it has none"""
+    output = OUTPUTS.get(job.job_type)
+    if output is None or job.status != BackgroundJob.Status.COMPLETED:
+        return None
+    try:
+        path = file_path(output(job))
+    except ValueError:
+        return None
+    return path if os.path.isfile(path) else None
+
+
+def _lease_until():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'JOB_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+
+
+def claim_next_job():
+    """Mark the oldest runnable job (PENDING, or RUNNING with an expired lease) as RUNNING and return it, or None"""
+    now = timezone.now()
+    runnable = BackgroundJob.objects.filter(
+        # RUNNING without a lease: claimed before leases existed, by a worker that is gone
+        Q(status=BackgroundJob.Status.PENDING)
+        | Q(status=BackgroundJob.Status.RUNNING, lease_expires_at__lte=now)
+        | Q(status=BackgroundJob.Status.RUNNING, lease_expires_at__isnull=True),
+        job_type__in=list(HANDLERS),
+    ).order_by('created_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = runnable.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            _log_reclaim(job)
+            job.status = BackgroundJob.Status.RUNNING
+            job.started_at = timezone.now()
+            job.lease_expires_at = _lease_until()
+            job.save(update_fields=['status', 'started_at', 'lease_expires_at'])
+            return job
+
+    for job_id, status, started_at in runnable.values_list('id', 'status', 'started_at')[:10]:
+        # Compare-and-swap on status and claim, so an expired job is reclaimed by one worker only
+        claimed = BackgroundJob.objects.filter(id=job_id, status=status, started_at=started_at).update(
+            status=BackgroundJob.Status.RUNNING, started_at=timezone.now(), lease_expires_at=_lease_until()
+        )
+        if claimed:
+            job = BackgroundJob.objects.get(id=job_id)
+            _log_reclaim(job, status)
+            return job
+    return None
+
+
+def _log_reclaim(job, previous_status=None):
+    if (previous_status or job.status) == BackgroundJob.Status.RUNNING:
+        logger.warning("Background job %s: lease expired, running it again", job.id)
+
+
+def _claimed(job):
+    """The job's row while this worker's claim on it stands"""
+    return BackgroundJob.objects.filter(id=job.id, status=BackgroundJob.Status.RUNNING, started_at=job.started_at)
+
+
+def _progress_callback(job):
+    def progress(done, total):
+        percentage = min(int(done * 100 / total), 99) if total else 0
+        updated = _claimed(job).update(progress_percentage=percentage, lease_expires_at=_lease_until())
+        if not updated:
+            raise JobCancelled()
+    return progress
+
+
+def run_job(job):
+    """Run a claimed job through its handler and record the outcome"""
+    handler = HANDLERS[job.job_type]
+    finished = _claimed(job)
+    try:
+        result = handler(job, _progress_callback(job))
+    except JobCancelled:
+        logger.info("Background job %s was cancelled or reclaimed", job.id)
+        return
+    except Exception as exc:
+        logger.exception("Background job %s failed", job.id)
+        finished.update(
+            status=BackgroundJob.Status.FAILED, error_message=str(exc), completed_at=timezone.now(),
+            lease_expires_at=None,
+        )
+        return
+    finished.update(
+        status=BackgroundJob.Status.COMPLETED, result=result or {},
+        progress_percentage=100, completed_at=timezone.now(), lease_expires_at=None,
+    )
+
+
+def run_pending(limit=None):
+    """Claim and run jobs until the queue is empty or `limit` jobs ran; returns the number run"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from automation import webhooks
+
+
+class Command(BaseCommand):
+    help = "Deliver queued webhooks from the WebhookLog outbox; several workers can poll the same database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once no delivery is due")
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent HTTP requests")
+        parser.add_argument('--batch-size', type=int, default=50, help="Deliveries claimed per round")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when idle")
+
+    def handle(self, *args, **options):
+        sent = webhooks.run(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            once=options['once'],
+            poll_interval=options['poll_interval'],
+        )
+        self.stdout.write(f"Delivered {sent} webhook(s)")
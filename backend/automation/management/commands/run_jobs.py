@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from automation import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued BackgroundJob rows; several workers can poll the same database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when idle")
+        parser.add_argument('--max-jobs', type=int, help="Exit after running this many jobs")
+
+    def handle(self, *args, **options):
+        remaining = options['max_jobs']
+        while remaining is None or remaining > 0:
+            ran = jobs.run_pending(limit=remaining)
+            if ran:
+                self.stdout.write(f"Ran {ran} job(s)")
+            if remaining is not None:
+                remaining -= ran
+            if options['once']:
+                break
+            if not ran:
+                time.sleep(options['poll_interval'])
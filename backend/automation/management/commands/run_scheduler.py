@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from automation import scheduler
+
+
+class Command(BaseCommand):
+    help = "Fire scheduled and due-date workflow rules as their cron times come due"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the rules due now and exit")
+        parser.add_argument(
+            '--reload-interval', type=float, default=scheduler.RELOAD_INTERVAL,
+            help="Seconds between checks for changed rules"
+        )
+
+    def handle(self, *args, **options):
+        ran = scheduler.run(once=options['once'], reload_interval=options['reload_interval'])
+        if options['once']:
+            self.stdout.write(f"Ran {ran} rule(s)")
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automation', '0002_webhook_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowrule',
+            name='last_scheduled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
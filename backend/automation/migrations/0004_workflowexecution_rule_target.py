@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 12:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automation', '0003_workflowrule_last_scheduled_at'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workflowexecution',
+            index=models.Index(fields=['rule', 'target_object_id', 'executed_at'], name='execution_rule_target_idx'),
+        ),
+    ]
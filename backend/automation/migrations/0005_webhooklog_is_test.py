@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automation', '0004_workflowexecution_rule_target'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhooklog',
+            name='is_test',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -33,6 +33,8 @@ class WorkflowRule(models.Model):
     # Scheduling
     is_scheduled = models.BooleanField(default=False)
     schedule_cron = models.CharField(max_length=100, blank=True, help_text="Cron expression for scheduling")
+    # End of the last window evaluated by the scheduler (see automation.scheduler)
+    last_scheduled_at = models.DateTimeField(null=True, blank=True)
     
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -75,6 +77,10 @@ class WorkflowExecution(models.Model):
     
     class Meta:
         ordering = ['-executed_at']
+        indexes = [
+            # The scheduler's "already fired for this due date" lookup
+            models.Index(fields=['rule', 'target_object_id', 'executed_at'], name='execution_rule_target_idx'),
+        ]
     
     def __str__(self):
         return f"{self.rule.name} - {self.executed_at}"
@@ -118,6 +124,8 @@ class Webhook(models.Model):
 class WebhookLog(models.Model):
     """Log of webhook deliveries"""
     class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        SENDING = 'SENDING', 'Sending'
         SUCCESS = 'SUCCESS', 'Success'
         FAILED = 'FAILED', 'Failed'
         RETRY = 'RETRY', 'Retry Scheduled'
@@ -134,9 +142,18 @@ class WebhookLog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     error_message = models.TextField(blank=True)
+
+    # Outbox scheduling (see automation.webhooks): when a PENDING/RETRY row is due,
+    # or when the lease of a SENDING row expires
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    # Sent from the webhook test endpoint: attempted once, never retried
+    is_test = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhooklog_outbox_idx'),
+        ]
     
     def __str__(self):
         return f"{self.webhook.name} - {self.status} - {self.created_at}"
@@ -170,6 +187,8 @@ class BackgroundJob(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     progress_percentage = models.IntegerField(default=0)
+    # While RUNNING: when the job may be reclaimed unless its worker reports progress (see automation.jobs)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
     
     error_message = models.TextField(blank=True)
     
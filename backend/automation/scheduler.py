@@ -0,0 +1,188 @@
+"""
+Scheduler for time-based workflow rules, run by `manage.py run_scheduler`.
+
+Every active rule with `is_scheduled` and a `schedule_cron`, and every
+DUE_DATE_APPROACHING rule (default cron DEFAULT_DUE_DATE_CRON), gets its
+next fire time on a min-heap; the process sleeps until the earliest one is
+due, or until it is time to check the rules version for changes. That
+version is kept in the database (engine.rules_version), so rules added,
+changed or removed through the API are picked up within RELOAD_INTERVAL.
+
+Each firing is claimed by moving `last_scheduled_at` with a compare-and-swap
+that also requires the rule to still be active, so several schedulers never
+run the same firing twice and a rule disabled since the last reload does not
+fire. It then selects:
+
+- DUE_DATE_APPROACHING: open targets due within the next `within_hours`
+  (trigger_conditions, default 24), found with one range query on the
+  indexed Task.due_date / Ticket.sla_due_date, minus those the rule already
+  ran on since their current due moment entered the window. The rule's
+  WorkflowExecutions are the record of that, so a target created or moved
+  into the window between two firings is still caught, and one moved to a
+  later due date fires again;
+- SCHEDULED: every object of the target model.
+
+Either way only the objects the rule's creator can see are considered
+(engine.scope_queryset), as for rules dispatched on save. Targets that
+match the rule's conditions are executed in ActionBatches.
+"""
+import heapq
+import logging
+import time
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import DateTimeField, Exists, ExpressionWrapper, OuterRef, Q
+from django.utils import timezone
+
+from projects.models import Task
+from tickets.models import Ticket
+from .cron import CronExpression, CronError
+from .engine import compile_conditions, InvalidCondition, rules_version, scope_queryset
+from .models import WorkflowExecution, WorkflowRule
+from .utils import ActionBatch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DUE_DATE_CRON = '*/15 * * * *'
+DEFAULT_WITHIN_HOURS = 24
+BATCH_SIZE = 500
+# Seconds between checks for added, changed or removed rules
+RELOAD_INTERVAL = 60
+
+# model -> (due field, open objects)
+DUE_DATE_TARGETS = {
+    Task: ('due_date', lambda qs: qs.filter(is_archived=False).exclude(status=Task.Status.DONE)),
+    Ticket: ('sla_due_date', lambda qs: qs.exclude(status__in=[Ticket.Status.RESOLVED, Ticket.Status.CLOSED])),
+}
+
+
+class Scheduler:
+    def __init__(self):
+        self.version = None
+        self.heap = []
+        self.entries = {}
+
+    def load(self, now):
+        """(Re)build the heap from the active time-based rules"""
+        self.version = rules_version()
+        self.heap = []
+        self.entries = {}
+        rules = WorkflowRule.objects.filter(is_active=True).filter(
+            Q(is_scheduled=True) | Q(trigger_type=WorkflowRule.TriggerType.DUE_DATE_APPROACHING)
+        ).select_related('created_by')
+        for rule in rules:
+            due_date = rule.trigger_type == WorkflowRule.TriggerType.DUE_DATE_APPROACHING
+            expression = rule.schedule_cron or (DEFAULT_DUE_DATE_CRON if due_date else '')
+            if not expression:
+                continue
+            model = ContentType.objects.get_for_id(rule.target_content_type_id).model_class()
+            if due_date and model not in DUE_DATE_TARGETS:
+                logger.warning("Skipping workflow rule %s: no due date on %s", rule.id, model)
+                continue
+            try:
+                cron = CronExpression(expression)
+                predicate = compile_conditions(rule.trigger_conditions, model)
+            except (CronError, InvalidCondition) as exc:
+                logger.warning("Skipping workflow rule %s: %s", rule.id, exc)
+                continue
+
+            self.entries[rule.id] = (rule, cron, predicate, model)
+            # A rule whose fire time passed while nothing was running fires once, straight away
+            fire_at = cron.next_after(rule.last_scheduled_at or now)
+            if fire_at is not None:
+                heapq.heappush(self.heap, (fire_at, rule.id))
+
+    def refresh(self, now):
+        if self.version is None or rules_version() != self.version:
+            self.load(now)
+
+    def next_fire(self):
+        return self.heap[0][0] if self.heap else None
+
+    def run_due(self, now):
+        """Run every rule whose fire time has come; returns the number of rules run"""
+        ran = 0
+        while self.heap and self.heap[0][0] <= now:
+            _, rule_id = heapq.heappop(self.heap)
+            rule, cron, predicate, model = self.entries[rule_id]
+            try:
+                run_rule(rule, predicate, model, now)
+            except Exception:
+                # One broken rule must not stop the others; it is retried at its next fire time
+                logger.exception("Workflow rule %s failed", rule_id)
+            ran += 1
+            fire_at = cron.next_after(now)
+            if fire_at is not None:
+                heapq.heappush(self.heap, (fire_at, rule_id))
+        return ran
+
+
+def _claim_firing(rule, now):
+    """Move last_scheduled_at to `now` unless another scheduler already did or the rule was disabled"""
+    previous = rule.last_scheduled_at
+    claimed = WorkflowRule.objects.filter(
+        id=rule.id, is_active=True, last_scheduled_at=previous
+    ).update(last_scheduled_at=now)
+    if not claimed:
+        # Deleted rules leave no row; the next reload drops them
+        rule.last_scheduled_at = WorkflowRule.objects.filter(id=rule.id).values_list(
+            'last_scheduled_at', flat=True
+        ).first()
+        return False
+    rule.last_scheduled_at = now
+    return True
+
+
+def due_targets(rule, model, now):
+    """Open objects due in (now, now + window] that the rule has not run on since they entered the window"""
+    field, open_objects = DUE_DATE_TARGETS[model]
+    window = timedelta(hours=(rule.trigger_conditions or {}).get('within_hours', DEFAULT_WITHIN_HOURS))
+    fired = WorkflowExecution.objects.filter(
+        rule=rule, target_content_type_id=rule.target_content_type_id, target_object_id=OuterRef('pk'),
+        executed_at__gte=ExpressionWrapper(OuterRef(field) - window, output_field=DateTimeField()),
+    )
+    return open_objects(model.objects.all()).filter(
+        **{f'{field}__gt': now, f'{field}__lte': now + window}
+    ).exclude(Exists(fired)).order_by(field, 'pk')
+
+
+def run_rule(rule, predicate, model, now):
+    """Evaluate one firing of a time-based rule; returns the number of targets it ran on"""
+    if not _claim_firing(rule, now):
+        return 0
+
+    if rule.trigger_type == WorkflowRule.TriggerType.DUE_DATE_APPROACHING:
+        targets = due_targets(rule, model, now)
+    else:
+        targets = model.objects.order_by('pk')
+    targets = scope_queryset(targets, rule.created_by)
+
+    count = 0
+    batch = ActionBatch()
+    for target in targets.iterator(chunk_size=BATCH_SIZE):
+        if not predicate(target, {}):
+            continue
+        batch.run_rule(rule, target, conditions_met=True)
+        count += 1
+        if count % BATCH_SIZE == 0:
+            batch.flush()
+    batch.flush()
+    return count
+
+
+def run(once=False, reload_interval=RELOAD_INTERVAL, stop=None):
+    """Fire time-based rules as they come due; with `once`, run what is due now and return"""
+    scheduler = Scheduler()
+    while True:
+        now = timezone.now()
+        scheduler.refresh(now)
+        ran = scheduler.run_due(now)
+        if once or (stop and stop()):
+            return ran
+
+        next_fire = scheduler.next_fire()
+        delay = reload_interval
+        if next_fire is not None:
+            delay = min(max((next_fire - timezone.now()).total_seconds(), 0), reload_interval)
+        time.sleep(delay)
@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from . import jobs
+from .cron import CronExpression, CronError
+from .engine import compile_conditions, InvalidCondition
 from .models import WorkflowRule, WorkflowExecution, Webhook, WebhookLog, BackgroundJob, AutomationTemplate
 from django.contrib.auth import get_user_model
 
@@ -21,6 +24,27 @@ class WorkflowRuleSerializer(serializers.ModelSerializer):
     def get_target_model(self, obj):
         return obj.target_content_type.model if obj.target_content_type else None
 
+    def validate(self, attrs):
+        content_type = attrs.get('target_content_type', getattr(self.instance, 'target_content_type', None))
+        conditions = attrs.get('trigger_conditions', getattr(self.instance, 'trigger_conditions', None))
+        try:
+            compile_conditions(conditions, content_type.model_class() if content_type else None)
+        except InvalidCondition as exc:
+            raise serializers.ValidationError({'trigger_conditions': str(exc)})
+        within_hours = (conditions or {}).get('within_hours')
+        if within_hours is not None and (
+            isinstance(within_hours, bool) or not isinstance(within_hours, (int, float)) or not 0 < within_hours < 24 * 366
+        ):
+            raise serializers.ValidationError({'trigger_conditions': "'within_hours' must be a positive number of hours, up to a year"})
+
+        cron = attrs.get('schedule_cron', getattr(self.instance, 'schedule_cron', ''))
+        if cron:
+            try:
+                CronExpression(cron)
+            except CronError as exc:
+                raise serializers.ValidationError({'schedule_cron': str(exc)})
+        return attrs
+
 class WorkflowExecutionSerializer(serializers.ModelSerializer):
     rule_name = serializers.CharField(source='rule.name', read_only=True)
     triggered_by_details = serializers.SerializerMethodField()
@@ -63,7 +87,11 @@ class BackgroundJobSerializer(serializers.ModelSerializer):
     class Meta:
         model = BackgroundJob
         fields = '__all__'
-        read_only_fields = ['created_by', 'started_at', 'completed_at', 'created_at']
+        # Progress and outcome are only written by the job runner
+        read_only_fields = [
+            'created_by', 'status', 'result', 'progress_percentage', 'error_message',
+            'started_at', 'completed_at', 'lease_expires_at', 'created_at',
+        ]
     
     def get_created_by_details(self, obj):
         if obj.created_by:
@@ -75,6 +103,15 @@ class BackgroundJobSerializer(serializers.ModelSerializer):
             return (obj.completed_at - obj.started_at).total_seconds()
         return None
 
+    def validate(self, attrs):
+        job_type = attrs.get('job_type', getattr(self.instance, 'job_type', None))
+        parameters = attrs.get('parameters', getattr(self.instance, 'parameters', {}))
+        try:
+            jobs.validate_parameters(job_type, parameters)
+        except ValueError as exc:
+            raise serializers.ValidationError({'parameters': str(exc)})
+        return attrs
+
 class AutomationTemplateSerializer(serializers.ModelSerializer):
     created_by_details = serializers.SerializerMethodField()
     
@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from projects.models import Task
+from tickets.models import Ticket
+from .models import WorkflowRule
+from . import engine
+
+@receiver(post_save, sender=WorkflowRule)
+@receiver(post_delete, sender=WorkflowRule)
+def invalidate_compiled_rules(sender, instance, **kwargs):
+    transaction.on_commit(engine.invalidate)
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Ticket)
+def run_workflow_rules(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    engine.dispatch_save(instance, created)
@@ -0,0 +1,69 @@
+"""
+Local HTTP receiver for exercising webhook delivery without a network.
+
+    with StubReceiver(status_codes=[500, 200]) as receiver:
+        webhook.url = receiver.url
+        ...
+        receiver.requests   # [(path, headers, json body), ...]
+
+Responses use `status_codes` in order, repeating the last one.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubReceiver:
+    def __init__(self, status_codes=(200,)):
+        self.status_codes = list(status_codes)
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/hook'
+
+    def _next_status(self):
+        with self._lock:
+            index = min(len(self.requests), len(self.status_codes)) - 1
+            return self.status_codes[max(index, 0)]
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'null')
+                with receiver._lock:
+                    receiver.requests.append((self.path, dict(self.headers), body))
+                code = receiver._next_status()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({'received': True}).encode())
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
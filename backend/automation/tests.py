@@ -1,3 +1,564 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from projects.models import Project, Sequence, Task
+from . import engine, jobs, scheduler, webhooks
+from .cron import CronExpression, CronError
+from collaboration.models import Notification
+from .models import BackgroundJob, Webhook, WebhookLog, WorkflowRule, WorkflowExecution
+from .utils import ActionBatch
+from .stub_server import StubReceiver
+
+User = get_user_model()
+
+
+class BackgroundJobRunnerTest(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.addCleanup(jobs.HANDLERS.pop, BackgroundJob.JobType.CLEANUP, None)
+
+        @jobs.register(BackgroundJob.JobType.CLEANUP)
+        def cleanup(job, progress):
+            self.calls.append(job.id)
+            progress(1, 2)
+            if job.parameters.get('fail'):
+                raise RuntimeError('boom')
+            return {'ok': True}
+
+    def make_job(self, **parameters):
+        return BackgroundJob.objects.create(job_type=BackgroundJob.JobType.CLEANUP, job_name='cleanup', parameters=parameters)
+
+    def test_claim_is_exclusive_and_ordered(self):
+        first, second = self.make_job(), self.make_job()
+        self.assertEqual(jobs.claim_next_job().id, first.id)
+        self.assertEqual(jobs.claim_next_job().id, second.id)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_outcomes_recorded(self):
+        ok, failed = self.make_job(), self.make_job(fail=True)
+        with self.assertLogs('automation.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 2)
+        ok.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((ok.status, ok.result, ok.progress_percentage), ('COMPLETED', {'ok': True}, 100))
+        self.assertEqual((failed.status, failed.error_message), ('FAILED', 'boom'))
+
+    def test_cancelled_while_running(self):
+        job = self.make_job()
+        claimed = jobs.claim_next_job()
+        BackgroundJob.objects.filter(id=job.id).update(status=BackgroundJob.Status.CANCELLED)
+        jobs.run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'CANCELLED')
+
+
+    def test_job_of_a_dead_worker_is_reclaimed_when_its_lease_expires(self):
+        job = self.make_job()
+        stale = jobs.claim_next_job()
+        self.assertGreater(stale.lease_expires_at, timezone.now())
+        self.assertIsNone(jobs.claim_next_job())
+
+        BackgroundJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('automation.jobs', 'WARNING'):
+            reclaimed = jobs.claim_next_job()
+        self.assertEqual(reclaimed.id, job.id)
+        # The first worker lost its claim: it cannot report progress or an outcome any more
+        with self.assertRaises(jobs.JobCancelled):
+            jobs._progress_callback(stale)(1, 2)
+        jobs.run_job(reclaimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.started_at, job.lease_expires_at), ('COMPLETED', reclaimed.started_at, None))
+
+    def test_progress_renews_the_lease(self):
+        self.make_job()
+        job = jobs.claim_next_job()
+        BackgroundJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() + timedelta(seconds=1))
+        jobs._progress_callback(job)(1, 4)
+        job.refresh_from_db()
+        self.assertGreater(job.lease_expires_at, timezone.now() + timedelta(seconds=60))
+        self.assertEqual(job.progress_percentage, 25)
+
+
+class WebhookOutboxTest(TestCase):
+    def setUp(self):
+        self.receiver = StubReceiver().start()
+        self.addCleanup(self.receiver.stop)
+        self.webhook = Webhook.objects.create(
+            name='hook', url=self.receiver.url, event=Webhook.Event.TASK_CREATED,
+            secret_token='s3cret', max_retries=2, retry_delay_seconds=30,
+        )
+
+    def make_due(self):
+        WebhookLog.objects.filter(status__in=webhooks.DUE_STATUSES).update(next_attempt_at=timezone.now())
+
+    def test_delivery_success(self):
+        log = webhooks.enqueue(self.webhook, {'id': 1})
+        self.assertEqual(webhooks.run(workers=2, once=True), 1)
+
+        log.refresh_from_db()
+        self.webhook.refresh_from_db()
+        self.assertEqual((log.status, log.status_code, log.next_attempt_at), ('SUCCESS', 200, None))
+        self.assertEqual(self.webhook.success_count, 1)
+        path, headers, body = self.receiver.requests[0]
+        self.assertEqual((body, headers['X-Webhook-Secret']), ({'id': 1}, 's3cret'))
+
+    def test_failure_schedules_retry_with_backoff(self):
+        self.receiver.status_codes = [500, 500, 200]
+        webhooks.enqueue(self.webhook, {'id': 1})
+        before = timezone.now()
+        webhooks.run(once=True)
+
+        retry = WebhookLog.objects.get(status='RETRY')
+        self.assertEqual(retry.attempt_number, 2)
+        self.assertGreaterEqual(retry.next_attempt_at, before + timedelta(seconds=30))
+        # Not due yet, so the worker does not wait for it
+        self.assertEqual(webhooks.run(once=True), 0)
+
+        self.make_due()
+        webhooks.run(once=True)
+        retry = WebhookLog.objects.get(status='RETRY')
+        self.assertEqual(retry.attempt_number, 3)
+        self.assertGreaterEqual(retry.next_attempt_at, before + timedelta(seconds=60))
+        self.make_due()
+        webhooks.run(once=True)
+        self.assertEqual(
+            list(WebhookLog.objects.order_by('attempt_number').values_list('attempt_number', 'status')),
+            [(1, 'FAILED'), (2, 'FAILED'), (3, 'SUCCESS')]
+        )
+
+    def test_exhausted_retries_count_as_failure(self):
+        self.receiver.status_codes = [503]
+        webhooks.enqueue(self.webhook, {'id': 1})
+        for _ in range(3):
+            webhooks.run(once=True)
+            self.make_due()
+
+        self.webhook.refresh_from_db()
+        self.assertEqual(WebhookLog.objects.filter(status='FAILED').count(), 3)
+        self.assertFalse(WebhookLog.objects.filter(status__in=webhooks.DUE_STATUSES).exists())
+        self.assertEqual((self.webhook.success_count, self.webhook.failure_count), (0, 1))
+
+    @override_settings(WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT=2)
+    def test_claim_respects_per_endpoint_limit(self):
+        other = Webhook.objects.create(name='other', url=self.receiver.url, event=Webhook.Event.TASK_CREATED)
+        for i in range(4):
+            webhooks.enqueue(self.webhook, {'id': i})
+        webhooks.enqueue(other, {'id': 9})
+
+        claimed = webhooks.claim_due(10)
+        self.assertEqual(sorted(log.webhook_id for log in claimed), sorted([self.webhook.id] * 2 + [other.id]))
+        self.assertEqual(webhooks.claim_due(10), [])
+
+        # An expired lease makes the delivery claimable again
+        WebhookLog.objects.filter(id=claimed[0].id).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([log.id for log in webhooks.claim_due(10)], [claimed[0].id])
+
+    def test_test_delivery_is_never_claimed_by_workers(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='hooker', password='pass', role='ADMIN'))
+        post = webhooks._post
+        claimed_meanwhile = []
+
+        def post_while_worker_polls(session, log):
+            # A deliver_webhooks worker polls while the test request is in flight
+            claimed_meanwhile.extend(webhooks.claim_due(10))
+            return post(session, log)
+
+        with mock.patch.object(webhooks, '_post', post_while_worker_polls):
+            resp = client.post(f'/api/automation/webhooks/{self.webhook.id}/test/', {}, format='json')
+        self.assertEqual(resp.data['status_code'], 200)
+        self.assertEqual(claimed_meanwhile, [])
+        self.assertEqual(len(self.receiver.requests), 1)
+        self.assertEqual(WebhookLog.objects.get().status, 'SUCCESS')
+
+    def test_failed_test_delivery_is_not_retried(self):
+        self.receiver.status_codes = [500]
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='hooker', password='pass', role='ADMIN'))
+        resp = client.post(f'/api/automation/webhooks/{self.webhook.id}/test/', {}, format='json')
+        self.assertEqual(resp.data['status_code'], 500)
+        self.assertEqual(list(WebhookLog.objects.values_list('status', 'is_test')), [('FAILED', True)])
+
+        # A test delivery whose request died is not resent either
+        log = webhooks.claimed_entry(self.webhook, {'test': True}, is_test=True)
+        WebhookLog.objects.filter(id=log.id).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(webhooks.run(once=True), 0)
+        self.assertEqual(WebhookLog.objects.get(id=log.id).status, 'FAILED')
+        self.assertEqual(len(self.receiver.requests), 1)
+
+    def test_unexpected_error_fails_only_its_entry(self):
+        headers = webhooks._headers
+
+        def broken_headers(webhook):
+            if webhook.name == 'broken':
+                raise TypeError('bad header value')
+            return headers(webhook)
+
+        broken = Webhook.objects.create(name='broken', url=self.receiver.url, event=Webhook.Event.TASK_CREATED, max_retries=0)
+        webhooks.enqueue(broken, {'id': 1})
+        webhooks.enqueue(self.webhook, {'id': 2})
+        with mock.patch.object(webhooks, '_headers', broken_headers), self.assertLogs('automation.webhooks', 'ERROR'):
+            self.assertEqual(webhooks.run(once=True), 2)
+        self.assertEqual(
+            dict(WebhookLog.objects.values_list('webhook__name', 'status')), {'broken': 'FAILED', 'hook': 'SUCCESS'}
+        )
+        self.assertIn('TypeError', WebhookLog.objects.get(webhook=broken).error_message)
+
+    def test_send_webhook_only_queues(self):
+        from .utils import send_webhook
+        log = send_webhook(self.webhook, {'id': 1})
+        self.assertEqual(log.status, 'PENDING')
+        self.assertEqual(self.receiver.requests, [])
+
+
+class WorkflowEngineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='pw', role='MEMBER')
+        self.project = Project.objects.create(name='Apollo', key='APL', created_by=self.user)
+        self.task_type = ContentType.objects.get_for_model(Task)
+
+    def make_rule(self, trigger_type, conditions, **kwargs):
+        kwargs.setdefault('created_by', self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return WorkflowRule.objects.create(
+                name='rule', target_content_type=self.task_type, trigger_type=trigger_type,
+                trigger_conditions=conditions, actions=[{'type': 'noop'}], **kwargs
+            )
+
+    def test_operators(self):
+        task = Task(project=self.project, title='Build', status='REVIEW', story_points=5)
+        cases = [
+            ({'status': 'REVIEW'}, True),
+            ({'not_a_field': 'x'}, True),
+            ({'status': {'in': ['DONE', 'REVIEW']}}, True),
+            ({'story_points': {'gt': 5}}, False),
+            ({'story_points': {'gte': 5, 'lt': 8}}, True),
+            ({'project__key': 'APL'}, True),
+            ({'assigned_to': {'is_null': True}}, True),
+            ({'any': [{'status': 'DONE'}, {'title': {'contains': 'uil'}}]}, True),
+            ({'not': {'status': 'REVIEW'}}, False),
+        ]
+        for conditions, expected in cases:
+            with self.subTest(conditions=conditions):
+                self.assertIs(engine.compile_conditions(conditions, Task)(task, {}), expected)
+
+        changed = engine.compile_conditions({'status': {'changed_from': 'TODO', 'changed_to': 'DONE'}}, Task)
+        self.assertTrue(changed(task, {'status': ('TODO', 'DONE')}))
+        self.assertFalse(changed(task, {'status': ('REVIEW', 'DONE')}))
+        self.assertFalse(changed(task, {}))
+        with self.assertRaises(engine.InvalidCondition):
+            engine.compile_conditions({'status': {'matches': 'x'}}, Task)
+
+    def test_dispatch_runs_only_matching_rules(self):
+        done = self.make_rule('STATUS_CHANGE', {'status': {'changed_to': 'DONE'}})
+        self.make_rule('STATUS_CHANGE', {'status': {'changed_to': 'REVIEW'}})
+        created = self.make_rule('CREATED', {})
+
+        task = Task.objects.create(project=self.project, title='Build', status='TODO')
+        task = Task.objects.get(id=task.id)
+        task.status = 'DONE'
+        task.save()
+        task.title = 'Build it'
+        task.save()  # no status change this time
+
+        self.assertEqual(
+            sorted(WorkflowExecution.objects.values_list('rule_id', flat=True)), sorted([created.id, done.id])
+        )
+        done.refresh_from_db()
+        self.assertEqual(done.execution_count, 1)
+
+    def test_rules_only_act_where_their_creator_can_see(self):
+        outsider = User.objects.create_user(username='outsider', password='pw', role='MEMBER')
+        admin = User.objects.create_user(username='root', password='pw', role='ADMIN')
+        own = self.make_rule('CREATED', {})
+        self.make_rule('CREATED', {}, created_by=outsider)
+        self.make_rule('CREATED', {}, created_by=None)
+        everywhere = self.make_rule('CREATED', {}, created_by=admin)
+
+        Task.objects.create(project=self.project, title='Build')
+        self.assertEqual(
+            sorted(WorkflowExecution.objects.values_list('rule_id', flat=True)), sorted([own.id, everywhere.id])
+        )
+
+    def test_rules_indexed_by_value(self):
+        for status in ['TODO', 'IN_PROGRESS', 'REVIEW'] * 20:
+            self.make_rule('UPDATED', {'status': status, 'story_points': {'gte': 1}})
+        self.make_rule('UPDATED', {'priority': {'in': ['HIGH']}})
+        task = Task(project=self.project, title='Build', status='REVIEW', priority='HIGH', story_points=3)
+
+        bucket = engine.rules_for(self.task_type.id, 'UPDATED')
+        self.assertEqual(len(bucket.candidates(task)), 21)
+        # Only the rules version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(len(engine.matching_rules(task, 'UPDATED')), 21)
+
+    def test_cache_invalidated_on_rule_change(self):
+        rule = self.make_rule('UPDATED', {'status': 'DONE'})
+        task = Task(project=self.project, title='Build', status='DONE')
+        self.assertEqual(len(engine.matching_rules(task, 'UPDATED')), 1)
+
+        rule.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.save()
+        self.assertEqual(engine.matching_rules(task, 'UPDATED'), [])
+
+        # Re-enabled by another process: only the version in the database moves
+        WorkflowRule.objects.filter(id=rule.id).update(is_active=True)
+        Sequence.objects.filter(name=engine.VERSION_NAME).update(value=F('value') + 1)
+        self.assertEqual(len(engine.matching_rules(task, 'UPDATED')), 1)
+
+
+class ActionBatchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pw', role='MEMBER')
+        self.recipients = User.objects.bulk_create(
+            [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(500)]
+        )
+        self.project = Project.objects.create(name='Apollo', created_by=self.owner)
+        self.task = Task.objects.get(id=Task.objects.create(project=self.project, title='Build', status='TODO').id)
+        self.webhook = Webhook.objects.create(name='hook', url='http://example.com/hook', event=Webhook.Event.TASK_UPDATED)
+        self.rule = WorkflowRule.objects.create(
+            name='fan out', target_content_type=ContentType.objects.get_for_model(Task), trigger_type='UPDATED',
+            actions=[
+                {'type': 'update_status', 'status': 'IN_PROGRESS'},
+                {'type': 'assign_to', 'user_id': self.owner.id},
+                {'type': 'send_notification', 'user_ids': [u.id for u in self.recipients]},
+                {'type': 'trigger_webhook', 'webhook_id': self.webhook.id},
+            ],
+        )
+
+    def test_fan_out_is_a_handful_of_queries(self):
+        batch = ActionBatch()
+        batch.run_rule(self.rule, self.task)
+        with CaptureQueriesContext(connection) as queries:
+            execution, = batch.flush()
+
+        # One user lookup and one target save, however many recipients (inserts split only at SQLite's variable limit)
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertEqual(sum(s.startswith('SELECT "users_user"') for s in sql), 1)
+        self.assertEqual(sum(s.startswith('UPDATE "projects_task"') for s in sql), 1)
+        self.assertLess(len(sql), 30)
+
+        self.task.refresh_from_db()
+        self.rule.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.assigned_to_id), ('IN_PROGRESS', self.owner.id))
+        self.assertEqual(Notification.objects.filter(object_id=self.task.id).count(), 500)
+        self.assertEqual(WebhookLog.objects.filter(webhook=self.webhook, status='PENDING').count(), 1)
+        self.assertEqual((self.rule.execution_count, execution.status), (1, 'SUCCESS'))
+        self.assertEqual(
+            [action['result']['success'] for action in execution.actions_executed], [True, True, True, True]
+        )
+
+    def test_many_targets_share_one_flush(self):
+        tasks = [Task.objects.create(project=self.project, title=f'T{i}', status='TODO') for i in range(5)]
+        self.rule.actions = [{'type': 'update_status', 'status': 'REVIEW'}, {'type': 'assign_to', 'user_id': 999999}]
+        with ActionBatch() as batch:
+            for task in tasks:
+                batch.run_rule(self.rule, task)
+
+        self.rule.refresh_from_db()
+        self.assertEqual(self.rule.execution_count, 5)
+        self.assertEqual(Task.objects.filter(status='REVIEW').count(), 5)
+        results = WorkflowExecution.objects.values_list('actions_executed', flat=True)
+        self.assertTrue(all(actions[1]['result'] == {'success': False, 'error': 'User not found'} for actions in results))
+
+    def test_ids_from_rule_json_may_be_strings(self):
+        self.rule.actions = [
+            {'type': 'assign_to', 'user_id': str(self.owner.id)},
+            {'type': 'send_notification', 'user_ids': [str(self.recipients[0].id), self.recipients[1].id, 999999, 'x']},
+        ]
+        batch = ActionBatch()
+        batch.run_rule(self.rule, self.task)
+        execution, = batch.flush()
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.assigned_to_id, self.owner.id)
+        self.assertEqual(Notification.objects.filter(object_id=self.task.id).count(), 2)
+        self.assertEqual(
+            [action['result'] for action in execution.actions_executed],
+            [{'success': True, 'assigned_to': 'owner'}, {'success': True, 'notifications_sent': 2}],
+        )
+
+    def test_failed_save_is_recorded_and_spares_other_targets(self):
+        broken = Task.objects.create(project=self.project, title='Broken', status='TODO')
+        self.rule.actions = [
+            {'type': 'update_status', 'status': 'REVIEW'},
+            {'type': 'send_notification', 'user_ids': [self.owner.id]},
+        ]
+        with mock.patch.object(broken, 'save', side_effect=RuntimeError('disk full')):
+            batch = ActionBatch()
+            batch.run_rule(self.rule, broken)
+            batch.run_rule(self.rule, self.task)
+            failed, succeeded = batch.flush()
+
+        self.assertEqual((failed.status, succeeded.status), ('FAILED', 'SUCCESS'))
+        self.assertIn('Execution failed: disk full', failed.execution_log)
+        self.assertEqual(Task.objects.get(id=broken.id).status, 'TODO')
+        self.assertEqual(Task.objects.get(id=self.task.id).status, 'REVIEW')
+        self.assertEqual(list(Notification.objects.values_list('object_id', flat=True)), [self.task.id])
+        self.rule.refresh_from_db()
+        self.assertEqual(self.rule.execution_count, 1)
+
+
+class CronExpressionTest(TestCase):
+    def at(self, *args):
+        return timezone.make_aware(datetime(*args))
+
+    def test_next_after(self):
+        cases = [
+            ('*/15 * * * *', self.at(2026, 3, 4, 10, 7), self.at(2026, 3, 4, 10, 15)),
+            ('0 9 * * mon-fri', self.at(2026, 3, 6, 9, 0), self.at(2026, 3, 9, 9, 0)),  # Friday -> Monday
+            ('30 2 1 * *', self.at(2026, 3, 4, 0, 0), self.at(2026, 4, 1, 2, 30)),
+            ('0 0 13 * 5', self.at(2026, 3, 1, 0, 0), self.at(2026, 3, 6, 0, 0)),  # either day field matches
+            ('@yearly', self.at(2026, 3, 4, 0, 0), self.at(2027, 1, 1, 0, 0)),
+        ]
+        for expression, start, expected in cases:
+            with self.subTest(expression=expression):
+                self.assertEqual(CronExpression(expression).next_after(start), expected)
+        self.assertIsNone(CronExpression('0 0 31 2 *').next_after(self.at(2026, 1, 1)))
+
+    def test_invalid(self):
+        for expression in ['* * * *', '61 * * * *', '*/0 * * * *', '0 0 * * funday']:
+            with self.subTest(expression=expression), self.assertRaises(CronError):
+                CronExpression(expression)
+
+
+class SchedulerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='pw', role='MEMBER')
+        self.project = Project.objects.create(name='Apollo', created_by=self.user)
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+    def make_rule(self, **kwargs):
+        kwargs.setdefault('created_by', self.user)
+        return WorkflowRule.objects.create(
+            name='rule', target_content_type=ContentType.objects.get_for_model(Task),
+            actions=[{'type': 'update_status', 'status': 'REVIEW'}], **kwargs
+        )
+
+    def test_heap_orders_rules_by_next_fire(self):
+        hourly = self.make_rule(trigger_type='SCHEDULED', is_scheduled=True, schedule_cron='@hourly')
+        often = self.make_rule(trigger_type='SCHEDULED', is_scheduled=True, schedule_cron='* * * * *')
+        self.make_rule(trigger_type='SCHEDULED', is_scheduled=True, schedule_cron='not a cron')
+        self.make_rule(trigger_type='SCHEDULED', is_scheduled=False, schedule_cron='* * * * *')
+
+        # Not at minute 59, where the hourly and the every-minute rule would tie
+        now = self.now.replace(minute=30)
+        sched = scheduler.Scheduler()
+        with self.assertLogs('automation.scheduler', 'WARNING'):
+            sched.load(now)
+        self.assertEqual([rule_id for _, rule_id in sorted(sched.heap)], [often.id, hourly.id])
+        self.assertEqual(sched.next_fire(), now + timedelta(minutes=1))
+        self.assertEqual(sched.run_due(now), 0)
+
+    def test_due_date_window(self):
+        rule = self.make_rule(trigger_type='DUE_DATE_APPROACHING', trigger_conditions={'within_hours': 24, 'priority': 'HIGH'})
+
+        def due(hours, priority='HIGH', status='TODO'):
+            return Task.objects.create(
+                project=self.project, title='T', status=status, priority=priority,
+                due_date=self.now + timedelta(hours=hours)
+            )
+        soon, later, low = due(5), due(30), due(5, priority='LOW')
+        due(2, status='DONE')
+
+        rule.refresh_from_db()
+        with self.assertNumQueries(1):
+            targets = list(scheduler.due_targets(rule, Task, self.now))
+        self.assertEqual([t.id for t in targets], [soon.id, low.id])
+
+        predicate = engine.compile_conditions(rule.trigger_conditions, Task)
+        self.assertEqual(scheduler.run_rule(rule, predicate, Task, self.now), 1)
+        self.assertEqual(Task.objects.get(id=soon.id).status, 'REVIEW')
+
+        # Created already inside the look-ahead: caught by the next firing, and `soon` does not fire again
+        late_comer = due(3)
+        self.assertEqual(scheduler.run_rule(rule, predicate, Task, self.now + timedelta(minutes=15)), 1)
+        self.assertEqual(Task.objects.get(id=late_comer.id).status, 'REVIEW')
+
+        # Six hours later `later` has entered the window, and so has `soon` again after being rescheduled
+        Task.objects.filter(id=soon.id).update(due_date=self.now + timedelta(hours=26))
+        six_hours = self.now + timedelta(hours=6)
+        self.assertEqual(scheduler.run_rule(rule, predicate, Task, six_hours), 2)
+        self.assertEqual(Task.objects.get(id=later.id).status, 'REVIEW')
+        self.assertEqual(WorkflowExecution.objects.filter(rule=rule, target_object_id=soon.id).count(), 2)
+        stale = WorkflowRule.objects.get(id=rule.id)
+        stale.last_scheduled_at = self.now
+        self.assertEqual(scheduler.run_rule(stale, predicate, Task, six_hours + timedelta(minutes=15)), 0)
+
+    def test_targets_are_limited_to_what_the_creator_can_see(self):
+        outsider = User.objects.create_user(username='outsider', password='pw', role='MEMBER')
+        Task.objects.create(project=self.project, title='T', status='TODO', due_date=self.now + timedelta(hours=2))
+        predicate = engine.compile_conditions({}, Task)
+        for trigger in ('DUE_DATE_APPROACHING', 'SCHEDULED'):
+            rule = self.make_rule(trigger_type=trigger, created_by=outsider)
+            self.assertEqual(scheduler.run_rule(rule, predicate, Task, self.now), 0)
+        rule = self.make_rule(trigger_type='SCHEDULED')
+        self.assertEqual(scheduler.run_rule(rule, predicate, Task, self.now), 1)
+
+    def test_rule_changes_from_other_processes_are_picked_up(self):
+        rule = self.make_rule(trigger_type='SCHEDULED', is_scheduled=True, schedule_cron='@hourly')
+        Task.objects.create(project=self.project, title='A', status='TODO')
+        sched = scheduler.Scheduler()
+        sched.refresh(self.now)
+
+        # Disabled elsewhere: the firing is not claimed even before the next reload
+        WorkflowRule.objects.filter(id=rule.id).update(is_active=False)
+        predicate = engine.compile_conditions({}, Task)
+        self.assertEqual(scheduler.run_rule(rule, predicate, Task, self.now), 0)
+        self.assertEqual(Task.objects.get().status, 'TODO')
+
+        # Added elsewhere: another process moves only the version in the database
+        added = self.make_rule(trigger_type='SCHEDULED', is_scheduled=True, schedule_cron='* * * * *')
+        Sequence.objects.filter(name=engine.VERSION_NAME).update(value=F('value') + 1)
+        sched.refresh(self.now)
+        self.assertEqual(set(sched.entries), {added.id})
+
+    def test_broken_rule_does_not_stop_the_others(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        resp = client.post('/api/automation/rules/', {
+            'name': 'due', 'target_content_type': ContentType.objects.get_for_model(Task).id,
+            'trigger_type': 'DUE_DATE_APPROACHING', 'trigger_conditions': {'within_hours': 'soon'}, 'actions': [],
+        }, format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('within_hours', str(resp.data['trigger_conditions']))
+
+        # Saved before the check existed
+        broken = self.make_rule(trigger_type='DUE_DATE_APPROACHING', trigger_conditions={'within_hours': 'soon'})
+        working = self.make_rule(trigger_type='SCHEDULED', is_scheduled=True, schedule_cron='* * * * *')
+        Task.objects.create(project=self.project, title='A', status='TODO')
+        sched = scheduler.Scheduler()
+        sched.load(self.now)
+        with self.assertLogs('automation.scheduler', 'ERROR'):
+            self.assertEqual(sched.run_due(self.now + timedelta(minutes=15)), 2)
+        self.assertEqual(Task.objects.get().status, 'REVIEW')
+        self.assertIn(broken.id, [rule_id for _, rule_id in sched.heap])
+        working.refresh_from_db()
+        self.assertEqual(working.execution_count, 1)
+
+    def test_run_once_fires_due_rules(self):
+        rule = self.make_rule(
+            trigger_type='SCHEDULED', is_scheduled=True, schedule_cron='* * * * *',
+            trigger_conditions={'status': 'TODO'}, last_scheduled_at=self.now - timedelta(minutes=5),
+        )
+        Task.objects.create(project=self.project, title='A', status='TODO')
+        Task.objects.create(project=self.project, title='B', status='DONE')
+
+        self.assertEqual(scheduler.run(once=True), 1)
+        rule.refresh_from_db()
+        self.assertEqual(rule.execution_count, 1)
+        self.assertEqual(Task.objects.filter(status='REVIEW').count(), 1)
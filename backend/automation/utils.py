@@ -1,241 +1,295 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
-from .models import WorkflowExecution, WebhookLog
-import requests
-import json
+from .models import WorkflowRule, WorkflowExecution, Webhook, WebhookLog
+from . import webhooks
+from .engine import compile_conditions, no_dispatch
+
+
+class ActionBatch:
+    """
+    Collects the actions of one or many rule runs and writes them together
+
+    `flush()` does one `in_bulk` for every user referenced, one save with
+    `update_fields` per modified target, one `bulk_create` each for
+    notifications, webhook deliveries and executions, and one `F()` counter
+    update per rule, however many targets and recipients are involved.
+    Results of queued actions are filled in when the batch is flushed. A
+    target whose save fails marks its runs FAILED, as an unbatched run would
+    be, and gets none of its queued notifications or webhooks; the other
+    targets of the batch are still written.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._executions = []
+        self._saves = {}
+        self._notifications = []
+        self._assignments = []
+        self._webhooks = []
+        self._rule_runs = Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    def run_rule(self, rule, target_object, triggered_by=None, conditions_met=None):
+        """Queue a rule run; its WorkflowExecution is created by flush()"""
+        execution = {
+            'rule': rule, 'target': target_object, 'triggered_by': triggered_by,
+            'status': 'SUCCESS', 'log': [], 'actions': [],
+        }
+        self._executions.append(execution)
+
+        try:
+            # Evaluate conditions
+            if conditions_met is None:
+                conditions_met = evaluate_conditions(rule.trigger_conditions, target_object)
+            if not conditions_met:
+                execution['log'].append("Conditions not met, skipping execution")
+                execution['status'] = 'PARTIAL'
+            else:
+                # Queue each action
+                for action_config in rule.actions:
+                    action_type = action_config.get('type')
+                    execution['actions'].append({
+                        'type': action_type,
+                        'config': action_config,
+                        'result': self.add_action(action_type, action_config, target_object)
+                    })
+                    execution['log'].append(f"Executed action: {action_type}")
+            self._rule_runs[rule.id] += 1
+        except Exception as e:
+            execution['status'] = 'FAILED'
+            execution['log'].append(f"Execution failed: {str(e)}")
+        return execution
+
+    def _set_field(self, target_object, field, value):
+        _, fields = self._saves.setdefault(id(target_object), (target_object, set()))
+        setattr(target_object, field, value)
+        fields.add(field)
+
+    def add_action(self, action_type, action_config, target_object):
+        """Queue one action; returns its result dict, completed on flush()"""
+        if action_type == 'update_status':
+            # Update status field
+            new_status = action_config.get('status')
+            if hasattr(target_object, 'status'):
+                self._set_field(target_object, 'status', new_status)
+                return {'success': True, 'new_status': new_status}
+
+        elif action_type == 'assign_to':
+            # Assign to a user; checked against the users loaded on flush
+            user_id = action_config.get('user_id')
+            if user_id and hasattr(target_object, 'assigned_to'):
+                user_id = _pk(user_id)
+                if user_id is None:
+                    return {'success': False, 'error': 'User not found'}
+                result = {}
+                self._assignments.append((target_object, user_id, result))
+                return result
+
+        elif action_type == 'send_notification':
+            # Send a notification
+            # Rules are JSON, so ids may come as strings; unknown ones are skipped
+            user_ids = [user_id for user_id in map(_pk, action_config.get('user_ids', [])) if user_id is not None]
+            result = {'success': True, 'notifications_sent': 0}
+            self._notifications.append((
+                target_object, user_ids,
+                action_config.get('verb', 'requires your attention'),
+                action_config.get('message', 'You have a new notification'),
+                result,
+            ))
+            return result
+
+        elif action_type == 'trigger_webhook':
+            # Trigger a webhook
+            webhook_id = _pk(action_config.get('webhook_id'))
+            if webhook_id:
+                result = {}
+                payload = {
+                    'event': 'workflow_triggered',
+                    'object_id': target_object.id if hasattr(target_object, 'id') else None,
+                    'timestamp': timezone.now().isoformat()
+                }
+                self._webhooks.append((target_object, webhook_id, payload, result))
+                return result
+
+        return {'success': False, 'error': f'Unknown action type: {action_type}'}
+
+    def flush(self):
+        """Write everything queued; returns the WorkflowExecutions in queue order"""
+        User = get_user_model()
+        user_ids = {user_id for _, user_id, _ in self._assignments}
+        for _, ids, _, _, _ in self._notifications:
+            user_ids.update(ids)
+        users = User.objects.in_bulk(user_ids) if user_ids else {}
+
+        with transaction.atomic(), no_dispatch():
+            for target_object, user_id, result in self._assignments:
+                user = users.get(user_id)
+                if user is None:
+                    result.update({'success': False, 'error': 'User not found'})
+                    continue
+                self._set_field(target_object, 'assigned_to', user)
+                result.update({'success': True, 'assigned_to': user.username})
+
+            failed = {}
+            for key, (target_object, fields) in self._saves.items():
+                try:
+                    with transaction.atomic():
+                        target_object.save(update_fields=_with_auto_now(target_object, fields))
+                except Exception as e:
+                    failed[key] = e
+            for execution in self._executions:
+                error = failed.get(id(execution['target']))
+                if error is not None and execution['status'] != 'FAILED':
+                    execution['status'] = 'FAILED'
+                    execution['log'].append(f"Execution failed: {str(error)}")
+                    self._rule_runs[execution['rule'].id] -= 1
+
+            self._create_notifications(users, failed)
+            self._enqueue_webhooks(failed)
+
+            now = timezone.now()
+            for rule_id, runs in self._rule_runs.items():
+                if not runs:
+                    continue
+                WorkflowRule.objects.filter(id=rule_id).update(
+                    execution_count=F('execution_count') + runs, last_executed=now
+                )
+
+            executions = WorkflowExecution.objects.bulk_create([
+                WorkflowExecution(
+                    rule=execution['rule'],
+                    triggered_by_user=execution['triggered_by'],
+                    target_content_type_id=execution['rule'].target_content_type_id,
+                    target_object_id=getattr(execution['target'], 'id', None) or 0,
+                    status=execution['status'],
+                    actions_executed=execution['actions'],
+                    execution_log='\n'.join(execution['log'])
+                )
+                for execution in self._executions
+            ])
+
+        self._reset()
+        return executions
+
+    def _create_notifications(self, users, failed):
+        from collaboration.models import Notification
+        from notifications import counters
+
+        notifications = []
+        for target_object, user_ids, verb, message, result in self._notifications:
+            if id(target_object) in failed:
+                continue
+            content_type = ContentType.objects.get_for_model(target_object)
+            created = [
+                Notification(
+                    user=users[user_id], verb=verb, description=message,
+                    content_type=content_type, object_id=target_object.id
+                )
+                for user_id in user_ids if user_id in users
+            ]
+            result['notifications_sent'] = len(created)
+            notifications.extend(created)
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        counters.add('notifications', [notification.user_id for notification in notifications])
+
+    def _enqueue_webhooks(self, failed):
+        queued = [entry for entry in self._webhooks if id(entry[0]) not in failed]
+        if not queued:
+            return
+        found = Webhook.objects.in_bulk({webhook_id for _, webhook_id, _, _ in queued})
+        logs = []
+        for _, webhook_id, payload, result in queued:
+            if webhook_id not in found:
+                result.update({'success': False, 'error': 'Webhook not found'})
+                continue
+            logs.append(webhooks.outbox_entry(found[webhook_id], payload))
+            result.update({'success': True, 'webhook_triggered': True})
+        WebhookLog.objects.bulk_create(logs)
+
 
-def execute_workflow_rule(rule, target_object, triggered_by=None):
+def _pk(value):
+    """`value` as a primary key, or None when it cannot be one"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _with_auto_now(instance, fields):
+    """`fields` plus auto_now timestamps, which save(update_fields=...) only touches when listed"""
+    auto_now = [f.name for f in instance._meta.concrete_fields if getattr(f, 'auto_now', False)]
+    return sorted({*fields, *auto_now})
+
+
+def execute_workflow_rule(rule, target_object, triggered_by=None, conditions_met=None):
     """
     Execute a workflow rule on a target object
-    
+
     Args:
         rule: WorkflowRule instance
         target_object: The object that triggered the rule
         triggered_by: User who triggered the action (optional)
-    
+        conditions_met: Skip evaluating the conditions when the caller already did (optional)
+
     Returns:
         WorkflowExecution instance
     """
-    execution_log = []
-    actions_executed = []
-    status = 'SUCCESS'
-    
-    try:
-        # Evaluate conditions
-        if not evaluate_conditions(rule.trigger_conditions, target_object):
-            execution_log.append("Conditions not met, skipping execution")
-            status = 'PARTIAL'
-        else:
-            # Execute each action
-            for action_config in rule.actions:
-                action_type = action_config.get('type')
-                action_result = execute_action(action_type, action_config, target_object)
-                
-                actions_executed.append({
-                    'type': action_type,
-                    'config': action_config,
-                    'result': action_result
-                })
-                execution_log.append(f"Executed action: {action_type}")
-        
-        # Update rule stats
-        rule.execution_count += 1
-        rule.last_executed = timezone.now()
-        rule.save()
-        
-    except Exception as e:
-        status = 'FAILED'
-        execution_log.append(f"Execution failed: {str(e)}")
-    
-    # Create execution record
-    execution = WorkflowExecution.objects.create(
-        rule=rule,
-        triggered_by_user=triggered_by,
-        target_content_type=rule.target_content_type,
-        target_object_id=target_object.id if hasattr(target_object, 'id') else 0,
-        status=status,
-        actions_executed=actions_executed,
-        execution_log='\n'.join(execution_log)
-    )
-    
-    return execution
+    batch = ActionBatch()
+    batch.run_rule(rule, target_object, triggered_by, conditions_met)
+    return batch.flush()[0]
 
 def evaluate_conditions(conditions, target_object):
     """
     Evaluate if conditions are met
-    
+
     Args:
-        conditions: Dict of conditions to evaluate
+        conditions: Dict of conditions to evaluate (see automation.engine for the format)
         target_object: The object to evaluate against
-    
+
     Returns:
         Boolean indicating if conditions are met
     """
-    if not conditions:
-        return True
-    
-    # Example condition evaluation
-    # You would expand this based on your needs
-    for field, expected_value in conditions.items():
-        if hasattr(target_object, field):
-            actual_value = getattr(target_object, field)
-            if actual_value != expected_value:
-                return False
-    
-    return True
+    return compile_conditions(conditions, type(target_object))(target_object, {})
 
 def execute_action(action_type, action_config, target_object):
     """
     Execute a specific action
-    
+
     Args:
         action_type: Type of action (e.g., 'assign', 'notify', 'update_status')
         action_config: Configuration for the action
         target_object: The target object
-    
+
     Returns:
         Result of the action execution
     """
-    from django.contrib.contenttypes.models import ContentType
-    from collaboration.models import Notification
-    from django.contrib.auth import get_user_model
-    
-    User = get_user_model()
-    
-    if action_type == 'update_status':
-        # Update status field
-        new_status = action_config.get('status')
-        if hasattr(target_object, 'status'):
-            target_object.status = new_status
-            target_object.save()
-            return {'success': True, 'new_status': new_status}
-    
-    elif action_type == 'assign_to':
-        # Assign to a user
-        user_id = action_config.get('user_id')
-        if user_id and hasattr(target_object, 'assigned_to'):
-            try:
-                user = User.objects.get(id=user_id)
-                target_object.assigned_to = user
-                target_object.save()
-                return {'success': True, 'assigned_to': user.username}
-            except User.DoesNotExist:
-                return {'success': False, 'error': 'User not found'}
-    
-    elif action_type == 'send_notification':
-        # Send a notification
-        user_ids = action_config.get('user_ids', [])
-        message = action_config.get('message', 'You have a new notification')
-        verb = action_config.get('verb', 'requires your attention')
-        
-        content_type = ContentType.objects.get_for_model(target_object)
-        
-        for user_id in user_ids:
-            try:
-                user = User.objects.get(id=user_id)
-                Notification.objects.create(
-                    user=user,
-                    verb=verb,
-                    description=message,
-                    content_type=content_type,
-                    object_id=target_object.id
-                )
-            except User.DoesNotExist:
-                pass
-        
-        return {'success': True, 'notifications_sent': len(user_ids)}
-    
-    elif action_type == 'trigger_webhook':
-        # Trigger a webhook
-        webhook_id = action_config.get('webhook_id')
-        if webhook_id:
-            from .models import Webhook
-            try:
-                webhook = Webhook.objects.get(id=webhook_id)
-                payload = {
-                    'event': 'workflow_triggered',
-                    'object_id': target_object.id if hasattr(target_object, 'id') else None,
-                    'timestamp': timezone.now().isoformat()
-                }
-                send_webhook(webhook, payload)
-                return {'success': True, 'webhook_triggered': True}
-            except Webhook.DoesNotExist:
-                return {'success': False, 'error': 'Webhook not found'}
-    
-    return {'success': False, 'error': f'Unknown action type: {action_type}'}
+    batch = ActionBatch()
+    result = batch.add_action(action_type, action_config, target_object)
+    batch.flush()
+    return result
 
 def send_webhook(webhook, payload):
     """
-    Send a webhook HTTP request
-    
+    Queue a webhook delivery
+
     Args:
         webhook: Webhook instance
         payload: Data to send
-    
+
     Returns:
-        requests.Response object
+        WebhookLog row in the outbox; `manage.py deliver_webhooks` sends it
     """
-    headers = webhook.headers.copy()
-    headers['Content-Type'] = 'application/json'
-    
-    if webhook.secret_token:
-        headers['X-Webhook-Secret'] = webhook.secret_token
-    
-    max_attempts = webhook.max_retries + 1
-    
-    for attempt in range(1, max_attempts + 1):
-        try:
-            response = requests.post(
-                webhook.url,
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            
-            # Log the delivery
-            log_status = 'SUCCESS' if response.status_code < 400 else 'FAILED'
-            WebhookLog.objects.create(
-                webhook=webhook,
-                status=log_status,
-                status_code=response.status_code,
-                request_payload=payload,
-                response_body=response.text[:1000],
-                attempt_number=attempt
-            )
-            
-            # Update webhook stats
-            if response.status_code < 400:
-                webhook.success_count += 1
-                webhook.last_triggered = timezone.now()
-                webhook.save()
-                return response
-            else:
-                if attempt < max_attempts:
-                    # Retry
-                    import time
-                    time.sleep(webhook.retry_delay_seconds)
-                    continue
-                else:
-                    webhook.failure_count += 1
-                    webhook.save()
-                    return response
-                    
-        except Exception as e:
-            error_msg = str(e)
-            WebhookLog.objects.create(
-                webhook=webhook,
-                status='FAILED',
-                request_payload=payload,
-                attempt_number=attempt,
-                error_message=error_msg
-            )
-            
-            if attempt < max_attempts:
-                import time
-                time.sleep(webhook.retry_delay_seconds)
-                continue
-            else:
-                webhook.failure_count += 1
-                webhook.save()
-                raise
-    
-    return None
+    return webhooks.enqueue(webhook, payload)
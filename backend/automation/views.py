@@ -1,17 +1,20 @@
+import os
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from users.utils import user_role_in
+from django.http import FileResponse
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import F, Q
 from .models import WorkflowRule, WorkflowExecution, Webhook, WebhookLog, BackgroundJob, AutomationTemplate
 from .serializers import (
     WorkflowRuleSerializer, WorkflowExecutionSerializer, WebhookSerializer,
     WebhookLogSerializer, BackgroundJobSerializer, AutomationTemplateSerializer
 )
-from .utils import execute_workflow_rule, send_webhook
-import requests
+from .utils import execute_workflow_rule
+from . import jobs, webhooks
 
 class WorkflowRuleViewSet(viewsets.ModelViewSet):
     queryset = WorkflowRule.objects.all()
@@ -45,9 +48,9 @@ class WorkflowRuleViewSet(viewsets.ModelViewSet):
             execution_log="Test execution completed successfully"
         )
         
-        rule.execution_count += 1
-        rule.last_executed = timezone.now()
-        rule.save()
+        WorkflowRule.objects.filter(id=rule.id).update(
+            execution_count=F('execution_count') + 1, last_executed=timezone.now()
+        )
         
         return Response({
             'message': 'Rule executed successfully',
@@ -104,37 +107,21 @@ class WebhookViewSet(viewsets.ModelViewSet):
             'data': request.data.get('test_data', {'message': 'Test webhook'})
         }
         
-        try:
-            response = send_webhook(webhook, test_payload)
-            
-            # Log the test
-            log = WebhookLog.objects.create(
-                webhook=webhook,
-                status='SUCCESS' if response.status_code < 400 else 'FAILED',
-                status_code=response.status_code,
-                request_payload=test_payload,
-                response_body=response.text[:1000],  # Truncate long responses
-                attempt_number=1
-            )
-            
-            if response.status_code < 400:
-                webhook.success_count += 1
-            else:
-                webhook.failure_count += 1
-            webhook.last_triggered = timezone.now()
-            webhook.save()
-            
-            return Response({
-                'success': response.status_code < 400,
-                'status_code': response.status_code,
-                'response': response.text[:500]
-            })
-            
-        except Exception as e:
+        # Test deliveries are sent inline so the caller sees the receiver's answer. The row is
+        # written already claimed, so a running deliver_webhooks worker cannot send it too.
+        log = webhooks.claimed_entry(webhook, test_payload, is_test=True)
+        status_code, body, error = webhooks.deliver_now(log)
+        if error:
             return Response({
                 'success': False,
-                'error': str(e)
+                'error': error
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({
+            'success': status_code < 400,
+            'status_code': status_code,
+            'response': body[:500]
+        })
     
     @action(detail=True, methods=['get'])
     def logs(self, request, pk=None):
@@ -174,6 +161,16 @@ class BackgroundJobViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
     
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the file produced by a completed job"""
+        job = self.get_object()
+        # Derived from the job's id and parameters; `result` is never trusted for a path
+        path = jobs.output_path(job)
+        if path is None:
+            return Response({'error': 'This job has no file to download'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
     @action(detail=True, methods=['get'])
     def status(self, request, pk=None):
         """Get detailed job status"""
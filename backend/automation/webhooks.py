@@ -0,0 +1,208 @@
+"""
+Outbox-based webhook delivery.
+
+`enqueue()` writes a PENDING WebhookLog row in the caller's transaction, so a
+delivery exists exactly when the change that triggered it commits, and the
+request never waits on the receiver. `manage.py deliver_webhooks` drains the
+outbox:
+
+- due rows are claimed by flipping them to SENDING with a lease in
+  `next_attempt_at` (a crashed worker's rows become due again when it expires);
+- at most WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT deliveries per webhook are in
+  flight at once across all workers;
+- HTTP requests run concurrently on a thread pool sharing one pooled
+  requests.Session, while all database writes stay on the worker's main thread;
+- a failed attempt is logged as FAILED and, while retries remain, a RETRY row
+  is scheduled `retry_delay_seconds * 2 ** (attempt - 1)` later instead of sleeping;
+- test deliveries (`is_test`, sent inline by the webhook test endpoint) are
+  never retried, and one whose sender died is marked FAILED when its lease expires.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import Webhook, WebhookLog
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 10
+# How long a claimed delivery stays SENDING before another worker may retry it
+LEASE_SECONDS = 120
+MAX_BACKOFF_SECONDS = 60 * 60
+DEFAULT_MAX_CONCURRENCY_PER_ENDPOINT = 4
+
+DUE_STATUSES = [WebhookLog.Status.PENDING, WebhookLog.Status.RETRY]
+
+
+def outbox_entry(webhook, payload, attempt_number=1, delay=0):
+    """Unsaved WebhookLog for a delivery, for callers that bulk_create several"""
+    return WebhookLog(
+        webhook=webhook,
+        status=WebhookLog.Status.PENDING if attempt_number == 1 else WebhookLog.Status.RETRY,
+        request_payload=payload,
+        attempt_number=attempt_number,
+        next_attempt_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue(webhook, payload, attempt_number=1, delay=0):
+    """Schedule a delivery; call inside the transaction that produced the event"""
+    log = outbox_entry(webhook, payload, attempt_number, delay)
+    log.save()
+    return log
+
+
+def claimed_entry(webhook, payload, is_test=False):
+    """Write a delivery that is already claimed (SENDING under a lease), for callers sending it themselves"""
+    log = outbox_entry(webhook, payload)
+    log.status = WebhookLog.Status.SENDING
+    log.is_test = is_test
+    log.next_attempt_at = timezone.now() + timedelta(seconds=LEASE_SECONDS)
+    log.save()
+    return log
+
+
+def backoff_seconds(webhook, attempt_number):
+    """Delay before retrying after `attempt_number` failed"""
+    return min(webhook.retry_delay_seconds * 2 ** (attempt_number - 1), MAX_BACKOFF_SECONDS)
+
+
+def make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _max_per_endpoint():
+    return getattr(settings, 'WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT', DEFAULT_MAX_CONCURRENCY_PER_ENDPOINT)
+
+
+def claim_due(limit):
+    """Claim up to `limit` due deliveries, respecting the per-endpoint concurrency limit"""
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=LEASE_SECONDS)
+    per_endpoint = _max_per_endpoint()
+
+    WebhookLog.objects.filter(status=WebhookLog.Status.SENDING, is_test=True, next_attempt_at__lte=now).update(
+        status=WebhookLog.Status.FAILED, next_attempt_at=None, error_message='Test delivery interrupted'
+    )
+    in_flight = dict(
+        WebhookLog.objects.filter(status=WebhookLog.Status.SENDING, next_attempt_at__gt=now)
+        .order_by().values('webhook_id').annotate(n=Count('id')).values_list('webhook_id', 'n')
+    )
+    candidates = WebhookLog.objects.filter(
+        status__in=DUE_STATUSES + [WebhookLog.Status.SENDING],
+        next_attempt_at__lte=now,
+        webhook__is_active=True,
+    ).order_by('next_attempt_at', 'id').values_list('id', 'webhook_id', 'status')[:limit * 4]
+
+    claimed = []
+    for log_id, webhook_id, status in candidates:
+        if len(claimed) >= limit:
+            break
+        if in_flight.get(webhook_id, 0) >= per_endpoint:
+            continue
+        # Compare-and-swap on status/lease, so concurrent workers never claim the same row
+        won = WebhookLog.objects.filter(id=log_id, status=status, next_attempt_at__lte=now).update(
+            status=WebhookLog.Status.SENDING, next_attempt_at=lease_until
+        )
+        if won:
+            in_flight[webhook_id] = in_flight.get(webhook_id, 0) + 1
+            claimed.append(log_id)
+
+    return list(WebhookLog.objects.filter(id__in=claimed).select_related('webhook').order_by('next_attempt_at', 'id'))
+
+
+def _headers(webhook):
+    headers = dict(webhook.headers or {})
+    headers['Content-Type'] = 'application/json'
+    if webhook.secret_token:
+        headers['X-Webhook-Secret'] = webhook.secret_token
+    return headers
+
+
+def _post(session, log):
+    """Send one delivery; runs on a pool thread and touches no database state"""
+    try:
+        response = session.post(
+            log.webhook.url, json=log.request_payload, headers=_headers(log.webhook), timeout=REQUEST_TIMEOUT
+        )
+        return response.status_code, response.text[:1000], ''
+    except requests.RequestException as exc:
+        return None, '', str(exc)
+    except Exception as exc:
+        # A bad entry (e.g. an invalid URL or an unserializable payload) fails alone, not the whole batch
+        logger.exception("Webhook delivery %s could not be sent", log.id)
+        return None, '', f'{type(exc).__name__}: {exc}'
+
+
+def record_result(log, status_code, body, error):
+    """Store the outcome of an attempt, scheduling the next one if it failed and retries remain"""
+    webhook = log.webhook
+    succeeded = status_code is not None and status_code < 400
+    now = timezone.now()
+
+    with transaction.atomic():
+        log.status = WebhookLog.Status.SUCCESS if succeeded else WebhookLog.Status.FAILED
+        log.status_code = status_code
+        log.response_body = body
+        log.error_message = error
+        log.next_attempt_at = None
+        log.save(update_fields=['status', 'status_code', 'response_body', 'error_message', 'next_attempt_at'])
+
+        if succeeded:
+            Webhook.objects.filter(id=webhook.id).update(success_count=F('success_count') + 1, last_triggered=now)
+        elif log.attempt_number <= webhook.max_retries and not log.is_test:
+            enqueue(webhook, log.request_payload, log.attempt_number + 1, backoff_seconds(webhook, log.attempt_number))
+        else:
+            Webhook.objects.filter(id=webhook.id).update(failure_count=F('failure_count') + 1, last_triggered=now)
+    return succeeded
+
+
+def deliver_now(log, session=None):
+    """Attempt a delivery from `claimed_entry()` inline (the webhook test endpoint); returns (status_code, body, error)"""
+    result = _post(session or make_session(pool_size=1), log)
+    record_result(log, *result)
+    return result
+
+
+def deliver_batch(executor, session, batch_size):
+    """Claim a batch, send it concurrently and record the results; returns the number sent"""
+    logs = claim_due(batch_size)
+    results = executor.map(lambda log: _post(session, log), logs)
+    for log, result in zip(logs, results):
+        try:
+            succeeded = record_result(log, *result)
+        except Exception:
+            # Left SENDING: picked up again once its lease expires
+            logger.exception("Could not record webhook delivery %s", log.id)
+            continue
+        if not succeeded:
+            logger.info("Webhook delivery %s to %s failed: %s", log.id, log.webhook.url, result[2] or result[0])
+    return len(logs)
+
+
+def run(workers=8, batch_size=50, once=False, poll_interval=1.0, stop=None):
+    """Deliver due webhooks until the outbox is empty (`once`) or `stop()` returns True"""
+    session = make_session(pool_size=workers)
+    sent = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook') as executor:
+        while not (stop and stop()):
+            count = deliver_batch(executor, session, batch_size)
+            sent += count
+            if not count:
+                if once:
+                    break
+                time.sleep(poll_interval)
+    session.close()
+    return sent
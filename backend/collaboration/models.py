@@ -19,6 +19,9 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # pagination keyset
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.verb}"
@@ -48,6 +51,9 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # pagination keyset
+        ]
 
     def __str__(self):
         return f"{self.sender.username}: {self.text[:20]}"
@@ -9,7 +9,8 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'user', 'actor', 'actor_details', 'verb', 'content_type', 'object_id', 'description', 'is_read', 'created_at']
-        read_only_fields = ['user', 'actor']
+        # is_read changes through mark_as_read / mark_all_as_read, which keep the unread counter in step
+        read_only_fields = ['user', 'actor', 'is_read']
 
 class AnnouncementSerializer(serializers.ModelSerializer):
     author_details = UserSerializer(source='author', read_only=True)
@@ -1,9 +1,10 @@
 from .models import Notification
 from django.contrib.contenttypes.models import ContentType
+from notifications import dispatcher
 
 def create_notification(user, actor, verb, target, description=''):
     """
-    Utility to create an in-app notification.
+    Utility to create an in-app notification (saved when the transaction commits).
     user: The user who receives the notification
     actor: The user who performed the action
     verb: Description of the action (e.g., 'assigned you to')
@@ -13,7 +14,7 @@ def create_notification(user, actor, verb, target, description=''):
         return None # Don't notify yourself
         
     ct = ContentType.objects.get_for_model(target)
-    return Notification.objects.create(
+    notification = Notification(
         user=user,
         actor=actor,
         verb=verb,
@@ -21,3 +22,6 @@ def create_notification(user, actor, verb, target, description=''):
         object_id=target.id,
         description=description
     )
+    # Written with the other alerts of the transaction once it commits
+    dispatcher.feed(notification)
+    return notification
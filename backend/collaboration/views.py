@@ -4,24 +4,32 @@ from rest_framework.response import Response
 from .models import Notification, Announcement, ChatMessage
 from .serializers import NotificationSerializer, AnnouncementSerializer, ChatMessageSerializer
 from django.contrib.contenttypes.models import ContentType
+from notifications import counters
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    page_size = 20
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        if not instance.is_read:
+            counters.subtract('notifications', instance.user_id)
+
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        marked = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        counters.subtract('notifications', request.user.id, marked)
         return Response({'status': 'all notifications marked as read'})
 
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        if Notification.objects.filter(id=notification.id, is_read=False).update(is_read=True):
+            counters.subtract('notifications', notification.user_id)
         return Response({'status': 'notification marked as read'})
 
 class AnnouncementViewSet(viewsets.ModelViewSet):
@@ -40,6 +48,14 @@ class AnnouncementViewSet(viewsets.ModelViewSet):
 class ChatMessageViewSet(viewsets.ModelViewSet):
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        # Pages walk back from the newest message, but each page is
+        # rendered oldest-first like the chat window expects
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page[::-1], many=True)
+        return self.get_paginated_response(serializer.data)
 
     def get_queryset(self):
         content_type = self.request.query_params.get('content_type')
@@ -0,0 +1,38 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Default pagination for every list endpoint.
+
+    Rows are ordered by `(-created_at, -id)` or `(-timestamp, -id)` and pages
+    are addressed by an opaque cursor instead of OFFSET, so deep pages cost
+    the same as the first one. As with any DRF CursorPagination, the cursor
+    holds the value of the first ordering field only, plus an offset past the
+    rows sharing that value; `id` just makes the order total. Views can tune
+    it with:
+
+        page_size = 100                        # default page size for this view
+        max_page_size = 1000                   # upper bound for ?page_size=
+        cursor_ordering = ('-timestamp', '-id')  # explicit keyset
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    # Tried in order when a view does not declare `cursor_ordering`
+    timestamp_fields = ('created_at', 'timestamp')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = getattr(view, 'page_size', None) or self.page_size
+        self.max_page_size = getattr(view, 'max_page_size', None) or self.max_page_size
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return tuple(ordering)
+
+        field_names = {field.name for field in queryset.model._meta.concrete_fields}
+        for field in self.timestamp_fields:
+            if field in field_names:
+                return (f'-{field}', '-id')
+        return ('-id',)
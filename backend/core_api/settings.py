@@ -59,6 +59,7 @@ INSTALLED_APPS = [
     'notifications.apps.NotificationsConfig',
     'audit.apps.AuditConfig',
     'ai_assistant.apps.AiAssistantConfig',
+    'realtime.apps.RealtimeConfig',
 ]
 
 MIDDLEWARE = [
@@ -71,6 +72,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'users.middleware.SecurityMiddleware',  # Custom security middleware
+    'audit.middleware.AuditContextMiddleware',  # Request context and buffered writes for audit.pipeline
+    'notifications.middleware.NotificationContextMiddleware',  # Buffered alert writes for notifications.dispatcher
 ]
 
 ROOT_URLCONF = 'core_api.urls'
@@ -143,6 +146,8 @@ STATIC_URL = 'static/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Files produced by background jobs (exports); private, served by the job download action
+JOB_FILES_ROOT = BASE_DIR / 'job_files'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -153,6 +158,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Keyset (cursor) pagination on (created_at, id) / (timestamp, id); see core_api/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'core_api.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
 from datetime import timedelta
@@ -170,3 +178,7 @@ CORS_ALLOW_ALL_ORIGINS = True # Change this in production
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'noreply@mbabali.com'
+
+# Event stream pub/sub (realtime.broker). The in-process broker only reaches streams of the
+# publishing process; with several ASGI workers use 'realtime.broker.RedisBroker' and REALTIME_REDIS_URL.
+REALTIME_BROKER = 'realtime.broker.InProcessBroker'
@@ -32,6 +32,7 @@ urlpatterns = [
     path('api/automation/', include('automation.urls')),
     path('api/search/', include('search.urls')),
     path('api/notifications/', include('notifications.urls')),
+    path('api/realtime/', include('realtime.urls')),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,67 @@
+"""
+Per-user unread counters for the notification bell.
+
+UnreadCounter rows are adjusted with F() expressions wherever unread rows
+appear or disappear: the dispatcher's bulk writes, workflow notifications,
+mark-read, mark-all-read and deletes. Reading a count is then a primary key
+lookup instead of a COUNT over the alert tables. A user's row is created
+from one real count the first time it is read; `rebuild()` drops it so the
+next read recounts, e.g. after rows were removed by a cascade.
+
+Every change is also announced on the user's event stream room
+(`notification.created` / `notification.read`), so open clients update the
+bell without polling.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from realtime import events
+from .models import ActivityAlert, UnreadCounter
+
+FIELDS = ('alerts', 'notifications')
+
+
+def _unread(field, user_id):
+    if field == 'alerts':
+        return ActivityAlert.objects.filter(user_id=user_id, is_read=False)
+    from collaboration.models import Notification
+    return Notification.objects.filter(user_id=user_id, is_read=False)
+
+
+def get(user_id):
+    """The user's UnreadCounter, counting the tables only if it does not exist yet"""
+    try:
+        return UnreadCounter.objects.get(user_id=user_id)
+    except UnreadCounter.DoesNotExist:
+        pass
+    counts = {field: _unread(field, user_id).count() for field in FIELDS}
+    try:
+        with transaction.atomic():
+            return UnreadCounter.objects.create(user_id=user_id, **counts)
+    except IntegrityError:
+        # Created concurrently by another request
+        return UnreadCounter.objects.get(user_id=user_id)
+
+
+def add(field, user_ids):
+    """Count one new unread row per occurrence of a user id in `user_ids`"""
+    by_amount = defaultdict(list)
+    for user_id, amount in Counter(user_ids).items():
+        by_amount[amount].append(user_id)
+    # Users without a counter yet are skipped: their first read counts the table
+    for amount, ids in by_amount.items():
+        UnreadCounter.objects.filter(user_id__in=ids).update(**{field: F(field) + amount})
+        for user_id in ids:
+            events.publish(events.user_room(user_id), 'notification.created', {'kind': field, 'count': amount})
+
+
+def subtract(field, user_id, amount=1):
+    if amount:
+        UnreadCounter.objects.filter(user_id=user_id).update(**{field: F(field) - amount})
+        events.publish(events.user_room(user_id), 'notification.read', {'kind': field, 'count': amount})
+
+
+def rebuild(user_id):
+    UnreadCounter.objects.filter(user_id=user_id).delete()
@@ -0,0 +1,225 @@
+"""
+Delivery of pending EmailAlert and PushNotification rows, run by
+`manage.py deliver_notifications`.
+
+- Rows are claimed in batches by flipping them to SENDING with a lease in
+  `claimed_until`, in one UPDATE; rows of a crashed worker become claimable
+  again when the lease expires.
+- Emails to the same recipient are coalesced into one digest. A recipient's
+  pending emails go out once the oldest has waited
+  NOTIFICATION_DIGEST_WINDOW seconds (default 0: whatever is pending at once).
+  Emails addressed with `to_email` (e.g. team invites) are never digested.
+- Each batch of emails goes over a single connection from `get_connection()`;
+  pushes go to the PUSH_BACKEND (notifications.push) in one call per batch.
+- Outcomes are stored with bulk updates: SENT with `sent_at`, or FAILED with
+  `error_message`.
+"""
+import logging
+import smtplib
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailAlert, PushNotification, UserDeviceToken
+from . import push
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed row stays SENDING before another worker may take it over
+LEASE_SECONDS = 300
+DEFAULT_DIGEST_WINDOW = 0
+# Rejections of one message; the SMTP session stays usable for the rest of the batch
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)
+
+
+def digest_window():
+    return getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', DEFAULT_DIGEST_WINDOW)
+
+
+def _claimable(model, now):
+    return Q(status=model.Status.PENDING) | Q(status=model.Status.SENDING, claimed_until__lt=now)
+
+
+def _claim(model, ids, now):
+    """Flip the still-claimable rows among `ids` to SENDING; returns the ones this worker won"""
+    lease_until = now + timedelta(seconds=LEASE_SECONDS)
+    model.objects.filter(_claimable(model, now), id__in=ids).update(
+        status=model.Status.SENDING, claimed_until=lease_until
+    )
+    # The lease doubles as the claim token: rows taken by another worker carry a different one
+    return model.objects.filter(id__in=ids, status=model.Status.SENDING, claimed_until=lease_until)
+
+
+def _digest_key(alert):
+    return ('address', alert.id) if alert.to_email else ('user', alert.recipient_id)
+
+
+def claim_emails(limit, now=None, window=None):
+    """Claim up to `limit` emails of recipients whose digest is due, oldest first"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=digest_window() if window is None else window)
+    candidates = (
+        EmailAlert.objects.filter(_claimable(EmailAlert, now))
+        .order_by('created_at', 'id').only('id', 'recipient_id', 'to_email', 'created_at')[:limit * 4]
+    )
+
+    ready, ids = {}, []
+    for alert in candidates:
+        key = _digest_key(alert)
+        if key not in ready:
+            # Candidates come oldest first, so the first row of a recipient decides for all of them
+            ready[key] = key[0] == 'address' or alert.created_at <= cutoff
+        if ready[key]:
+            ids.append(alert.id)
+            if len(ids) >= limit:
+                break
+    if not ids:
+        return []
+    return list(_claim(EmailAlert, ids, now).select_related('recipient').order_by('created_at', 'id'))
+
+
+def claim_pushes(limit, now=None):
+    now = now or timezone.now()
+    ids = list(
+        PushNotification.objects.filter(_claimable(PushNotification, now))
+        .order_by('created_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    return list(_claim(PushNotification, ids, now).order_by('created_at', 'id'))
+
+
+def _message(alerts, address):
+    if len(alerts) == 1:
+        alert = alerts[0]
+        message = EmailMultiAlternatives(alert.subject, alert.body, to=[address])
+        if alert.html_body:
+            message.attach_alternative(alert.html_body, 'text/html')
+        return message
+    body = '\n\n'.join(f'{alert.subject}\n{alert.body}' for alert in alerts)
+    return EmailMultiAlternatives(f'You have {len(alerts)} new notifications', body, to=[address])
+
+
+def send_emails(alerts, connection=None):
+    """Send claimed alerts, one message per digest over one connection; returns {alert id: error}"""
+    digests = defaultdict(list)
+    for alert in alerts:
+        digests[_digest_key(alert)].append(alert)
+
+    failures = {}
+    messages = []
+    for group in digests.values():
+        address = group[0].to_email or (group[0].recipient.email if group[0].recipient else '')
+        if not address:
+            failures.update((alert.id, 'No email address') for alert in group)
+        else:
+            messages.append((_message(group, address), group))
+    if not messages:
+        return failures
+
+    connection = connection or get_connection()
+    # Failing to connect raises: nothing was attempted, so the batch is retried rather than failed
+    connection.open()
+    try:
+        for message, group in messages:
+            try:
+                connection.send_messages([message])
+            except Exception as exc:
+                failures.update((alert.id, str(exc) or exc.__class__.__name__) for alert in group)
+                if isinstance(exc, MESSAGE_ERRORS):
+                    continue
+                # Start a fresh session for the rest of the batch in case this one is broken
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+    finally:
+        connection.close()
+    return failures
+
+
+def send_pushes(notifications, backend=None):
+    """Send claimed pushes to the recipients' active devices; returns {notification id: error}"""
+    tokens = defaultdict(list)
+    for user_id, token in UserDeviceToken.objects.filter(
+        user_id__in={n.recipient_id for n in notifications}, is_active=True
+    ).values_list('user_id', 'token'):
+        tokens[user_id].append(token)
+
+    failures, deliverable = {}, []
+    for notification in notifications:
+        notification.device_tokens = tokens.get(notification.recipient_id, [])
+        if notification.device_tokens:
+            deliverable.append(notification)
+        else:
+            failures[notification.id] = 'No active device tokens'
+    if deliverable:
+        PushNotification.objects.bulk_update(deliverable, ['device_tokens'])
+        try:
+            failures.update((backend or push.get_backend()).send_messages(deliverable))
+        except Exception as exc:
+            failures.update((notification.id, str(exc)) for notification in deliverable)
+    return failures
+
+
+def record_results(model, rows, failures):
+    """Mark `rows` SENT, except those in `failures` ({id: error}), which become FAILED"""
+    now = timezone.now()
+    claimed = model.objects.filter(status=model.Status.SENDING)
+    sent = [row.id for row in rows if row.id not in failures]
+    if sent:
+        claimed.filter(id__in=sent).update(
+            status=model.Status.SENT, sent_at=now, error_message='', claimed_until=None
+        )
+    by_error = defaultdict(list)
+    for row_id, error in failures.items():
+        by_error[error].append(row_id)
+    for error, ids in by_error.items():
+        claimed.filter(id__in=ids).update(status=model.Status.FAILED, error_message=error, claimed_until=None)
+    return len(sent)
+
+
+def release(model, rows):
+    """Put claimed rows back to PENDING for another attempt"""
+    model.objects.filter(id__in=[row.id for row in rows], status=model.Status.SENDING).update(
+        status=model.Status.PENDING, claimed_until=None
+    )
+
+
+def deliver_batch(batch_size, connection=None, backend=None):
+    """Claim and send one batch of emails and one of pushes; returns the number of rows handled"""
+    emails = claim_emails(batch_size)
+    if emails:
+        try:
+            failures = send_emails(emails, connection)
+        except Exception:
+            logger.exception("Could not open a mail connection; %d email(s) left pending", len(emails))
+            release(EmailAlert, emails)
+            return 0
+        record_results(EmailAlert, emails, failures)
+        for error in set(failures.values()):
+            logger.info("Email delivery failed: %s", error)
+
+    pushes = claim_pushes(batch_size)
+    if pushes:
+        record_results(PushNotification, pushes, send_pushes(pushes, backend))
+    return len(emails) + len(pushes)
+
+
+def run(batch_size=100, once=False, poll_interval=5.0, stop=None):
+    """Deliver pending notifications until none are due (`once`) or `stop()` returns True"""
+    handled = 0
+    while not (stop and stop()):
+        count = deliver_batch(batch_size)
+        handled += count
+        if not count:
+            if once:
+                break
+            time.sleep(poll_interval)
+    return handled
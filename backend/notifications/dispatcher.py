@@ -0,0 +1,260 @@
+"""
+Notification dispatcher.
+
+`notify()` (preference-based ActivityAlert / EmailAlert / PushNotification)
+and `feed()` (collaboration.Notification) queue until their transaction
+commits, so a rolled back save notifies nobody. NotificationContextMiddleware
+opens a context for each request: its committed alerts are written when the
+request finishes (or earlier with `flush()`), with one bulk_create per
+model, so a request saving many rows costs a handful of INSERTs. Outside
+any context, committed alerts are written straight away; `with context():`
+gives commands and workers the same batching, as audit.pipeline does.
+
+Repeats of COALESCED_EVENTS (TASK_UPDATED: every save of an assigned task)
+are merged: within a batch into one alert, and into the recipient's unread
+ActivityAlert for the same object if it was created in the last
+NOTIFICATION_COALESCE_WINDOW seconds, which is updated in place with the
+latest title and message and a higher `change_count`.
+
+Channels come from each recipient's NotificationRules, kept in a
+per-process cache that is dropped when the rules version (projects.sequences,
+in the database so every process sees it) moves; any NotificationRule change
+bumps it. Without a rule for the event
+a user gets IN_APP only; when all their rules for it are inactive, nothing.
+"""
+import contextvars
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from projects import sequences
+from .models import NotificationRule, ActivityAlert, EmailAlert, PushNotification
+from . import counters
+
+logger = logging.getLogger(__name__)
+
+VERSION_NAME = 'version:notification-rules'
+ALL_CHANNELS = frozenset(['IN_APP', 'EMAIL', 'PUSH'])
+DEFAULT_CHANNELS = frozenset(['IN_APP'])
+# Users whose rules are kept per process
+MAX_CACHED_USERS = 10000
+BATCH_SIZE = 500
+COALESCED_EVENTS = frozenset(['TASK_UPDATED'])
+DEFAULT_COALESCE_WINDOW = 15 * 60
+
+Alert = namedtuple('Alert', ['recipient', 'event', 'title', 'body', 'related_object', 'channels'])
+
+
+def rules_version():
+    return sequences.version(VERSION_NAME)
+
+
+def invalidate():
+    sequences.bump_version(VERSION_NAME)
+
+
+_rules = OrderedDict()  # user id -> (version, {event: channels})
+_rules_lock = threading.Lock()
+
+
+def user_rules(user_ids):
+    """{user id: {event: channels}} from the cache, loading the users it misses in one query"""
+    version = rules_version()
+    found, missing = {}, []
+    for user_id in user_ids:
+        entry = _rules.get(user_id)
+        if entry is not None and entry[0] == version:
+            found[user_id] = entry[1]
+        else:
+            missing.append(user_id)
+    if not missing:
+        return found
+
+    loaded = {user_id: {} for user_id in missing}
+    rules = NotificationRule.objects.filter(user_id__in=missing).values_list('user_id', 'event', 'notify_via', 'is_active')
+    for user_id, event, notify_via, is_active in rules:
+        # An event with only inactive rules keeps an empty set: the user opted out
+        channels = loaded[user_id].setdefault(event, set())
+        if is_active:
+            channels.update(ALL_CHANNELS if notify_via == NotificationRule.NotifyVia.ALL else [notify_via])
+
+    with _rules_lock:
+        for user_id, events in loaded.items():
+            _rules[user_id] = (version, events)
+            _rules.move_to_end(user_id)
+        while len(_rules) > MAX_CACHED_USERS:
+            _rules.popitem(last=False)
+    found.update(loaded)
+    return found
+
+
+def channels_for(rules, event):
+    return rules.get(event, DEFAULT_CHANNELS)
+
+
+class NotificationContext:
+    """Committed alerts and feed entries waiting to be written"""
+
+    def __init__(self):
+        self.alerts = []
+        self.feed = []
+        self.closed = False
+
+
+_current = contextvars.ContextVar('notification_context', default=None)
+
+
+@contextmanager
+def context():
+    """Collect the alerts queued inside the block and write them together on exit"""
+    ctx = NotificationContext()
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        try:
+            flush()
+        except Exception:
+            # The changes being notified about are committed; don't turn the response into an error
+            logger.exception("Could not write %d alerts", len(ctx.alerts) + len(ctx.feed))
+        ctx.closed = True
+        _current.reset(token)
+
+
+def flush():
+    """Write the committed alerts of the current context now"""
+    ctx = _current.get()
+    if ctx is None or not (ctx.alerts or ctx.feed):
+        return
+    alerts, feed, ctx.alerts, ctx.feed = ctx.alerts, ctx.feed, [], []
+    write(alerts, feed)
+
+
+def _committed(ctx, alerts, feed):
+    if ctx is None or ctx.closed:
+        write(alerts, feed)
+    else:
+        ctx.alerts.extend(alerts)
+        ctx.feed.extend(feed)
+
+
+def _queue(alerts, feed):
+    # Runs straight away outside a transaction
+    transaction.on_commit(partial(_committed, _current.get(), alerts, feed), robust=True)
+
+
+def notify(recipient, event, title, body, related_object=None, channels=None):
+    """Queue an alert for `recipient`; `channels` overrides the recipient's rules"""
+    _queue([Alert(recipient, event, title, body, related_object, channels)], [])
+
+
+def feed(notification):
+    """Queue an unsaved collaboration.Notification"""
+    _queue([], [notification])
+
+
+def coalesce_window():
+    return getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', DEFAULT_COALESCE_WINDOW)
+
+
+def _coalesce_key(alert):
+    related_object = alert.related_object
+    if alert.event not in COALESCED_EVENTS or related_object is None:
+        return None
+    return (alert.recipient.id, alert.event, type(related_object), related_object.pk)
+
+
+def _merge_repeats(alerts):
+    """Keep the latest of repeated coalesced alerts; returns [(alert, times it was queued)]"""
+    merged = {}
+    for alert in alerts:
+        key = _coalesce_key(alert) or object()
+        count = merged.pop(key, (None, 0))[1]
+        merged[key] = (alert, count + 1)
+    return list(merged.values())
+
+
+def _merge_into_unread(activity_alerts):
+    """Fold coalesced alerts into recent unread ones for the same object; returns the alerts still to create"""
+    candidates = {
+        (alert.user_id, alert.event, alert.content_type_id, alert.object_id): alert
+        for alert in activity_alerts if alert.event in COALESCED_EVENTS and alert.object_id is not None
+    }
+    if not candidates:
+        return activity_alerts
+
+    recent = ActivityAlert.objects.filter(
+        user_id__in={key[0] for key in candidates},
+        event__in={key[1] for key in candidates},
+        content_type_id__in={key[2] for key in candidates},
+        object_id__in={key[3] for key in candidates},
+        is_read=False,
+        created_at__gte=timezone.now() - timedelta(seconds=coalesce_window()),
+    ).only('id', 'user_id', 'event', 'content_type_id', 'object_id').order_by('created_at')
+    # Newest last, so it wins when several unread alerts match
+    existing = {(a.user_id, a.event, a.content_type_id, a.object_id): a for a in recent}
+
+    updated, merged = [], set()
+    for key, alert in candidates.items():
+        current = existing.get(key)
+        if current is None:
+            continue
+        current.title, current.message, current.updated_at = alert.title, alert.message, alert.updated_at
+        current.change_count = F('change_count') + alert.change_count
+        updated.append(current)
+        merged.add(id(alert))
+    if updated:
+        ActivityAlert.objects.bulk_update(updated, ['title', 'message', 'change_count', 'updated_at'])
+    return [alert for alert in activity_alerts if id(alert) not in merged]
+
+
+def write(alerts, feed):
+    from .utils import get_activity_type
+
+    rules = user_rules({alert.recipient.id for alert in alerts if alert.channels is None})
+    activity_alerts, emails, pushes = [], [], []
+    for alert, count in _merge_repeats(alerts):
+        recipient, related_object = alert.recipient, alert.related_object
+        channels = alert.channels if alert.channels is not None else channels_for(rules[recipient.id], alert.event)
+
+        content_type = object_id = None
+        if related_object is not None:
+            content_type = ContentType.objects.get_for_model(related_object)
+            object_id = related_object.id
+
+        if 'IN_APP' in channels:
+            activity_alerts.append(ActivityAlert(
+                user=recipient, activity_type=get_activity_type(alert.event), event=alert.event,
+                title=alert.title, message=alert.body, content_type=content_type, object_id=object_id,
+                change_count=count,
+            ))
+        if 'EMAIL' in channels and recipient.email_notifications:
+            emails.append(EmailAlert(
+                recipient=recipient, subject=alert.title, body=alert.body,
+                content_type=content_type, object_id=object_id,
+            ))
+        if 'PUSH' in channels and recipient.push_notifications:
+            pushes.append(PushNotification(
+                recipient=recipient, title=alert.title, body=alert.body,
+                data={'object_id': object_id, 'content_type': content_type.model} if content_type else {},
+            ))
+
+    activity_alerts = _merge_into_unread(activity_alerts)
+    for model, objs in ((ActivityAlert, activity_alerts), (EmailAlert, emails), (PushNotification, pushes)):
+        if objs:
+            model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    if activity_alerts:
+        counters.add('alerts', [alert.user_id for alert in activity_alerts])
+    if feed:
+        from collaboration.models import Notification
+        Notification.objects.bulk_create(feed, batch_size=BATCH_SIZE)
+        counters.add('notifications', [notification.user_id for notification in feed])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from notifications import delivery
+
+
+class Command(BaseCommand):
+    help = "Send pending email alerts and push notifications; several workers can poll the same database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once nothing is due")
+        parser.add_argument('--batch-size', type=int, default=100, help="Rows claimed per round, per channel")
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds to sleep when idle")
+
+    def handle(self, *args, **options):
+        handled = delivery.run(
+            batch_size=options['batch_size'],
+            once=options['once'],
+            poll_interval=options['poll_interval'],
+        )
+        self.stdout.write(f"Handled {handled} notification(s)")
@@ -0,0 +1,12 @@
+from . import dispatcher
+
+
+class NotificationContextMiddleware:
+    """Opens the notification context of each request; its alerts are written together at the end"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with dispatcher.context():
+            return self.get_response(request)
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activityalert',
+            index=models.Index(fields=['created_at', 'id'], name='notificatio_created_fca490_idx'),
+        ),
+    ]
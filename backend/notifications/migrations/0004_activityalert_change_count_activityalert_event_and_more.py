@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 12:03
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0003_emailalert_claimed_until_emailalert_to_email_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activityalert',
+            name='change_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='activityalert',
+            name='event',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='activityalert',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='activityalert',
+            index=models.Index(fields=['content_type', 'object_id', 'user', 'event'], name='activityalert_coalesce_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_activityalert_change_count_activityalert_event_and_more'),
+        ('users', '0009_team_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('alerts', models.IntegerField(default=0)),
+                ('notifications', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
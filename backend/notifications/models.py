@@ -44,10 +44,13 @@ class EmailAlert(models.Model):
     """Email alerts sent to users"""
     class Status(models.TextChoices):
         PENDING = 'PENDING', 'Pending'
+        SENDING = 'SENDING', 'Sending'
         SENT = 'SENT', 'Sent'
         FAILED = 'FAILED', 'Failed'
-    
-    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='email_alerts')
+
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='email_alerts', null=True, blank=True)
+    # Address for people without an account (e.g. team invites); otherwise the recipient's email is used
+    to_email = models.EmailField(blank=True)
     subject = models.CharField(max_length=255)
     body = models.TextField()
     html_body = models.TextField(blank=True)
@@ -55,27 +58,33 @@ class EmailAlert(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     sent_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True)
-    
+    # Lease held by the delivery worker that claimed the row (notifications.delivery)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
     # Related object
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
     object_id = models.PositiveIntegerField(null=True, blank=True)
     related_object = GenericForeignKey('content_type', 'object_id')
-    
+
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
     class Meta:
         ordering = ['-created_at']
-    
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='emailalert_status_created_idx'),
+        ]
+
     def __str__(self):
-        return f"Email to {self.recipient.username}: {self.subject}"
+        return f"Email to {self.recipient.username if self.recipient else self.to_email}: {self.subject}"
 
 class PushNotification(models.Model):
     """Push notifications for mobile/web"""
     class Status(models.TextChoices):
         PENDING = 'PENDING', 'Pending'
+        SENDING = 'SENDING', 'Sending'
         SENT = 'SENT', 'Sent'
         FAILED = 'FAILED', 'Failed'
-    
+
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_push_notifications')
     title = models.CharField(max_length=255)
     body = models.TextField()
@@ -85,15 +94,21 @@ class PushNotification(models.Model):
     
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     sent_at = models.DateTimeField(null=True, blank=True)
-    
+    error_message = models.TextField(blank=True)
+    # Lease held by the delivery worker that claimed the row (notifications.delivery)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
     # Device tokens (if using FCM/APNS)
     device_tokens = models.JSONField(default=list, blank=True)
-    
+
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
     class Meta:
         ordering = ['-created_at']
-    
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='push_status_created_idx'),
+        ]
+
     def __str__(self):
         return f"Push to {self.recipient.username}: {self.title}"
 
@@ -189,6 +204,8 @@ class ActivityAlert(models.Model):
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_alerts')
     activity_type = models.CharField(max_length=30, choices=ActivityType.choices)
+    # NotificationRule.TriggerEvent that produced the alert
+    event = models.CharField(max_length=30, blank=True)
     
     title = models.CharField(max_length=255)
     message = models.TextField()
@@ -200,11 +217,19 @@ class ActivityAlert(models.Model):
     
     is_read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
-    
+
+    # Repeated events merged into this alert (notifications.dispatcher.COALESCED_EVENTS)
+    change_count = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # pagination keyset
+            # Unread alert to merge a repeated event into
+            models.Index(fields=['content_type', 'object_id', 'user', 'event'], name='activityalert_coalesce_idx'),
+        ]
     
     def __str__(self):
         return f"{self.activity_type} for {self.user.username}"
@@ -227,3 +252,12 @@ class UserDeviceToken(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.platform}"
+
+class UnreadCounter(models.Model):
+    """Unread ActivityAlerts and collaboration Notifications of a user, kept by notifications.counters"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    alerts = models.IntegerField(default=0)
+    notifications = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.alerts} alerts, {self.notifications} notifications unread"
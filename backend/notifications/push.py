@@ -0,0 +1,38 @@
+"""
+Push backends, chosen with the PUSH_BACKEND setting (a dotted path), like EMAIL_BACKEND.
+
+`send_messages(notifications)` receives PushNotification rows with their
+`device_tokens` filled in and returns {notification id: error} for the ones
+it could not send.
+"""
+import logging
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'notifications.push.LoggingBackend'
+
+
+class LoggingBackend:
+    """Logs each push instead of sending it; for development"""
+
+    def send_messages(self, notifications):
+        for notification in notifications:
+            logger.info("Push to %s (%d device(s)): %s", notification.recipient_id,
+                        len(notification.device_tokens), notification.title)
+        return {}
+
+
+class LocmemBackend:
+    """Keeps sent pushes in `LocmemBackend.outbox`; for tests"""
+    outbox = []
+
+    def send_messages(self, notifications):
+        LocmemBackend.outbox.extend(notifications)
+        return {}
+
+
+def get_backend():
+    return import_string(getattr(settings, 'PUSH_BACKEND', DEFAULT_BACKEND))()
@@ -7,7 +7,9 @@ class ActivityAlertSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ActivityAlert
-        fields = ['id', 'user', 'activity_type', 'title', 'message', 'is_read', 'read_at', 'created_at']
+        fields = ['id', 'user', 'activity_type', 'title', 'message', 'change_count', 'is_read', 'read_at', 'created_at', 'updated_at']
+        # Changed through mark_read / mark_all_read, which keep the unread counter in step
+        read_only_fields = ['is_read', 'read_at']
 
 class NotificationRuleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,9 +1,17 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from projects.models import Task
 from tickets.models import Ticket
 from activity.models import Comment
+from .models import NotificationRule
 from .utils import create_notification
+from . import dispatcher
+
+@receiver(post_save, sender=NotificationRule)
+@receiver(post_delete, sender=NotificationRule)
+def invalidate_cached_rules(sender, instance, **kwargs):
+    transaction.on_commit(dispatcher.invalidate)
 
 @receiver(post_save, sender=Task)
 def task_notification(sender, instance, created, **kwargs):
@@ -15,10 +23,8 @@ def task_notification(sender, instance, created, **kwargs):
             body=f"You have been assigned to task {instance.title} in project {instance.project.name}",
             related_object=instance
         )
-    elif not created and instance.assigned_to:
-        # Check if status changed (simple check not tracking old, assuming any save might be update)
-        # Ideally we track pre_save state or use instance._loaded_values if available, 
-        # For MVP we notify on update if assigned
+    elif not created and instance.assigned_to and instance.saved_changes != {}:
+        # Saves that changed nothing don't notify; unknown previous state (None) still does
         create_notification(
             recipient=instance.assigned_to,
             event='TASK_UPDATED',
@@ -37,7 +43,10 @@ def ticket_notification(sender, instance, created, **kwargs):
             body=f"You have been assigned to ticket {instance.title}",
             related_object=instance
         )
-    elif instance.status in ['RESOLVED', 'CLOSED'] and instance.submitted_by:
+    elif (
+        instance.status in ['RESOLVED', 'CLOSED'] and instance.submitted_by
+        and 'status' in (instance.saved_changes if instance.saved_changes is not None else {'status'})
+    ):
         create_notification(
             recipient=instance.submitted_by,
             event='TICKET_RESOLVED' if instance.status == 'RESOLVED' else 'TICKET_CLOSED',
@@ -0,0 +1,110 @@
+"""
+Local SMTP server for exercising email delivery without a network.
+
+    with StubSMTPServer(reject=['bounce@example.com']) as smtp, override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST=smtp.host, EMAIL_PORT=smtp.port,
+    ):
+        ...
+        smtp.messages      # [(mail from, [recipients], raw message), ...]
+        smtp.connections   # number of SMTP sessions opened
+
+Recipients listed in `reject` are refused with a 550.
+"""
+import socketserver
+import threading
+
+
+class StubSMTPServer:
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, *lines):
+                self.wfile.write(''.join(f'{line}\r\n' for line in lines).encode())
+
+            def handle(self):
+                with stub._lock:
+                    stub.connections += 1
+                self.reply('220 stub ESMTP')
+                mail_from, recipients = None, []
+                for raw in self.rfile:
+                    command = raw.decode('utf-8', 'replace').strip()
+                    verb, _, argument = command.partition(' ')
+                    verb = verb.upper()
+                    if verb == 'EHLO':
+                        self.reply('250-stub', '250 8BITMIME')
+                    elif verb == 'HELO':
+                        self.reply('250 stub')
+                    elif verb == 'MAIL':
+                        mail_from, recipients = _address(argument), []
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        address = _address(argument)
+                        if address in stub.reject:
+                            self.reply('550 No such user')
+                        else:
+                            recipients.append(address)
+                            self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        lines = []
+                        for data_line in self.rfile:
+                            if data_line in (b'.\r\n', b'.\n'):
+                                break
+                            lines.append(data_line)
+                        with stub._lock:
+                            stub.messages.append((mail_from, recipients, b''.join(lines).decode('utf-8', 'replace')))
+                        mail_from, recipients = None, []
+                        self.reply('250 OK')
+                    elif verb in ('RSET', 'NOOP'):
+                        if verb == 'RSET':
+                            mail_from, recipients = None, []
+                        self.reply('250 OK')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Command not implemented')
+
+        return Handler
+
+    def start(self):
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _address(argument):
+    # "FROM:<a@b>" / "TO:<a@b> SIZE=12"
+    _, _, value = argument.partition(':')
+    return value.strip().split(' ')[0].strip('<>')
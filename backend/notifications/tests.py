@@ -1,3 +1,270 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from collaboration.models import Notification
+from projects.models import Project, Sequence, Task
+from users.models import User
+from .models import NotificationRule, ActivityAlert, EmailAlert, PushNotification, UserDeviceToken
+from .push import LocmemBackend
+from .stub_smtp import StubSMTPServer
+from .utils import create_notification
+from . import counters, delivery, dispatcher
+
+
+def inserts(queries, table):
+    return [q['sql'] for q in queries.captured_queries if q['sql'].startswith(f'INSERT INTO "{table}"')]
+
+
+class NotificationDispatcherTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pw', role='MEMBER')
+        self.user = User.objects.create_user(username='assignee', password='pw', role='MEMBER')
+        self.project = Project.objects.create(name='Alerts', created_by=self.owner)
+
+    def test_alerts_written_in_bulk_on_commit(self):
+        # A request's context (NotificationContextMiddleware)
+        with CaptureQueriesContext(connection) as queries, dispatcher.context():
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(3):
+                    Task.objects.create(project=self.project, title=f'Task {i}', assigned_to=self.user)
+                self.assertFalse(ActivityAlert.objects.exists())
+                self.assertFalse(Notification.objects.exists())
+            self.assertFalse(ActivityAlert.objects.exists())
+        self.assertEqual(len(inserts(queries, 'notifications_activityalert')), 1)
+        self.assertEqual(len(inserts(queries, 'collaboration_notification')), 1)
+        self.assertEqual(ActivityAlert.objects.filter(user=self.user, activity_type='ASSIGNMENT').count(), 3)
+        self.assertEqual(Notification.objects.filter(user=self.user, verb='assigned you to').count(), 3)
+
+    def test_rolled_back_alerts_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(project=self.project, title='Kept', assigned_to=self.user)
+            try:
+                with transaction.atomic():
+                    Task.objects.create(project=self.project, title='Dropped', assigned_to=self.user)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            Task.objects.create(project=self.project, title='Also kept', assigned_to=self.user)
+        self.assertEqual(
+            sorted(ActivityAlert.objects.values_list('title', flat=True)),
+            ['New Task Assigned: Also kept', 'New Task Assigned: Kept'],
+        )
+
+    def test_channels_from_cached_rules(self):
+        NotificationRule.objects.create(user=self.user, event='TASK_ASSIGNED', notify_via='ALL')
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(project=self.project, title='First', assigned_to=self.user)
+        self.assertEqual(
+            (ActivityAlert.objects.count(), EmailAlert.objects.count(), PushNotification.objects.count()), (1, 1, 1)
+        )
+
+        # Rules are cached per process: no NotificationRule query for the next alert
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(project=self.project, title='Second', assigned_to=self.user)
+        self.assertFalse([q for q in queries.captured_queries if 'notifications_notificationrule' in q['sql']])
+        self.assertEqual(EmailAlert.objects.count(), 2)
+
+        # A rule change drops the cached rules: only inactive rules means no alert at all
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationRule.objects.filter(user=self.user).get().delete()
+            NotificationRule.objects.create(user=self.user, event='TASK_ASSIGNED', notify_via='EMAIL', is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(project=self.project, title='Third', assigned_to=self.user)
+        self.assertEqual(
+            (ActivityAlert.objects.count(), EmailAlert.objects.count(), PushNotification.objects.count()), (2, 2, 2)
+        )
+
+        # Changed by another process, which only moves the version in the database
+        NotificationRule.objects.filter(user=self.user).update(is_active=True)
+        Sequence.objects.filter(name=dispatcher.VERSION_NAME).update(value=F('value') + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(project=self.project, title='Fourth', assigned_to=self.user)
+        self.assertEqual(EmailAlert.objects.count(), 3)
+
+    def test_task_updates_coalesced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(project=self.project, title='Busy', assigned_to=self.user)
+        with CaptureQueriesContext(connection) as queries, dispatcher.context(), self.captureOnCommitCallbacks(execute=True):
+            for status in ('IN_PROGRESS', 'REVIEW'):
+                task.status = status
+                task.save()
+        self.assertEqual(len(inserts(queries, 'notifications_activityalert')), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = 'DONE'
+            task.save()
+
+        alert = ActivityAlert.objects.get(event='TASK_UPDATED')
+        self.assertEqual(alert.change_count, 3)
+        self.assertIn('Current status: DONE', alert.message)
+
+        # Once read, the next update starts a new alert
+        ActivityAlert.objects.filter(id=alert.id).update(is_read=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.priority = 'HIGH'
+            task.save()
+        self.assertEqual(ActivityAlert.objects.filter(event='TASK_UPDATED').count(), 2)
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=0)
+    def test_updates_outside_window_not_coalesced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(project=self.project, title='Slow', assigned_to=self.user)
+        for status in ('IN_PROGRESS', 'REVIEW'):
+            with self.captureOnCommitCallbacks(execute=True):
+                task.status = status
+                task.save()
+        self.assertEqual(list(ActivityAlert.objects.filter(event='TASK_UPDATED').values_list('change_count', flat=True)), [1, 1])
+
+    def test_forced_channels_skip_rules(self):
+        NotificationRule.objects.create(user=self.user, event='MENTIONED', notify_via='IN_APP', is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(self.user, 'MENTIONED', 'Mentioned', 'You were mentioned', notify_force=['PUSH'])
+        self.assertFalse(ActivityAlert.objects.exists())
+        self.assertEqual(PushNotification.objects.get().title, 'Mentioned')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    PUSH_BACKEND='notifications.push.LocmemBackend',
+)
+class NotificationDeliveryTest(TestCase):
+    def setUp(self):
+        LocmemBackend.outbox = []
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pw', role='MEMBER')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pw', role='MEMBER')
+
+    def test_emails_coalesced_into_digests(self):
+        for i in range(3):
+            EmailAlert.objects.create(recipient=self.alice, subject=f'Update {i}', body=f'Body {i}')
+        EmailAlert.objects.create(recipient=self.bob, subject='Assigned', body='You got a task')
+        EmailAlert.objects.create(to_email='new@example.com', subject='Invitation', body='Join us')
+
+        self.assertEqual(delivery.run(once=True), 5)
+        by_address = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(by_address['alice@example.com'].subject, 'You have 3 new notifications')
+        self.assertIn('Update 2\nBody 2', by_address['alice@example.com'].body)
+        self.assertEqual(by_address['bob@example.com'].subject, 'Assigned')
+        self.assertEqual(by_address['new@example.com'].subject, 'Invitation')
+        self.assertFalse(EmailAlert.objects.exclude(status=EmailAlert.Status.SENT).exists())
+        self.assertFalse(EmailAlert.objects.filter(sent_at__isnull=True).exists())
+
+    def test_digest_window(self):
+        EmailAlert.objects.create(recipient=self.alice, subject='Update', body='Body')
+        self.assertEqual(delivery.claim_emails(10, window=300), [])
+        later = timezone.now() + timedelta(seconds=301)
+        self.assertEqual(len(delivery.claim_emails(10, now=later, window=300)), 1)
+        # Claimed rows are leased, not claimable again until the lease runs out
+        self.assertEqual(delivery.claim_emails(10, now=later, window=300), [])
+
+    def test_smtp_batch_uses_one_connection(self):
+        rejected = User.objects.create_user(username='gone', email='gone@example.com', password='pw', role='MEMBER')
+        for user in (self.alice, self.bob, rejected):
+            EmailAlert.objects.create(recipient=user, subject=f'Hello {user.username}', body='Hi')
+
+        with StubSMTPServer(reject=['gone@example.com']) as smtp, override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST=smtp.host, EMAIL_PORT=smtp.port,
+        ):
+            delivery.deliver_batch(10)
+
+        self.assertEqual(smtp.connections, 1)
+        self.assertEqual(sorted(rcpt for _, (rcpt,), _ in smtp.messages), ['alice@example.com', 'bob@example.com'])
+        failed = EmailAlert.objects.get(status=EmailAlert.Status.FAILED)
+        self.assertEqual(failed.recipient, rejected)
+        self.assertIn('gone@example.com', failed.error_message)
+        self.assertEqual(EmailAlert.objects.filter(status=EmailAlert.Status.SENT).count(), 2)
+
+    def test_connection_failure_leaves_emails_pending(self):
+        EmailAlert.objects.create(recipient=self.alice, subject='Hello', body='Hi')
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST='127.0.0.1', EMAIL_PORT=1, EMAIL_TIMEOUT=1), \
+                self.assertLogs('notifications.delivery', 'ERROR'):
+            self.assertEqual(delivery.deliver_batch(10), 0)
+        alert = EmailAlert.objects.get()
+        self.assertEqual((alert.status, alert.claimed_until), (EmailAlert.Status.PENDING, None))
+
+    def test_push_delivery(self):
+        UserDeviceToken.objects.create(user=self.alice, token='token-a', platform='WEB')
+        PushNotification.objects.create(recipient=self.alice, title='Ping', body='Hello')
+        PushNotification.objects.create(recipient=self.bob, title='Ping', body='Hello')
+
+        delivery.run(once=True)
+        self.assertEqual([(n.recipient_id, n.device_tokens) for n in LocmemBackend.outbox], [(self.alice.id, ['token-a'])])
+        sent = PushNotification.objects.get(recipient=self.alice)
+        self.assertEqual((sent.status, sent.device_tokens), (PushNotification.Status.SENT, ['token-a']))
+        failed = PushNotification.objects.get(recipient=self.bob)
+        self.assertEqual((failed.status, failed.error_message), (PushNotification.Status.FAILED, 'No active device tokens'))
+
+
+class UnreadCounterTest(TestCase):
+    url = '/api/notifications/alerts/unread_count/'
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pw', role='MEMBER')
+        self.user = User.objects.create_user(username='reader', password='pw', role='MEMBER')
+        self.project = Project.objects.create(name='Bell', created_by=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assign_tasks(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                Task.objects.create(project=self.project, title=f'Task {i}', assigned_to=self.user)
+
+    def test_counts_follow_creates_and_reads(self):
+        self.assign_tasks(2)
+        # First read counts the tables and creates the counter
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.json(), {'alerts': 2, 'notifications': 2, 'total': 4})
+
+        self.assign_tasks(1)
+        alert = ActivityAlert.objects.filter(user=self.user).first()
+        self.client.post(f'/api/notifications/alerts/{alert.id}/mark_read/')
+        self.client.post(f'/api/notifications/alerts/{alert.id}/mark_read/')
+        notification = Notification.objects.filter(user=self.user).first()
+        self.client.post(f'/api/collaboration/notifications/{notification.id}/mark_as_read/')
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.json(), {'alerts': 2, 'notifications': 2, 'total': 4})
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql']])
+
+        self.client.post('/api/notifications/alerts/mark_all_read/')
+        self.assertEqual(counters.get(self.user.id).alerts, 0)
+        self.assertEqual(ActivityAlert.objects.filter(user=self.user, is_read=False).count(), 0)
+
+    def test_read_state_only_changes_through_the_counted_actions(self):
+        self.assign_tasks(2)
+        self.assertEqual(self.client.get(self.url).json()['total'], 4)
+        alert = ActivityAlert.objects.filter(user=self.user).first()
+        notification = Notification.objects.filter(user=self.user).first()
+        self.client.patch(f'/api/notifications/alerts/{alert.id}/', {'is_read': True}, format='json')
+        self.client.patch(f'/api/collaboration/notifications/{notification.id}/', {'is_read': True}, format='json')
+        self.assertFalse(ActivityAlert.objects.get(id=alert.id).is_read)
+        self.assertFalse(Notification.objects.get(id=notification.id).is_read)
+
+        # Mark-all takes off what it marked, not everything: an alert counted meanwhile stays
+        counters.add('alerts', [self.user.id])
+        self.client.post('/api/notifications/alerts/mark_all_read/')
+        self.client.post('/api/collaboration/notifications/mark_all_as_read/')
+        self.assertEqual(self.client.get(self.url).json(), {'alerts': 1, 'notifications': 0, 'total': 1})
+
+    def test_etag_revalidation(self):
+        self.assign_tasks(1)
+        first = self.client.get(self.url)
+        etag = first['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.assign_tasks(1)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.json()['alerts'], 2)
@@ -5,28 +5,52 @@ from rest_framework.permissions import IsAuthenticated
 from .models import ActivityAlert, NotificationRule
 from .serializers import ActivityAlertSerializer, NotificationRuleSerializer
 from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+from . import counters
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = ActivityAlertSerializer
     permission_classes = [IsAuthenticated]
+    page_size = 20
     
     def get_queryset(self):
         return ActivityAlert.objects.filter(user=self.request.user).order_by('-created_at')
     
+    def perform_destroy(self, instance):
+        instance.delete()
+        if not instance.is_read:
+            counters.subtract('alerts', instance.user_id)
+
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
-        self.get_queryset().filter(is_read=False).update(is_read=True, read_at=timezone.now())
+        # Only the rows marked here: alerts created meanwhile stay counted
+        marked = self.get_queryset().filter(is_read=False).update(is_read=True, read_at=timezone.now())
+        counters.subtract('alerts', request.user.id, marked)
         return Response({'status': 'success'})
         
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         alert = self.get_object()
-        if not alert.is_read:
-            alert.is_read = True
-            alert.read_at = timezone.now()
-            alert.save()
+        # Conditional update, so concurrent requests decrement the counter once
+        if ActivityAlert.objects.filter(id=alert.id, is_read=False).update(is_read=True, read_at=timezone.now()):
+            counters.subtract('alerts', alert.user_id)
         return Response({'status': 'success'})
 
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Unread alert and notification counts; answers 304 while they have not changed"""
+        counter = counters.get(request.user.id)
+        alerts, notifications = max(counter.alerts, 0), max(counter.notifications, 0)
+        etag = quote_etag(f'{alerts}-{notifications}')
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({'alerts': alerts, 'notifications': notifications, 'total': alerts + notifications})
+        response['ETag'] = etag
+        # Let clients keep the response but always revalidate it
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
 class NotificationRuleViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationRuleSerializer
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,68 @@
+"""
+Which projects a user can see.
+
+A user can access a project they are a member of, that belongs to one of
+their teams, or that they created. The id set is computed once with a UNION
+of three index lookups and cached per user, so viewsets can filter with a
+plain `project_id IN (...)` instead of joining memberships and applying
+DISTINCT. Entries are keyed on a per-user version in the database
+(projects.sequences), which projects.signals moves on Project.members,
+Team.members, team reassignment and project creation. The cache itself may
+be per process; the version check makes a removed member lose access in
+every process at once, at the cost of one primary key lookup.
+"""
+from django.core.cache import cache
+from django.db.models import Q
+
+from users.utils import user_has_role
+from . import sequences
+from .models import Project
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def _version_name(user_id):
+    return f'version:project-access:{user_id}'
+
+
+def accessible_project_ids(user):
+    """frozenset of ids of the projects `user` can access"""
+    key = f'projects:accessible:{user.pk}:{sequences.version(_version_name(user.pk))}'
+    ids = cache.get(key)
+    if ids is None:
+        member_of = Project.objects.filter(members=user).values_list('id', flat=True)
+        via_team = Project.objects.filter(team__members=user).values_list('id', flat=True)
+        created = Project.objects.filter(created_by=user).values_list('id', flat=True)
+        ids = frozenset(member_of.union(via_team, created))
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def accessible_projects(user):
+    return Project.objects.filter(id__in=accessible_project_ids(user))
+
+
+def filter_accessible(queryset, user, field='project_id', extra=None):
+    """Restrict `queryset` to rows whose `field` is an accessible project id, OR-ed with `extra` if given"""
+    condition = Q(**{f'{field}__in': accessible_project_ids(user)})
+    if extra is not None:
+        condition |= extra
+    return queryset.filter(condition)
+
+
+def filter_visible(queryset, user, project=''):
+    """
+    Restrict `queryset` to rows of projects the user may open, the rule shared by
+    ProjectViewSet and TaskViewSet: everything for admins, otherwise accessible
+    projects plus, for enterprise users, every project of the enterprise's teams.
+    `project` is the lookup prefix from the queryset's model to Project
+    ('' for projects, 'project__' for tasks).
+    """
+    if user_has_role(user, 'ADMIN'):
+        return queryset
+    extra = Q(**{f'{project}team__enterprise_id': user.enterprise_id}) if user.enterprise_id else None
+    return filter_accessible(queryset, user, field=f'{project}id', extra=extra)
+
+
+def invalidate(user_ids):
+    sequences.bump_versions(_version_name(user_id) for user_id in set(user_ids) if user_id is not None)
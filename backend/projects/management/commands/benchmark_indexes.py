@@ -0,0 +1,188 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from activity.models import AuditLog
+from projects.models import Project, Sprint, Task
+from tickets.models import Ticket
+
+User = get_user_model()
+
+# Composite indexes being measured; dropped (inside a rolled back savepoint) for the "before" run
+BENCHMARKED_INDEXES = {
+    Task: ['task_project_status_idx', 'task_assignee_status_idx', 'task_sprint_status_idx',
+           'task_archived_due_idx', 'task_priority_idx'],
+    Ticket: ['ticket_assignee_status_idx', 'ticket_submitter_status_idx', 'ticket_sla_due_idx'],
+    AuditLog: ['auditlog_object_time_idx'],
+}
+
+STATUSES = ['TODO', 'IN_PROGRESS', 'REVIEW', 'DONE']
+PRIORITIES = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large task/ticket/audit dataset and report EXPLAIN plans and timings for the "
+        "hot filter paths with and without the composite indexes. Everything runs in one "
+        "transaction that is rolled back; still, use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1_000_000)
+        parser.add_argument('--projects', type=int, default=200)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per query (best is reported)")
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        # SQLite can only drop indexes inside a transaction with FK checks already off
+        with connection.constraint_checks_disabled(), transaction.atomic():
+            self.seed(options)
+            self.analyze()
+            after = self.measure(options['repeat'])
+
+            with transaction.atomic():
+                self.drop_indexes()
+                self.analyze()
+                before = self.measure(options['repeat'])
+                transaction.set_rollback(True)
+
+            self.report(before, after)
+            transaction.set_rollback(True)
+
+    # Dataset
+
+    def seed(self, options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        self.stdout.write(f"Seeding {options['tasks']:,} tasks...")
+
+        users = User.objects.bulk_create([
+            User(username=f'bench-{i}', email=f'bench-{i}@example.com', role='MEMBER')
+            for i in range(options['users'])
+        ])
+        owner = users[0]
+        projects = Project.objects.bulk_create([
+            Project(name=f'Bench {i}', key=f'BN{i:05d}', created_by=owner)
+            for i in range(options['projects'])
+        ])
+        sprints = Sprint.objects.bulk_create([
+            Sprint(project=p, name=f'Sprint {j}', start_date=now.date(), end_date=(now + timedelta(days=14)).date())
+            for p in projects for j in range(5)
+        ])
+
+        def task_rows():
+            for i in range(options['tasks']):
+                yield Task(
+                    project=projects[i % len(projects)],
+                    sprint=sprints[i % len(sprints)] if i % 3 else None,
+                    title=f'Bench task {i}',
+                    assigned_to=users[i % len(users)] if i % 4 else None,
+                    status=STATUSES[i % len(STATUSES)],
+                    priority=PRIORITIES[(i // 7) % len(PRIORITIES)],
+                    story_points=i % 8,
+                    is_archived=(i % 10 == 0),
+                    due_date=now + timedelta(hours=(i % 2000) - 1000),
+                )
+
+        self._bulk_insert(Task, task_rows(), batch_size)
+
+        ticket_count = max(options['tasks'] // 10, 1)
+        self._bulk_insert(Ticket, (
+            Ticket(
+                ticket_number=f'BENCH-{i}', title=f'Bench ticket {i}', description='',
+                submitted_by=users[i % len(users)], assigned_to=users[(i + 1) % len(users)] if i % 2 else None,
+                status=['OPEN', 'IN_PROGRESS', 'RESOLVED', 'CLOSED'][i % 4],
+                priority=PRIORITIES[i % len(PRIORITIES)],
+                sla_due_date=now + timedelta(hours=(i % 500) - 250),
+            )
+            for i in range(ticket_count)
+        ), batch_size)
+
+        task_ct = ContentType.objects.get_for_model(Task)
+        first_task_id = Task.objects.filter(project__in=projects).order_by('id').values_list('id', flat=True).first()
+        self._bulk_insert(AuditLog, (
+            AuditLog(user=users[i % len(users)], action='UPDATE_TASK', content_type=task_ct,
+                     object_id=first_task_id + (i % options['tasks']), details={})
+            for i in range(options['tasks'])
+        ), batch_size)
+
+        self.sample = {
+            'project': projects[len(projects) // 2],
+            'user': users[len(users) // 2],
+            'sprint': sprints[len(sprints) // 2],
+            'task_ct': task_ct,
+            'task_ids': list(Task.objects.filter(project=projects[0]).values_list('id', flat=True)[:200]),
+            'now': now,
+        }
+
+    def _bulk_insert(self, model, rows, batch_size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def drop_indexes(self):
+        with connection.schema_editor(atomic=False) as editor:
+            for model, names in BENCHMARKED_INDEXES.items():
+                for index in model._meta.indexes:
+                    if index.name in names:
+                        editor.remove_index(model, index)
+
+    # Measurement
+
+    def cases(self):
+        s = self.sample
+        window = s['now'] + timedelta(days=1)
+        return [
+            ('project tasks by status', Task.objects.filter(project=s['project'], status='DONE'), 'count'),
+            ('open tasks for assignee', Task.objects.filter(assigned_to=s['user'], status__in=['TODO', 'IN_PROGRESS']), 'count'),
+            ('sprint velocity', Task.objects.filter(sprint=s['sprint'], status='DONE'), 'points'),
+            ('task reminders', Task.objects.filter(is_archived=False).filter(
+                Q(priority='CRITICAL') | Q(due_date__lte=window)
+            ).exclude(status='DONE').order_by('due_date')[:50], 'list'),
+            ('critical tasks', Task.objects.filter(priority='CRITICAL'), 'count'),
+            ('ticket queue', Ticket.objects.filter(Q(assigned_to=s['user']) | Q(submitted_by=s['user']), status='OPEN'), 'count'),
+            ('ticket SLA reminders', Ticket.objects.filter(sla_due_date__lte=window).order_by('sla_due_date')[:50], 'list'),
+            ('task recent activity', AuditLog.objects.filter(
+                content_type=s['task_ct'], object_id__in=s['task_ids']
+            ).order_by('-timestamp')[:20], 'list'),
+        ]
+
+    def measure(self, repeat):
+        results = {}
+        for label, qs, mode in self.cases():
+            run = {
+                'count': qs.count,
+                'points': lambda qs=qs: qs.aggregate(total=Sum('story_points')),
+                'list': lambda qs=qs: list(qs.all()),  # fresh clone, no result cache
+            }[mode]
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[label] = {'ms': min(timings), 'plan': qs.explain()}
+        return results
+
+    def report(self, before, after):
+        for label in after:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}"))
+            self.stdout.write(f"  without indexes: {before[label]['ms']:9.2f} ms")
+            self.stdout.write(f"  with indexes:    {after[label]['ms']:9.2f} ms")
+            self.stdout.write("  plan before:\n    " + before[label]['plan'].replace('\n', '\n    '))
+            self.stdout.write("  plan after:\n    " + after[label]['plan'].replace('\n', '\n    '))
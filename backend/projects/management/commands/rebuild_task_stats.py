@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from projects import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the ProjectTaskStats rollup from the tasks table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int, help="Only rebuild these projects")
+
+    def handle(self, *args, **options):
+        project_ids = options['project_ids'] or None
+        count = stats.rebuild(project_ids=project_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt task counters for {count} project(s)"))
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 11:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_task_counters(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    ProjectTaskStats = apps.get_model('projects', 'ProjectTaskStats')
+    statuses = {'todo': 'TODO', 'in_progress': 'IN_PROGRESS', 'review': 'REVIEW', 'done': 'DONE'}
+    counts = Project.objects.annotate(
+        total=Count('tasks'),
+        **{column: Count('tasks', filter=Q(tasks__status=status)) for column, status in statuses.items()}
+    ).values('pk', 'total', *statuses)
+    ProjectTaskStats.objects.bulk_create(
+        [ProjectTaskStats(project_id=row.pop('pk'), **row) for row in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0018_task_projects_ta_created_e65fcb_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectTaskStats',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_counters', serialize=False, to='projects.project')),
+                ('total', models.IntegerField(default=0)),
+                ('todo', models.IntegerField(default=0)),
+                ('in_progress', models.IntegerField(default=0)),
+                ('review', models.IntegerField(default=0)),
+                ('done', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Project Task Stats',
+            },
+        ),
+        migrations.RunPython(populate_task_counters, migrations.RunPython.noop),
+    ]
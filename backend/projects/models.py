@@ -1,6 +1,52 @@
 from django.db import models
+from django.db.models import Count, Q, Exists, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
+from .tracking import FieldTracker
+
+class TaskStatsQuerySet(models.QuerySet):
+    """QuerySet for models with a reverse `tasks` relation (Project, Sprint, Milestone)"""
+
+    def with_task_stats(self):
+        """Annotate total/done/todo/in-progress task counts in the main query"""
+        return self.annotate(
+            task_total=Count('tasks', distinct=True),
+            task_done=Count('tasks', filter=Q(tasks__status='DONE'), distinct=True),
+            task_todo=Count('tasks', filter=Q(tasks__status='TODO'), distinct=True),
+            task_in_progress=Count('tasks', filter=Q(tasks__status='IN_PROGRESS'), distinct=True),
+        )
+
+class ProjectQuerySet(TaskStatsQuerySet):
+    def with_member_count(self):
+        # Counted from the through table so it doesn't multiply the tasks join
+        members = self.model.members.through.objects.filter(
+            project_id=OuterRef('pk')
+        ).order_by().values('project_id').annotate(total=Count('pk')).values('total')
+        return self.annotate(member_count=Coalesce(Subquery(members), 0))
+
+class TaskQuerySet(models.QuerySet):
+    def for_serializer(self, user=None):
+        """
+        Prefetch plan covering everything TaskSerializer reads, so a page of
+        tasks costs a fixed number of queries regardless of its size.
+        `user` is used to annotate `user_is_watching`.
+        """
+        related_tasks = Task.objects.select_related('assigned_to')
+        qs = self.select_related('assigned_to').prefetch_related(
+            'tags',
+            'watchers',
+            Prefetch('subtasks', queryset=related_tasks),
+            Prefetch('dependencies', queryset=related_tasks),
+            Prefetch('dependents', queryset=related_tasks),
+            Prefetch('milestone', queryset=Milestone.objects.with_task_stats().prefetch_related('deliverables')),
+            Prefetch('sprint', queryset=Sprint.objects.with_task_stats()),
+        )
+        if user is not None and user.is_authenticated:
+            qs = qs.annotate(user_is_watching=Exists(
+                Task.watchers.through.objects.filter(task_id=OuterRef('pk'), user_id=user.id)
+            ))
+        return qs
 
 class ProjectCategory(models.Model):
     name = models.CharField(max_length=100)
@@ -32,7 +78,7 @@ class Program(models.Model):
     def __str__(self):
         return self.name
 
-class Project(models.Model):
+class Project(FieldTracker, models.Model):
     class Status(models.TextChoices):
         PLANNING = 'PLANNING', 'Planning'
         ACTIVE = 'ACTIVE', 'Active'
@@ -79,6 +125,8 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProjectQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -107,6 +155,8 @@ class Milestone(models.Model):
     is_completed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TaskStatsQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.project.name} - {self.name}"
 
@@ -148,10 +198,12 @@ class Sprint(models.Model):
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PLANNED)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TaskStatsQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.project.name} - {self.name}"
 
-class Task(models.Model):
+class Task(FieldTracker, models.Model):
     class Priority(models.TextChoices):
         LOW = 'LOW', 'Low'
         MEDIUM = 'MEDIUM', 'Medium'
@@ -199,8 +251,50 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # pagination keyset
+            # Hot filter paths in reports, reminders and the board views
+            models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+            models.Index(fields=['assigned_to', 'status'], name='task_assignee_status_idx'),
+            models.Index(fields=['sprint', 'status'], name='task_sprint_status_idx'),
+            models.Index(fields=['is_archived', 'due_date'], name='task_archived_due_idx'),
+            models.Index(fields=['priority'], name='task_priority_idx'),
+        ]
+
     def __str__(self):
         return self.title
+
+class ProjectTaskStats(models.Model):
+    """Per-project task counters maintained incrementally by projects.stats"""
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='task_counters')
+    total = models.IntegerField(default=0)
+    todo = models.IntegerField(default=0)
+    in_progress = models.IntegerField(default=0)
+    review = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Project Task Stats"
+
+    @property
+    def percentage(self):
+        return round(self.done / self.total * 100, 1) if self.total > 0 else 0
+
+    def __str__(self):
+        return f"{self.project_id}: {self.done}/{self.total} done"
+
+class Sequence(models.Model):
+    """Named counter handed out by projects.sequences (ticket numbers, project keys)"""
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
 class Release(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='releases')
     name = models.CharField(max_length=100)
@@ -0,0 +1,159 @@
+"""
+Gap-tolerant, collision-free counters backed by the Sequence table.
+
+`reserve(name, count)` bumps a named counter with an F() update and returns
+the first of `count` consecutive values. The UPDATE row-locks the counter,
+so concurrent reservations queue on it instead of colliding, and no caller
+ever needs to retry. A counter that does not exist yet is created, starting
+after `initial()` (e.g. the largest number already in use).
+
+`BlockAllocator` reserves values a block at a time and hands them out from
+memory, so busy paths touch the counter row once per block rather than once
+per value; values that a process never uses leave gaps. A block reserved
+inside a transaction is only kept once the transaction commits: a rollback
+undoes the reservation too, and other processes get those values next.
+
+Ticket numbers and generated project keys come from here, and so do the
+versions that per-process caches (compiled workflow rules, notification
+rules, the suggest index, report responses, project access) check before
+trusting what they hold: `version(name)` reads one, `bump_version(name)`
+moves it. Django's default cache is per process, so a version kept there
+would never reach the other web workers, the scheduler or the job runner.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Project, Sequence
+
+TICKET_PREFIX = 'TKT'
+DEFAULT_PROJECT_KEY_PREFIX = 'PRJ'
+
+
+def reserve(name, count=1, initial=None):
+    """Reserve `count` consecutive values of the named counter; returns the first"""
+    with transaction.atomic():
+        if not Sequence.objects.filter(name=name).update(value=F('value') + count):
+            start = initial() if initial else 0
+            try:
+                with transaction.atomic():
+                    Sequence.objects.create(name=name, value=start + count)
+                return start + 1
+            except IntegrityError:
+                # Created concurrently; the row exists now
+                Sequence.objects.filter(name=name).update(value=F('value') + count)
+        return Sequence.objects.filter(name=name).values_list('value', flat=True).get() - count + 1
+
+
+def current(name, initial=None):
+    """The counter's value, creating it at `initial()` (or 0) when it does not exist yet"""
+    value = Sequence.objects.filter(name=name).values_list('value', flat=True).first()
+    if value is None:
+        try:
+            with transaction.atomic():
+                value = Sequence.objects.create(name=name, value=initial() if initial else 0).value
+        except IntegrityError:
+            value = Sequence.objects.filter(name=name).values_list('value', flat=True).get()
+    return value
+
+
+def _initial_version():
+    # Not 1: a process holding data read under a counter that was rolled back or recreated must not mistake it for current
+    return time.time_ns()
+
+
+def version(name):
+    """Shared version `name`, the same in every process"""
+    return current(name, _initial_version)
+
+
+def bump_version(name):
+    """Move version `name` on; returns the new value, which no other caller gets"""
+    return reserve(name, initial=_initial_version)
+
+
+def bump_versions(names):
+    """Move several versions on with one UPDATE; those never read yet have nothing to invalidate"""
+    Sequence.objects.filter(name__in=list(names)).update(value=F('value') + 1)
+
+
+class BlockAllocator:
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self._blocks = defaultdict(list)  # name -> [(next value, end)], committed blocks only
+        self._lock = threading.Lock()
+
+    def next(self, name, initial=None):
+        with self._lock:
+            blocks = self._blocks[name]
+            if blocks:
+                value, end = blocks[0]
+                if value + 1 < end:
+                    blocks[0] = (value + 1, end)
+                else:
+                    blocks.pop(0)
+                return value
+        value = reserve(name, self.block_size, initial)
+        if self.block_size > 1:
+            # Runs straight away in autocommit
+            transaction.on_commit(partial(self._keep, name, value + 1, value + self.block_size))
+        return value
+
+    def _keep(self, name, start, end):
+        with self._lock:
+            self._blocks[name].append((start, end))
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+_ticket_numbers = BlockAllocator(getattr(settings, 'TICKET_NUMBER_BLOCK_SIZE', 10))
+
+
+def _largest_suffix(values, prefix):
+    """Largest integer following `prefix` among existing identifiers, or 0"""
+    pattern = re.compile(re.escape(prefix) + r'(\d+)$')
+    return max((int(m.group(1)) for m in map(pattern.match, values) if m), default=0)
+
+
+def next_ticket_number():
+    """TKT-YYYYMMDD-NNNN, numbered per day"""
+    from tickets.models import Ticket
+
+    prefix = f"{TICKET_PREFIX}-{timezone.localdate():%Y%m%d}-"
+    number = _ticket_numbers.next(
+        f'ticket:{prefix}',
+        # Numbers issued before this counter existed (formerly random) for the same day
+        initial=lambda: _largest_suffix(
+            Ticket.objects.filter(ticket_number__startswith=prefix).values_list('ticket_number', flat=True), prefix
+        ),
+    )
+    return f"{prefix}{number:04d}"
+
+
+def key_prefix(name):
+    """First three letters or digits of a project name, upper-cased"""
+    prefix = re.sub(r'[^A-Za-z0-9]', '', name or '')[:3].upper()
+    return prefix or DEFAULT_PROJECT_KEY_PREFIX
+
+
+def next_project_key(name):
+    """Unused project key: the name's prefix followed by a per-prefix counter"""
+    prefix = key_prefix(name)
+
+    def existing():
+        return Project.objects.filter(key__startswith=prefix).values_list('key', flat=True)
+
+    while True:
+        key = f"{prefix}{reserve(f'project-key:{prefix}', initial=lambda: _largest_suffix(existing(), prefix))}"
+        # Only a key typed in by hand after the counter was seeded can be taken already
+        if not Project.objects.filter(key=key).exists():
+            return key
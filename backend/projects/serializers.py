@@ -5,6 +5,7 @@ from .models import (
     Release, SprintRetrospective, SprintCapacity, TaskHistory
 )
 from users.serializers import UserSerializer
+from . import stats
 
 class ProjectCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -56,17 +57,27 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = '__all__'
 
-class SprintSerializer(serializers.ModelSerializer):
-    task_count = serializers.IntegerField(source='tasks.count', read_only=True)
+class TaskCountsMixin:
+    """Reads counts annotated by TaskStatsQuerySet.with_task_stats, falling back to a query"""
+
+    def get_task_count(self, obj):
+        if hasattr(obj, 'task_total'):
+            return obj.task_total
+        return obj.tasks.count()
+
+    def get_completed_tasks(self, obj):
+        if hasattr(obj, 'task_done'):
+            return obj.task_done
+        return obj.tasks.filter(status='DONE').count()
+
+class SprintSerializer(TaskCountsMixin, serializers.ModelSerializer):
+    task_count = serializers.SerializerMethodField()
     completed_tasks = serializers.SerializerMethodField()
     
     class Meta:
         model = Sprint
         fields = '__all__'
 
-    def get_completed_tasks(self, obj):
-        return obj.tasks.filter(status='DONE').count()
-
 class ReleaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Release
@@ -84,8 +95,8 @@ class SprintCapacitySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class MilestoneSerializer(serializers.ModelSerializer):
-    task_count = serializers.IntegerField(source='tasks.count', read_only=True)
+class MilestoneSerializer(TaskCountsMixin, serializers.ModelSerializer):
+    task_count = serializers.SerializerMethodField()
     completed_tasks = serializers.SerializerMethodField()
     deliverables = DeliverableSerializer(many=True, read_only=True)
     
@@ -93,9 +104,6 @@ class MilestoneSerializer(serializers.ModelSerializer):
         model = Milestone
         fields = '__all__'
 
-    def get_completed_tasks(self, obj):
-        return obj.tasks.filter(status='DONE').count()
-
 class SubTaskSerializer(serializers.ModelSerializer):
     """ Simplified serializer for subtasks/dependencies to avoid deep recursion overhead """
     assigned_to_details = UserSerializer(source='assigned_to', read_only=True)
@@ -122,6 +130,9 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = '__all__'
         
     def get_is_watching(self, obj):
+        # Annotated by TaskQuerySet.for_serializer
+        if hasattr(obj, 'user_is_watching'):
+            return obj.user_is_watching
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.watchers.filter(id=request.user.id).exists()
@@ -211,31 +222,36 @@ class ProjectSerializer(serializers.ModelSerializer):
         ]
 
     def get_active_members(self, obj):
+        if hasattr(obj, 'member_count'):
+            return obj.member_count
         return obj.members.count()
 
     def get_is_watching(self, obj):
+        # Annotated by ProjectViewSet.get_queryset to avoid a query per row
+        if hasattr(obj, 'user_is_watching'):
+            return obj.user_is_watching
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.watchers.filter(id=request.user.id).exists()
         return False
 
     def get_is_starred(self, obj):
+        if hasattr(obj, 'user_has_starred'):
+            return obj.user_has_starred
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.starred_by.filter(id=request.user.id).exists()
         return False
         
     def get_task_stats(self, obj):
-        tasks = obj.tasks.all()
-        total = tasks.count()
-        done = tasks.filter(status='DONE').count()
-        percentage = (done / total * 100) if total > 0 else 0
+        # Precomputed rollup, select_related by ProjectViewSet
+        counters = stats.counters_for(obj)
         return {
-            'total': total,
-            'done': done,
-            'percentage': round(percentage, 1),
-            'todo': tasks.filter(status='TODO').count(),
-            'in_progress': tasks.filter(status='IN_PROGRESS').count(),
+            'total': counters.total,
+            'done': counters.done,
+            'percentage': counters.percentage,
+            'todo': counters.todo,
+            'in_progress': counters.in_progress,
         }
 
     def to_internal_value(self, data):
@@ -246,3 +262,27 @@ class ProjectSerializer(serializers.ModelSerializer):
         if new_data.get('end_date') == '':
             new_data.pop('end_date')
         return super().to_internal_value(new_data)
+
+class ProjectListSerializer(ProjectSerializer):
+    """
+    Compact project representation used by the project list endpoint.
+
+    Nested collections are only included when named in the ``expand``
+    serializer context (populated from ``?expand=tasks,milestones``).
+    """
+    EXPANDABLE_FIELDS = ['tasks', 'milestones', 'sprints', 'goals', 'deliverables', 'custom_statuses']
+
+    class Meta(ProjectSerializer.Meta):
+        fields = [
+            'id', 'name', 'key', 'description', 'status', 'visibility', 'health_status',
+            'background_color', 'is_template', 'start_date', 'end_date',
+            'created_by', 'created_by_details', 'members', 'members_details',
+            'team', 'category', 'category_details', 'program', 'portfolio', 'parent_project',
+            'active_members', 'task_stats', 'is_watching', 'is_starred',
+            'created_at', 'updated_at',
+        ]
+
+    def get_field_names(self, declared_fields, info):
+        fields = list(super().get_field_names(declared_fields, info))
+        expand = self.context.get('expand', ())
+        return fields + [name for name in self.EXPANDABLE_FIELDS if name in expand]
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Task
+from users.models import Team
+from .models import Project, Task
+from . import access, stats
 from collaboration.utils import create_notification
+from audit import pipeline as audit
 
 @receiver(post_save, sender=Task)
 def task_notifications(sender, instance, created, **kwargs):
@@ -9,7 +12,7 @@ def task_notifications(sender, instance, created, **kwargs):
         if instance.assigned_to:
             create_notification(
                 user=instance.assigned_to,
-                actor=instance.created_by,
+                actor=audit.current_user(),
                 verb='assigned you to',
                 target=instance,
                 description=f'Task: {instance.title}'
@@ -19,11 +22,63 @@ def task_notifications(sender, instance, created, **kwargs):
         # Note: This is a simplified version, ideally you'd check old value via pre_save
         pass
 
-@receiver(pre_save, sender=Task)
-def task_pre_save(sender, instance, **kwargs):
-    if instance.id:
-        old_instance = Task.objects.get(id=instance.id)
-        if old_instance.assigned_to != instance.assigned_to and instance.assigned_to:
-            # We'll use a flag or just handle it here if we had the request user
-            # Since signals don't have request user easily, we usually pass it or omit actor
-            pass
+@receiver(post_save, sender=Project)
+def create_task_counters(sender, instance, created, **kwargs):
+    if created:
+        stats.ProjectTaskStats.objects.get_or_create(project=instance)
+
+@receiver(post_save, sender=Task)
+def update_task_counters(sender, instance, created, **kwargs):
+    current = (instance.project_id, instance.status)
+    if created:
+        stats.task_added(*current)
+    elif instance.saved_changes is not None:
+        previous = (instance.value_before_save('project_id'), instance.value_before_save('status'))
+        stats.task_moved(*previous, *current)
+    else:
+        # Saved without being loaded from the database; we don't know the previous values
+        stats.rebuild(project_ids=[instance.project_id])
+
+@receiver(post_delete, sender=Task)
+def remove_from_task_counters(sender, instance, **kwargs):
+    # The row as last loaded or saved is what the counters hold
+    stats.task_removed(
+        instance.loaded_value('project_id', instance.project_id), instance.loaded_value('status', instance.status)
+    )
+
+
+def _team_member_ids(*team_ids):
+    team_ids = [team_id for team_id in team_ids if team_id is not None]
+    if not team_ids:
+        return []
+    return list(Team.members.through.objects.filter(team_id__in=team_ids).values_list('user_id', flat=True))
+
+@receiver(post_save, sender=Project)
+def invalidate_project_access_on_save(sender, instance, created, **kwargs):
+    changes = instance.saved_changes
+    if created or changes is None:
+        access.invalidate([instance.created_by_id, *_team_member_ids(instance.team_id)])
+    elif changes.keys() & {'team_id', 'created_by_id'}:
+        old_team, old_creator = instance.value_before_save('team_id'), instance.value_before_save('created_by_id')
+        access.invalidate([
+            old_creator, instance.created_by_id, *_team_member_ids(old_team, instance.team_id)
+        ])
+
+@receiver(m2m_changed, sender=Project.members.through)
+@receiver(m2m_changed, sender=Team.members.through)
+def invalidate_project_access_on_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # user.projects / user.teams changed: only that user is affected
+        if action.startswith('post_'):
+            access.invalidate([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        access.invalidate(pk_set)
+    elif action == 'pre_clear':
+        instance._members_before_clear = list(instance.members.values_list('id', flat=True))
+    elif action == 'post_clear':
+        access.invalidate(getattr(instance, '_members_before_clear', []))
+
+@receiver(pre_delete, sender=Team)
+def invalidate_project_access_on_team_delete(sender, instance, **kwargs):
+    # Members lose access to the team's projects; collect them while the m2m rows still exist
+    access.invalidate(_team_member_ids(instance.pk))
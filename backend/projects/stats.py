@@ -0,0 +1,96 @@
+"""
+Incremental maintenance of the ProjectTaskStats rollup.
+
+Task saves and deletes adjust the counters with F() expressions through the
+signals in projects.signals; code paths that bypass signals (queryset.update)
+must call `apply_bulk_status_change` themselves. `rebuild` recomputes the table
+from scratch and backs the `rebuild_task_stats` management command.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from .models import Project, Task, ProjectTaskStats
+
+# Task.status -> ProjectTaskStats column
+STATUS_COLUMNS = {
+    Task.Status.TODO: 'todo',
+    Task.Status.IN_PROGRESS: 'in_progress',
+    Task.Status.REVIEW: 'review',
+    Task.Status.DONE: 'done',
+}
+
+
+def _adjust(project_id, status, delta):
+    """Add `delta` to the total and status counter of a project; returns rows updated"""
+    updates = {'total': F('total') + delta, 'updated_at': timezone.now()}
+    column = STATUS_COLUMNS.get(status)
+    if column:
+        updates[column] = F(column) + delta
+    return ProjectTaskStats.objects.filter(project_id=project_id).update(**updates)
+
+
+def task_added(project_id, status, count=1):
+    if project_id is None:
+        return
+    if not _adjust(project_id, status, count):
+        # Project predates the rollup table; seed its row from the tasks table
+        rebuild(project_ids=[project_id])
+
+
+def task_removed(project_id, status, count=1):
+    # A missing row means the project itself is being deleted, nothing to keep in sync
+    if project_id is not None:
+        _adjust(project_id, status, -count)
+
+
+def task_moved(old_project_id, old_status, new_project_id, new_status, count=1):
+    if (old_project_id, old_status) == (new_project_id, new_status):
+        return
+    with transaction.atomic():
+        task_removed(old_project_id, old_status, count)
+        task_added(new_project_id, new_status, count)
+
+
+def counters_for(project):
+    """The project's ProjectTaskStats row, seeding it if the project has none yet"""
+    try:
+        return project.task_counters
+    except ProjectTaskStats.DoesNotExist:
+        rebuild(project_ids=[project.pk])
+        return ProjectTaskStats.objects.get(project_id=project.pk)
+
+
+def apply_bulk_status_change(queryset, new_status):
+    """
+    Account for `queryset.update(status=new_status)`, which skips signals.
+    Call inside the same transaction, before running the update.
+    """
+    moved = queryset.exclude(status=new_status).order_by().values('project_id', 'status').annotate(n=Count('id'))
+    for row in moved:
+        task_moved(row['project_id'], row['status'], row['project_id'], new_status, row['n'])
+
+
+def rebuild(project_ids=None):
+    """Recompute counters from the tasks table with one grouped query"""
+    projects = Project.objects.all()
+    if project_ids is not None:
+        projects = projects.filter(pk__in=project_ids)
+
+    counts = projects.annotate(
+        total=Count('tasks'),
+        **{
+            column: Count('tasks', filter=Q(tasks__status=status))
+            for status, column in STATUS_COLUMNS.items()
+        }
+    ).values_list('pk', 'total', *STATUS_COLUMNS.values())
+
+    columns = ['total', *STATUS_COLUMNS.values()]
+    rows = [
+        ProjectTaskStats(project_id=pk, **dict(zip(columns, values)))
+        for pk, *values in counts
+    ]
+    ProjectTaskStats.objects.bulk_create(
+        rows, batch_size=1000,
+        update_conflicts=True, unique_fields=['project'], update_fields=columns + ['updated_at'],
+    )
+    return len(rows)
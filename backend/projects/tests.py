@@ -1,3 +1,418 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from users.models import Enterprise, Team
+from django.utils import timezone
+
+from activity.models import AuditLog
+from tickets.models import Ticket
+from . import access, sequences
+from .models import Project, Task, Tag, Milestone, Sprint, Deliverable, ProjectTaskStats, Sequence
+
+User = get_user_model()
+
+
+class ProjectListAPITest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lister', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(name='Apollo', created_by=self.user)
+        self.project.members.add(self.user)
+        self.project.starred_by.add(self.user)
+        Task.objects.create(project=self.project, title='Design', status='DONE')
+        Milestone.objects.create(project=self.project, name='M1', due_date='2030-01-01')
+
+    def test_list_is_compact_by_default(self):
+        resp = self.client.get('/api/projects/projects/')
+        self.assertEqual(resp.status_code, 200)
+        row = resp.json()['results'][0]
+        self.assertNotIn('tasks', row)
+        self.assertNotIn('milestones', row)
+        self.assertTrue(row['is_starred'])
+        self.assertEqual(row['members_details'][0]['username'], 'lister')
+
+    def test_list_expand(self):
+        resp = self.client.get('/api/projects/projects/?expand=tasks,milestones,bogus')
+        row = resp.json()['results'][0]
+        self.assertEqual([t['title'] for t in row['tasks']], ['Design'])
+        self.assertEqual([m['name'] for m in row['milestones']], ['M1'])
+        self.assertNotIn('sprints', row)
+        self.assertNotIn('bogus', row)
+
+    def test_retrieve_is_full(self):
+        resp = self.client.get(f'/api/projects/projects/{self.project.id}/')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertIn('tasks', data)
+        self.assertIn('sprints', data)
+        self.assertTrue(data['is_starred'])
+
+    def test_task_stats_are_annotated(self):
+        Task.objects.create(project=self.project, title='Build', status='IN_PROGRESS')
+        row = self.client.get('/api/projects/projects/').json()['results'][0]
+        self.assertEqual(row['task_stats'], {'total': 2, 'done': 1, 'percentage': 50.0, 'todo': 0, 'in_progress': 1})
+        self.assertEqual(row['active_members'], 1)
+
+    def test_list_query_count_is_constant(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/api/projects/projects/?expand=milestones,sprints')
+            return len(ctx.captured_queries)
+
+        # Compared once the accessible project ids are cached
+        count_queries()
+        baseline = count_queries()
+        for i in range(5):
+            project = Project.objects.create(name=f'P{i}', created_by=self.user)
+            project.members.add(self.user)
+            Task.objects.create(project=project, title='T', status='TODO')
+            Milestone.objects.create(project=project, name='M', due_date='2030-01-01')
+            Sprint.objects.create(project=project, name='S', start_date='2030-01-01', end_date='2030-01-14')
+        count_queries()
+        self.assertEqual(count_queries(), baseline)
+
+
+class TaskPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        project = Project.objects.create(name='Paged', created_by=self.user)
+        Task.objects.bulk_create([Task(project=project, title=f'T{i}') for i in range(7)])
+
+    def test_cursor_walks_every_task_once(self):
+        seen = []
+        url = '/api/projects/tasks/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 3)
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+
+class ProjectTaskStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter', password='pass', role='MEMBER')
+        self.project = Project.objects.create(name='Counted', created_by=self.user)
+
+    def assert_counters(self, **expected):
+        counters = ProjectTaskStats.objects.get(project=self.project)
+        self.assertEqual({field: getattr(counters, field) for field in expected}, expected)
+
+    def test_counters_follow_task_lifecycle(self):
+        task = Task.objects.create(project=self.project, title='A')
+        Task.objects.create(project=self.project, title='B', status='IN_PROGRESS')
+        self.assert_counters(total=2, todo=1, in_progress=1, done=0)
+
+        task = Task.objects.get(pk=task.pk)
+        task.status = 'DONE'
+        task.save()
+        self.assert_counters(total=2, todo=0, in_progress=1, done=1)
+
+        task.delete()
+        self.assert_counters(total=1, todo=0, in_progress=1, done=0)
+
+    def test_bulk_status_update(self):
+        tasks = [Task.objects.create(project=self.project, title=f'T{i}') for i in range(3)]
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        resp = client.post('/api/projects/tasks/bulk_operation/', {
+            'ids': [t.id for t in tasks[:2]], 'operation': 'update_status', 'value': 'DONE',
+        }, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assert_counters(total=3, todo=1, done=2)
+
+    def test_rebuild(self):
+        Task.objects.bulk_create([Task(project=self.project, title='Bulk', status='REVIEW')])
+        self.assert_counters(total=0, review=0)
+        call_command('rebuild_task_stats', stdout=StringIO())
+        self.assert_counters(total=1, review=1)
+
+
+class ProjectAccessTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pass', role='MEMBER')
+        self.user = User.objects.create_user(username='viewer', password='pass', role='MEMBER')
+        self.project = Project.objects.create(name='Shared', created_by=self.owner)
+        self.team = Team.objects.create(name='Core')
+        self.team_project = Project.objects.create(name='Team owned', created_by=self.owner)
+
+    def test_ids_cached_and_invalidated(self):
+        self.assertEqual(access.accessible_project_ids(self.owner), {self.project.id, self.team_project.id})
+        self.assertEqual(access.accessible_project_ids(self.user), frozenset())
+        # Only the user's access version is read
+        with self.assertNumQueries(1):
+            access.accessible_project_ids(self.user)
+
+        self.project.members.add(self.user)
+        self.assertEqual(access.accessible_project_ids(self.user), {self.project.id})
+
+        self.user.teams.add(self.team)
+        self.team_project.team = self.team
+        self.team_project.save()
+        self.assertEqual(access.accessible_project_ids(self.user), {self.project.id, self.team_project.id})
+
+        self.team.members.clear()
+        self.project.members.remove(self.user)
+        self.assertEqual(access.accessible_project_ids(self.user), frozenset())
+
+        # Removed by another process: its cache is not ours, but the version in the database moves
+        self.project.members.add(self.user)
+        access.accessible_project_ids(self.user)
+        Project.members.through.objects.filter(project=self.project, user=self.user).delete()
+        Sequence.objects.filter(name=f'version:project-access:{self.user.pk}').update(value=F('value') + 1)
+        self.assertEqual(access.accessible_project_ids(self.user), frozenset())
+
+    def test_task_list_limited_to_accessible_projects(self):
+        Task.objects.create(project=self.project, title='Visible')
+        Task.objects.create(project=self.team_project, title='Hidden')
+        self.project.members.add(self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        resp = client.get('/api/projects/tasks/')
+        self.assertEqual([t['title'] for t in resp.json()['results']], ['Visible'])
+
+    def test_enterprise_projects_list_their_tasks(self):
+        enterprise = Enterprise.objects.create(name='Acme', domain='acme.example')
+        self.team.enterprise = enterprise
+        self.team.save()
+        self.team_project.team = self.team
+        self.team_project.save()
+        Task.objects.create(project=self.team_project, title='Enterprise work')
+        self.user.enterprise = enterprise
+        self.user.save()
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        # Not a member, but listed through the enterprise: its board must not be empty
+        projects = client.get('/api/projects/projects/').json()['results']
+        self.assertEqual([p['name'] for p in projects], ['Team owned'])
+        resp = client.get(f'/api/projects/tasks/?project_id={self.team_project.id}')
+        self.assertEqual([t['title'] for t in resp.json()['results']], ['Enterprise work'])
+
+
+class SequenceTest(TestCase):
+    def setUp(self):
+        sequences._ticket_numbers.reset()
+        self.user = User.objects.create_user(username='seq', password='pass', role='MEMBER')
+
+    def test_reserve_hands_out_consecutive_ranges(self):
+        self.assertEqual(sequences.reserve('demo'), 1)
+        self.assertEqual(sequences.reserve('demo', 10), 2)
+        self.assertEqual(sequences.reserve('demo'), 12)
+        self.assertEqual(sequences.reserve('other', initial=lambda: 41), 42)
+
+    def test_block_allocator_touches_the_counter_once_per_block(self):
+        allocator = sequences.BlockAllocator(block_size=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            allocator.next('demo')
+        with self.assertNumQueries(0):
+            values = [allocator.next('demo') for _ in range(4)]
+        self.assertEqual(values, [2, 3, 4, 5])
+        self.assertEqual(allocator.next('demo'), 6)
+        # Another process's block starts after everything reserved so far
+        self.assertEqual(sequences.BlockAllocator(block_size=5).next('demo'), 11)
+
+    def test_block_reserved_in_a_rolled_back_transaction_is_not_kept(self):
+        allocator = sequences.BlockAllocator(block_size=5)
+        try:
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                self.assertEqual(allocator.next('demo'), 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # The reservation was rolled back with it, so another process gets 1-5 next
+        self.assertEqual(sequences.BlockAllocator(block_size=5).next('demo'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(allocator.next('demo'), 6)
+        self.assertEqual(allocator.next('demo'), 7)
+
+    def test_ticket_numbers_are_unique_per_day(self):
+        prefix = f"TKT-{timezone.localdate():%Y%m%d}-"
+        # Left over from random generation before the counter existed
+        Ticket.objects.create(ticket_number=f'{prefix}0731', title='Old', description='', submitted_by=self.user)
+
+        numbers = []
+        for i in range(3):
+            # Each in its own committed transaction, like separate requests
+            with self.captureOnCommitCallbacks(execute=True):
+                numbers.append(Ticket.objects.create(title=f'T{i}', description='', submitted_by=self.user).ticket_number)
+        self.assertEqual(numbers, [f'{prefix}0732', f'{prefix}0733', f'{prefix}0734'])
+
+    def test_generated_project_keys(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        Project.objects.create(name='Legacy', key='APO42', created_by=self.user)
+        Project.objects.create(name='Manual', key='APO44', created_by=self.user)
+
+        def create(name):
+            resp = client.post('/api/projects/projects/', {'name': name, 'start_date': '2030-01-01'}, format='json')
+            self.assertEqual(resp.status_code, 201, resp.content)
+            return resp.json()['key']
+
+        self.assertEqual(create('Apollo'), 'APO45')
+        # A key typed in by hand after the counter was seeded is skipped
+        Project.objects.create(name='Manual', key='APO46', created_by=self.user)
+        self.assertEqual([create('Apogee'), create('Apollo 13'), create('!!')], ['APO47', 'APO48', 'PRJ1'])
+
+
+class FieldTrackerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='tracker', password='pass', role='MEMBER')
+        self.other = User.objects.create_user(username='other', password='pass', role='MEMBER')
+        self.project = Project.objects.create(name='Apollo', created_by=self.user)
+        self.project.members.add(self.user)
+
+    def row_selects(self, queries, table):
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith(f'SELECT') and f'FROM "{table}"' in q['sql']]
+
+    def test_changes_are_diffed_in_memory(self):
+        task = Task.objects.get(id=Task.objects.create(project=self.project, title='Build', status='TODO').id)
+        self.assertEqual(task.changed_fields(), {})
+        task.status = 'DONE'
+        task.assigned_to = self.other
+        self.assertEqual(task.changed_fields(), {'status': ('TODO', 'DONE'), 'assigned_to_id': (None, self.other.id)})
+
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+        self.assertEqual(self.row_selects(queries, 'projects_task'), [])
+        self.assertEqual(set(task.saved_changes), {'status', 'assigned_to_id'})
+        self.assertEqual(task.changed_fields(), {})
+        self.assertEqual(ProjectTaskStats.objects.get(project=self.project).done, 1)
+
+        # Built by hand: previous values unknown
+        self.assertIsNone(Task(id=task.id, project=self.project, title='X').changed_fields())
+
+    def test_update_fields_limits_saved_changes(self):
+        task = Task.objects.get(id=Task.objects.create(project=self.project, title='A', status='TODO').id)
+        task.title = 'B'
+        task.status = 'DONE'
+        task.save(update_fields=['status'])
+        self.assertEqual(task.saved_changes, {'status': ('TODO', 'DONE')})
+        # The title was not written, so it is still pending
+        self.assertEqual(task.changed_fields(), {'title': ('A', 'B')})
+        task.save(update_fields=['title'])
+        self.assertEqual(task.saved_changes, {'title': ('A', 'B')})
+
+    def test_ticket_audit_without_reloading(self):
+        ticket = Ticket.objects.create(title='Printer', description='', submitted_by=self.user)
+        ticket = Ticket.objects.get(id=ticket.id)
+        ticket.status = 'IN_PROGRESS'
+        ticket.assigned_to = self.other
+        # Audit events are written once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            ticket.save()
+        self.assertEqual(self.row_selects(queries, 'tickets_ticket'), [])
+        # Assignees are logged by id, without looking them up
+        self.assertFalse([sql for sql in self.row_selects(queries, 'users_user') if '" IN (' in sql])
+        log = AuditLog.objects.filter(action='UPDATE').get()
+        self.assertEqual(log.details['changes']['assigned_to'], {'old': None, 'new': self.other.id, 'ref': 'users.user'})
+        self.assertEqual(log.details['changes']['status']['new'], 'IN_PROGRESS')
+
+        # ...and read back by username
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        resp = client.get(f'/api/activity/audit-logs/?content_type=ticket&object_id={ticket.id}')
+        changes = next(row['details']['changes'] for row in resp.json()['results'] if row['action'] == 'UPDATE')
+        self.assertEqual(changes['assigned_to'], {'old': 'Unassigned', 'new': 'other'})
+
+    def test_task_update_view_does_not_refetch(self):
+        task = Task.objects.create(project=self.project, title='Build', status='TODO')
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            resp = client.patch(f'/api/projects/tasks/{task.id}/', {'status': 'REVIEW'}, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        # get_object() only; perform_update no longer loads the task a second time to diff it
+        task_gets = [sql for sql in self.row_selects(queries, 'projects_task') if sql.endswith('LIMIT 21')]
+        self.assertEqual(len(task_gets), 1)
+        log = AuditLog.objects.get(action='UPDATE_TASK')
+        self.assertEqual(log.details, {'status': {'old': 'TODO', 'new': 'REVIEW'}})
+
+    def test_task_foreign_keys_are_read_by_name(self):
+        task = Task.objects.create(project=self.project, title='Build', status='TODO')
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = client.patch(f'/api/projects/tasks/{task.id}/', {'assigned_to': self.other.id}, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        resp = client.get(f'/api/activity/audit-logs/?content_type=task&object_id={task.id}')
+        self.assertEqual(resp.json()['results'][0]['details'], {'assigned_to': {'old': 'Unassigned', 'new': 'other'}})
+        # A deleted user keeps showing up by id
+        other_id = self.other.id
+        self.other.delete()
+        resp = client.get(f'/api/activity/audit-logs/?content_type=task&object_id={task.id}')
+        self.assertEqual(resp.json()['results'][0]['details'], {'assigned_to': {'old': 'Unassigned', 'new': str(other_id)}})
+
+
+# Queries issued by TaskViewSet list/retrieve once every relation is populated:
+# the user's project access version, tasks, tags, watchers, subtasks,
+# dependencies, dependents, milestone, milestone deliverables, sprint.
+TASK_QUERY_COUNT = 10
+
+
+class TaskQueryCountTest(TestCase):
+    """Regression guard for the TaskQuerySet.for_serializer prefetch plan"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='board', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(name='Board', created_by=self.user)
+        self.milestone = Milestone.objects.create(project=self.project, name='M1', due_date='2030-01-01')
+        Deliverable.objects.create(project=self.project, milestone=self.milestone, name='D1')
+        self.sprint = Sprint.objects.create(project=self.project, name='S1', start_date='2030-01-01', end_date='2030-01-14')
+        self.tag = Tag.objects.create(name='backend')
+
+    def create_tasks(self, count):
+        tasks = Task.objects.bulk_create([
+            Task(
+                project=self.project, title=f'Task {i}', assigned_to=self.user,
+                milestone=self.milestone, sprint=self.sprint,
+            )
+            for i in range(count)
+        ])
+        parent = tasks[0]
+        Task.objects.filter(pk__in=[t.pk for t in tasks[1:]]).update(parent_task=parent)
+        Task.tags.through.objects.bulk_create([Task.tags.through(task=t, tag=self.tag) for t in tasks])
+        Task.watchers.through.objects.bulk_create([Task.watchers.through(task=t, user=self.user) for t in tasks])
+        Task.dependencies.through.objects.bulk_create([
+            Task.dependencies.through(from_task=t, to_task=parent) for t in tasks[1:]
+        ])
+        return tasks
+
+    def assert_list_queries(self, count):
+        tasks = self.create_tasks(count)
+        # Steady state: the accessible project ids are cached (see projects.access)
+        access.accessible_project_ids(self.user)
+        with self.assertNumQueries(TASK_QUERY_COUNT):
+            resp = self.client.get(f'/api/projects/tasks/?page_size={count}')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['results']
+        self.assertEqual(len(data), count)
+        self.assertTrue(all(row['is_watching'] for row in data))
+        with self.assertNumQueries(TASK_QUERY_COUNT):
+            resp = self.client.get(f'/api/projects/tasks/{tasks[0].pk}/')
+        self.assertEqual(resp.json()['subtasks_count'], count - 1)
+        self.assertEqual(resp.json()['milestone_details']['task_count'], count)
+
+    def test_10_tasks(self):
+        self.assert_list_queries(10)
+
+    def test_100_tasks(self):
+        self.assert_list_queries(100)
+
+    def test_1000_tasks(self):
+        self.assert_list_queries(1000)
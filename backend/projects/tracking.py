@@ -0,0 +1,91 @@
+"""
+In-memory field change tracking for Task, Ticket and Project.
+
+Instances remember the column values they were loaded with (`from_db`)
+and, after each save, the values they wrote, so a diff never needs a
+SELECT of the previous row:
+
+- `changed_fields()`: unsaved changes as {attname: (old, new)};
+- `saved_changes`: inside post_save (and after the save), what that save
+  changed (only the `update_fields` columns when given), `{}` for a new row, or None when the previous values are unknown
+  because the instance was built by hand rather than loaded;
+- `value_before_save(attname)`: the column value before the current save.
+
+Keys are column attnames (`assigned_to_id`, not `assigned_to`). Fields
+deferred when loading are not tracked.
+"""
+
+
+class FieldTracker:
+    _loaded_values = None
+    _saving = False
+    saved_changes = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def changed_fields(self):
+        """{attname: (old, new)} for tracked columns changed since the last load or save"""
+        if self._loaded_values is None:
+            return None
+        current = self.__dict__
+        return {
+            name: (old, current[name])
+            for name, old in self._loaded_values.items()
+            if name in current and current[name] != old
+        }
+
+    def loaded_value(self, attname, default=None):
+        """Column value as last loaded or saved"""
+        if self._loaded_values is None:
+            return default
+        return self._loaded_values.get(attname, default)
+
+    def value_before_save(self, attname):
+        change = (self.saved_changes or {}).get(attname)
+        return change[0] if change else self.__dict__.get(attname)
+
+    def _saved_values(self, update_fields):
+        current = self.__dict__
+        return {
+            field.attname: current[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in current and (
+                update_fields is None or field.name in update_fields or field.attname in update_fields
+            )
+        }
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        if self._loaded_values is not None:
+            self._loaded_values.update(self._saved_values(kwargs.get('fields')))
+
+    def save(self, *args, **kwargs):
+        nested = self._saving
+        outer_changes = self.saved_changes
+        previous = self._loaded_values
+        update_fields = kwargs.get('update_fields')
+
+        written = self._saved_values(update_fields)
+        changes = {} if self._state.adding else self.changed_fields()
+        if changes and update_fields is not None:
+            # Columns left out of update_fields stay dirty; they are not part of this save
+            changes = {name: change for name, change in changes.items() if name in written}
+        self.saved_changes = changes
+        # New baseline before the write, so saves made by post_save receivers diff against it
+        self._loaded_values = {**(previous or {}), **written}
+        self._saving = True
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self._loaded_values = previous
+            raise
+        finally:
+            self._saving = nested
+            if nested:
+                self.saved_changes = outer_changes
+        # Pick up values set during the write (primary key, auto_now timestamps)
+        self._loaded_values.update(self._saved_values(update_fields))
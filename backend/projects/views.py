@@ -3,20 +3,23 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from users.utils import user_has_role, user_role_in
 from django.utils import timezone
-from django.db.models import Q
-from activity.models import AuditLog
+from django.db import transaction
+from django.db.models import Q, Exists, OuterRef, Prefetch
+from audit import pipeline as audit
 from .models import (
     Project, Task, Tag, Milestone, ProjectCategory,
     Portfolio, Program, ProjectGoal, Deliverable, ProjectStatus, Sprint,
     Release, SprintRetrospective, SprintCapacity, TaskHistory
 )
 from .serializers import (
-    ProjectSerializer, TaskSerializer, TagSerializer, MilestoneSerializer,
+    ProjectSerializer, ProjectListSerializer, TaskSerializer, TagSerializer, MilestoneSerializer,
     ProjectCategorySerializer, PortfolioSerializer, ProgramSerializer,
     ProjectGoalSerializer, DeliverableSerializer, ProjectStatusSerializer,
     SprintSerializer, ReleaseSerializer, SprintRetrospectiveSerializer,
     SprintCapacitySerializer, ReminderSerializer
 )
+from . import access, sequences, stats
+from reports import cache as report_cache
 # Import Ticket model lazily to avoid circular imports in some test setups
 try:
     from tickets.models import Ticket
@@ -109,7 +112,7 @@ class SprintViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         project_id = self.request.query_params.get('project_id')
         user = self.request.user
-        qs = Sprint.objects.all()
+        qs = Sprint.objects.with_task_stats()
         
         if user.enterprise:
             qs = qs.filter(project__team__enterprise=user.enterprise)
@@ -140,35 +143,61 @@ class ProjectViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
 
     def get_queryset(self):
+        qs = access.filter_visible(Project.objects.all(), self.request.user)
+
+        if self.action in ('list', 'retrieve'):
+            return self.with_prefetch_plan(qs)
+        return qs
+
+    def get_expand(self):
+        """Nested collections requested via ?expand=tasks,milestones,..."""
+        if self.action != 'list':
+            # The detail view always renders the full ProjectSerializer
+            return set(ProjectListSerializer.EXPANDABLE_FIELDS)
+        raw = self.request.query_params.get('expand', '')
+        requested = {name.strip() for name in raw.split(',')}
+        return requested & set(ProjectListSerializer.EXPANDABLE_FIELDS)
+
+    def with_prefetch_plan(self, qs):
+        """Load everything the serializer touches in a fixed number of queries"""
         user = self.request.user
-        is_admin = user_has_role(user, 'ADMIN')
+        qs = qs.with_member_count()
+        qs = qs.select_related('created_by', 'category', 'task_counters').prefetch_related('members').annotate(
+            user_is_watching=Exists(Project.watchers.through.objects.filter(project_id=OuterRef('pk'), user_id=user.id)),
+            user_has_starred=Exists(Project.starred_by.through.objects.filter(project_id=OuterRef('pk'), user_id=user.id)),
+        )
+        if self.action == 'retrieve':
+            qs = qs.select_related(
+                'team', 'program__owner', 'portfolio__owner', 'parent_project'
+            ).prefetch_related('portfolio__projects', 'subprojects', 'dependencies')
+
+        expand = self.get_expand()
+        if 'tasks' in expand:
+            qs = qs.prefetch_related(Prefetch('tasks', queryset=Task.objects.for_serializer(user)))
+        if 'milestones' in expand:
+            qs = qs.prefetch_related(Prefetch(
+                'milestones', queryset=Milestone.objects.with_task_stats().prefetch_related('deliverables')
+            ))
+        if 'sprints' in expand:
+            qs = qs.prefetch_related(Prefetch('sprints', queryset=Sprint.objects.with_task_stats()))
+        for name in ('goals', 'deliverables', 'custom_statuses'):
+            if name in expand:
+                qs = qs.prefetch_related(name)
+        return qs
 
-        if is_admin:
-            return Project.objects.all()
-            
-        from django.db.models import Q
-        base_query = Project.objects.all()
-        
-        # Filter by Enterprise if user belongs to one
-        if user.enterprise:
-            return base_query.filter(
-                Q(team__enterprise=user.enterprise) | Q(members=user) | Q(created_by=user)
-            ).distinct()
-            
-        return base_query.filter(
-            Q(members=user) | Q(team__members=user) | Q(created_by=user)
-        ).distinct()
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProjectListSerializer
+        return ProjectSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
 
     def perform_create(self, serializer):
-        # Generate a simple key if not provided (e.g., from first 3 letters of name)
-        name = self.request.data.get('name', 'PRJ')
-        key = self.request.data.get('key')
-        if not key:
-            key = (name[:3].upper() if len(name) >= 3 else name.upper())
-            # Ensure uniqueness (simple way for now)
-            import random, string
-            suffix = ''.join(random.choices(string.digits, k=2))
-            key = f"{key}{suffix}"
+        # Generate a key if not provided: first 3 letters of the name plus a per-prefix counter
+        key = self.request.data.get('key') or sequences.next_project_key(self.request.data.get('name', ''))
         
         team_id = self.request.data.get('team_id')
         team = None
@@ -247,14 +276,14 @@ class MilestoneViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         project_id = self.request.query_params.get('project_id')
         user = self.request.user
-        qs = Milestone.objects.all()
+        qs = Milestone.objects.with_task_stats().prefetch_related('deliverables')
         
         if user.enterprise:
             qs = qs.filter(project__team__enterprise=user.enterprise)
             
         if project_id:
             return qs.filter(project_id=project_id)
-        return qs.filter(project__members=user)
+        return access.filter_accessible(qs, user)
 
 class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
@@ -262,20 +291,23 @@ class TaskViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['title', 'description']
+    # Boards render a whole project at once
+    page_size = 200
+    max_page_size = 1000
 
     def get_queryset(self):
         project_id = self.request.query_params.get('project_id')
         user = self.request.user
         
-        qs = Task.objects.all()
-        if user.enterprise:
-            qs = qs.filter(project__team__enterprise=user.enterprise)
-            
+        # Same projects as ProjectViewSet, so an openable project never shows an empty board
+        qs = access.filter_visible(Task.objects.all(), user, project='project__')
+
         if project_id:
-            return qs.filter(project_id=project_id)
+            qs = qs.filter(project_id=project_id)
+        if self.action in ('list', 'retrieve'):
+            qs = qs.for_serializer(user)
         return qs
 
-
     def perform_create(self, serializer):
         instance = serializer.save()
         TaskHistory.objects.create(
@@ -297,34 +329,24 @@ class TaskViewSet(viewsets.ModelViewSet):
             return Response({'status': 'watched'})
 
     def perform_update(self, serializer):
-        from activity.models import AuditLog
-        from django.contrib.contenttypes.models import ContentType
-        
-        old_instance = self.get_object()
         new_instance = serializer.save()
         
-        # Track changes for audit log
+        # Track changes for audit log; the tracker diffed the save against the loaded row (projects.tracking)
         changes = {}
+        saved_changes = new_instance.saved_changes or {}
         for field in serializer.validated_data:
-            old_val = getattr(old_instance, field)
-            new_val = getattr(new_instance, field)
-            if old_val != new_val:
-                changes[field] = {
-                    'old': str(old_val),
-                    'new': str(new_val)
-                }
+            model_field = Task._meta.get_field(field)
+            if model_field.many_to_many or model_field.attname not in saved_changes:
+                continue
+            old_val, new_val = saved_changes[model_field.attname]
+            # Foreign keys are logged by id and named when the log is read
+            changes[field] = audit.change(old_val, new_val, model_field.related_model if model_field.many_to_one else None)
         
         if changes:
-            AuditLog.objects.create(
-                user=self.request.user,
-                action='UPDATE_TASK',
-                content_type=ContentType.objects.get_for_model(Task),
-                object_id=new_instance.id,
-                details=changes
-            )
+            audit.record('UPDATE_TASK', target=new_instance, details=changes)
             
-            # Populate TaskHistory for Agile reporting if status or story_points changed
-            if 'status' in changes or 'story_points' in changes:
+            # Populate TaskHistory for Agile reporting if status, story_points or sprint changed
+            if changes.keys() & {'status', 'story_points', 'sprint'}:
                 TaskHistory.objects.create(
                     task=new_instance,
                     status=new_instance.status,
@@ -380,14 +402,19 @@ class TaskViewSet(viewsets.ModelViewSet):
         elif operation == 'delete':
             queryset.delete()
         elif operation == 'update_status':
-            queryset.update(status=value)
+            with transaction.atomic():
+                # queryset.update() skips the signals that maintain ProjectTaskStats
+                stats.apply_bulk_status_change(queryset, value)
+                queryset.update(status=value)
+        # queryset.update() bypasses the signals that invalidate cached reports
+        report_cache.invalidate()
             
         return Response({'status': 'Bulk operation successful'})
 
     @action(detail=True, methods=['post'])
     def acknowledge(self, request, pk=None):
         task = self.get_object()
-        AuditLog.objects.create(user=request.user, action='ACKNOWLEDGE_TASK', content_object=task, details={})
+        audit.record('ACKNOWLEDGE_TASK', target=task)
         return Response({'status': 'acknowledged'})
 
     @action(detail=True, methods=['post'])
@@ -407,7 +434,7 @@ class TaskViewSet(viewsets.ModelViewSet):
             task.due_date = timezone.now() + delta
         task.save()
         TaskHistory.objects.create(task=task, status=task.status, story_points=task.story_points, changed_by=request.user)
-        AuditLog.objects.create(user=request.user, action='SNOOZE_TASK', content_object=task, details={'duration': dur, 'unit': unit})
+        audit.record('SNOOZE_TASK', target=task, details={'duration': dur, 'unit': unit})
         return Response({'status': 'snoozed', 'due_date': task.due_date})
 
     @action(detail=True, methods=['post'])
@@ -416,7 +443,7 @@ class TaskViewSet(viewsets.ModelViewSet):
         task.status = 'DONE'
         task.save()
         TaskHistory.objects.create(task=task, status=task.status, story_points=task.story_points, changed_by=request.user)
-        AuditLog.objects.create(user=request.user, action='MARK_DONE_TASK', content_object=task, details={})
+        audit.record('MARK_DONE_TASK', target=task)
         return Response({'status': 'marked_done'})
 
 
@@ -0,0 +1,177 @@
+"""
+Pub/sub brokers for the event stream, chosen with the REALTIME_BROKER
+setting (a dotted path), like PUSH_BACKEND.
+
+A broker has a thread-safe `publish(room, message)` for the sync side of
+the app and `subscribe(rooms)`, an async context manager whose `get()`
+returns the next message (a JSON string), or None when `timeout` passes
+first. A subscriber that falls more than MAX_QUEUED messages behind has
+its backlog dropped and gets a single RESYNC message instead, telling the
+client to refetch.
+
+- InProcessBroker: asyncio queues in this process. Events only reach
+  streams served by the process that published them, so it suits a single
+  ASGI worker (or development).
+- RedisBroker: Redis pub/sub at REALTIME_REDIS_URL, for several workers or
+  servers; needs the `redis` package.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'realtime.broker.InProcessBroker'
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+MAX_QUEUED = 1000
+RESYNC = json.dumps({'type': 'resync'})
+
+
+class _Subscription:
+    def __init__(self, broker, rooms, max_queued):
+        self.broker = broker
+        self.rooms = frozenset(rooms)
+        self.max_queued = max_queued
+        self._overflowed = False
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.max_queued)
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self)
+
+    def put(self, message):
+        """Hand `message` to the subscriber's event loop; callable from any thread"""
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, message)
+        except RuntimeError:
+            # The loop has been closed; the stream is gone
+            self.broker._remove(self)
+
+    def _deliver(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._overflowed = True
+
+    async def get(self, timeout=None):
+        if self._overflowed:
+            self._overflowed = False
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            return RESYNC
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """Fans messages out to the subscriptions of this process"""
+
+    def __init__(self, max_queued=MAX_QUEUED):
+        self.max_queued = max_queued
+        self._rooms = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, room, message):
+        with self._lock:
+            subscriptions = list(self._rooms.get(room, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def subscribe(self, rooms):
+        return _Subscription(self, rooms, self.max_queued)
+
+    def subscriber_count(self, room):
+        return len(self._rooms.get(room, ()))
+
+    def _add(self, subscription):
+        with self._lock:
+            for room in subscription.rooms:
+                self._rooms[room].add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            for room in subscription.rooms:
+                subscribers = self._rooms.get(room)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._rooms[room]
+
+
+class LocmemBroker(InProcessBroker):
+    """InProcessBroker that also keeps (room, message) in `LocmemBroker.published`; for tests"""
+    published = []
+
+    def publish(self, room, message):
+        LocmemBroker.published.append((room, message))
+        super().publish(room, message)
+
+
+class _RedisSubscription:
+    def __init__(self, url, channels):
+        self.url = url
+        self.channels = channels
+
+    async def __aenter__(self):
+        from redis import asyncio as aioredis
+        self._client = aioredis.from_url(self.url)
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(*self.channels)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._pubsub.unsubscribe()
+        await self._pubsub.aclose()
+        await self._client.aclose()
+
+    async def get(self, timeout=None):
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        data = message['data']
+        return data.decode() if isinstance(data, bytes) else data
+
+
+class RedisBroker:
+    """Publishes to Redis channels named `realtime:<room>`"""
+    prefix = 'realtime:'
+
+    def __init__(self, url=None):
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured("RedisBroker requires the 'redis' package") from exc
+        self.url = url or getattr(settings, 'REALTIME_REDIS_URL', DEFAULT_REDIS_URL)
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, room, message):
+        self._client.publish(self.prefix + room, message)
+
+    def subscribe(self, rooms):
+        return _RedisSubscription(self.url, [self.prefix + room for room in rooms])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker; one instance, since subscriptions live in it"""
+    global _broker
+    path = getattr(settings, 'REALTIME_BROKER', DEFAULT_BROKER)
+    broker = _broker
+    if broker is None or broker[0] != path:
+        with _broker_lock:
+            if _broker is None or _broker[0] != path:
+                _broker = (path, import_string(path)())
+            broker = _broker
+    return broker[1]
@@ -0,0 +1,64 @@
+"""
+Publishing to the event stream.
+
+Rooms:
+- `project:<id>`: task and ticket changes of the project, and its chat
+  (including chat on its tasks);
+- `team:<id>`: the team's chat;
+- `user:<id>`: the user's notifications and their own tickets;
+- `tickets`: every ticket change, for ticket staff.
+
+Messages are JSON `{"room", "type", "data"}` with just enough in `data` for
+a client to patch its view or decide what to refetch. Inside a transaction
+they are published once it commits, so a rolled back change is never
+announced and a client refetching on the event sees the committed rows.
+"""
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .broker import get_broker
+
+logger = logging.getLogger(__name__)
+
+
+def project_room(project_id):
+    return f'project:{project_id}'
+
+
+def team_room(team_id):
+    return f'team:{team_id}'
+
+
+def user_room(user_id):
+    return f'user:{user_id}'
+
+
+TICKETS_ROOM = 'tickets'
+
+
+def _send(messages):
+    broker = get_broker()
+    for room, message in messages:
+        try:
+            broker.publish(room, message)
+        except Exception:
+            # Streams are a convenience: clients fall back to refetching, the change itself stands
+            logger.exception("Could not publish to %s", room)
+
+
+def publish(rooms, event_type, data):
+    """Publish an event to each of `rooms` (a room name or an iterable of them)"""
+    rooms = [rooms] if isinstance(rooms, str) else list(dict.fromkeys(rooms))
+    if not rooms:
+        return
+    messages = [
+        (room, json.dumps({'room': room, 'type': event_type, 'data': data}, cls=DjangoJSONEncoder))
+        for room in rooms
+    ]
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _send(messages))
+    else:
+        _send(messages)
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from collaboration.models import ChatMessage
+from projects.models import Task
+from tickets.models import Ticket
+from . import events
+
+
+def _changed(instance):
+    return sorted(instance.saved_changes or ())
+
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, **kwargs):
+    events.publish(events.project_room(instance.project_id), 'task.created' if created else 'task.updated', {
+        'id': instance.id, 'project': instance.project_id, 'title': instance.title, 'status': instance.status,
+        'assigned_to': instance.assigned_to_id, 'changed': _changed(instance),
+    })
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, **kwargs):
+    events.publish(events.project_room(instance.project_id), 'task.deleted', {
+        'id': instance.id, 'project': instance.project_id,
+    })
+
+
+@receiver(post_save, sender=Ticket)
+def publish_ticket_saved(sender, instance, created, **kwargs):
+    rooms = [events.TICKETS_ROOM]
+    if instance.submitted_by_id:
+        rooms.append(events.user_room(instance.submitted_by_id))
+    if instance.assigned_to_id:
+        rooms.append(events.user_room(instance.assigned_to_id))
+    if instance.project_task_id:
+        project_id = Task.objects.filter(id=instance.project_task_id).values_list('project_id', flat=True).first()
+        if project_id:
+            rooms.append(events.project_room(project_id))
+    events.publish(rooms, 'ticket.created' if created else 'ticket.updated', {
+        'id': instance.id, 'ticket_number': instance.ticket_number, 'status': instance.status,
+        'assigned_to': instance.assigned_to_id, 'changed': _changed(instance),
+    })
+
+
+def _chat_room(message):
+    model = message.content_type.model
+    if model == 'project':
+        return events.project_room(message.object_id)
+    if model == 'team':
+        return events.team_room(message.object_id)
+    if model == 'task':
+        project_id = Task.objects.filter(id=message.object_id).values_list('project_id', flat=True).first()
+        return events.project_room(project_id) if project_id else None
+    return None
+
+
+@receiver(post_save, sender=ChatMessage)
+def publish_chat_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+    room = _chat_room(instance)
+    if room:
+        events.publish(room, 'chat.message', {
+            'id': instance.id, 'chat': f'{instance.content_type.model}:{instance.object_id}',
+            'sender': instance.sender_id, 'text': instance.text, 'created_at': instance.created_at,
+        })
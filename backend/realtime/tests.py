@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from collaboration.models import ChatMessage
+from notifications import dispatcher
+from projects.models import Project, Task
+from users.models import User
+from .broker import InProcessBroker, LocmemBroker, RESYNC, get_broker
+from .views import event_stream
+
+
+def published(room=None):
+    return [
+        json.loads(message) for published_room, message in LocmemBroker.published
+        if room is None or published_room == room
+    ]
+
+
+class BrokerTest(TestCase):
+    async def test_messages_reach_subscribers_of_the_room(self):
+        broker = InProcessBroker()
+        async with broker.subscribe(['project:1']) as subscription:
+            # Published from another thread, as sync views do under ASGI
+            for room in ('project:2', 'project:1'):
+                thread = threading.Thread(target=broker.publish, args=(room, f'"{room}"'))
+                thread.start()
+                thread.join()
+            self.assertEqual(await subscription.get(timeout=1), '"project:1"')
+            self.assertIsNone(await subscription.get(timeout=0.01))
+        self.assertEqual(broker.subscriber_count('project:1'), 0)
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        broker = InProcessBroker(max_queued=2)
+        async with broker.subscribe(['user:1']) as subscription:
+            for n in range(5):
+                broker.publish('user:1', str(n))
+            await asyncio.sleep(0)
+            self.assertEqual(await subscription.get(timeout=1), RESYNC)
+            self.assertIsNone(await subscription.get(timeout=0.01))
+
+
+@override_settings(REALTIME_BROKER='realtime.broker.LocmemBroker')
+class RealtimeEventsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        LocmemBroker.published = []
+        self.user = User.objects.create_user(username='streamer', password='pw', role='MEMBER')
+        self.other = User.objects.create_user(username='outsider', password='pw', role='MEMBER')
+        self.project = Project.objects.create(name='Board', created_by=self.user)
+        self.room = f'project:{self.project.id}'
+
+    def test_task_and_chat_events_are_published_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(project=self.project, title='Ship', status='TODO')
+            task.status = 'IN_PROGRESS'
+            task.save()
+            ChatMessage.objects.create(
+                sender=self.user, content_type=ContentType.objects.get_for_model(Task), object_id=task.id, text='hi',
+            )
+            self.assertEqual(LocmemBroker.published, [])
+        events = published(self.room)
+        self.assertEqual([event['type'] for event in events], ['task.created', 'task.updated', 'chat.message'])
+        self.assertEqual(events[1]['data']['changed'], ['status'])
+        self.assertEqual(events[2]['data']['chat'], f'task:{task.id}')
+
+    def test_rolled_back_changes_are_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Task.objects.create(project=self.project, title='Draft', status='TODO')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(published(), [])
+
+    def test_new_alerts_are_announced_to_the_recipient(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatcher.notify(self.user, 'TASK_ASSIGNED', 'Assigned', 'You have a task')
+        self.assertEqual(
+            [(event['type'], event['data']) for event in published(f'user:{self.user.id}')],
+            [('notification.created', {'kind': 'alerts', 'count': 1})],
+        )
+
+    def token(self, user):
+        return str(RefreshToken.for_user(user).access_token)
+
+    async def test_stream_delivers_room_events(self):
+        response = await self.async_client.get(
+            '/api/realtime/stream/', {'rooms': self.room, 'token': self.token(self.user)},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await asyncio.wait_for(anext(content), 1)).startswith(b'retry:'))
+            get_broker().publish(self.room, '{"type": "task.updated"}')
+            self.assertEqual(await asyncio.wait_for(anext(content), 1), b'data: {"type": "task.updated"}\n\n')
+        finally:
+            await content.aclose()
+
+    async def test_stream_rejects_rooms_of_other_users(self):
+        response = await self.async_client.get(
+            '/api/realtime/stream/', {'rooms': f'{self.room},user:{self.user.id}', 'token': self.token(self.other)},
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(json.loads(response.content)['rooms'], [self.room, f'user:{self.user.id}'])
+        response = await self.async_client.get('/api/realtime/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_heartbeat_when_idle(self):
+        content = event_stream([self.room], heartbeat=0.01)
+        try:
+            await anext(content)
+            self.assertEqual(await anext(content), ': keepalive\n\n')
+        finally:
+            await content.aclose()
+
+    async def test_stream_closes_when_access_is_revoked(self):
+        await sync_to_async(self.project.members.add)(self.other)
+        content = event_stream([f'user:{self.other.id}', self.room], heartbeat=0.01, user_id=self.other.id)
+        try:
+            await anext(content)
+            self.assertEqual(await anext(content), ': keepalive\n\n')
+            await sync_to_async(self.project.members.remove)(self.other)
+            await asyncio.sleep(0.02)
+            get_broker().publish(self.room, '{"type": "task.updated"}')
+            # The queued event of the revoked room is not delivered
+            message = await asyncio.wait_for(anext(content), 1)
+            self.assertEqual(json.loads(message.removeprefix('data: ')), {'type': 'revoked', 'rooms': [self.room]})
+            with self.assertRaises(StopAsyncIteration):
+                await anext(content)
+        finally:
+            await content.aclose()
@@ -0,0 +1,121 @@
+"""
+Server-Sent Events endpoint: `GET /api/realtime/stream/?rooms=project:1,team:2`.
+
+The stream always includes the caller's `user:<id>` room. Each event is a
+`data:` line holding the JSON message of realtime.events; a comment line is
+sent every REALTIME_HEARTBEAT seconds so proxies keep the connection open.
+Room access is checked again as often: once the caller may no longer join
+one of the rooms (or the account is deactivated), the stream sends a
+`{"type": "revoked", "rooms": [...]}` message and closes.
+Browsers' EventSource cannot set headers, so the JWT may also be passed as
+`?token=`. The view is async and the stream holds no thread, which needs
+the ASGI application (core_api.asgi); under WSGI it answers 501.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from projects import access
+from users.utils import user_role_in
+from .broker import get_broker
+from . import events
+
+DEFAULT_HEARTBEAT = 15
+# Reconnect delay sent to EventSource, in milliseconds
+RETRY_MS = 3000
+MAX_ROOMS = 50
+TICKET_STAFF_ROLES = ['ADMIN', 'DEVELOPER', 'PROJECT_MANAGER']
+
+
+def _authenticate(request):
+    token = request.GET.get('token')
+    if token and 'HTTP_AUTHORIZATION' not in request.META:
+        request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+def _can_join(user, room):
+    kind, _, key = room.partition(':')
+    if room == events.TICKETS_ROOM:
+        return user_role_in(user, TICKET_STAFF_ROLES)
+    if not key.isdigit():
+        return False
+    if kind == 'user':
+        return int(key) == user.pk
+    if kind == 'project':
+        return int(key) in access.accessible_project_ids(user)
+    if kind == 'team':
+        return user.teams.filter(id=int(key)).exists()
+    return False
+
+
+def _revoked(user_id, rooms):
+    """Rooms of an open stream the user may no longer join"""
+    user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return list(rooms)
+    return [room for room in rooms if not _can_join(user, room)]
+
+
+def _open(request):
+    """(user, rooms to subscribe to, None) or (None, None, error response)"""
+    user = _authenticate(request)
+    if user is None:
+        return None, None, JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    rooms = [room for room in request.GET.get('rooms', '').split(',') if room]
+    if len(rooms) > MAX_ROOMS:
+        return None, None, JsonResponse({'detail': f'At most {MAX_ROOMS} rooms per stream.'}, status=400)
+    denied = [room for room in rooms if not _can_join(user, room)]
+    if denied:
+        return None, None, JsonResponse({'detail': 'Cannot join these rooms.', 'rooms': denied}, status=403)
+    return user, [events.user_room(user.pk)] + rooms, None
+
+
+async def event_stream(rooms, heartbeat=None, user_id=None):
+    """
+    SSE lines for the messages published to `rooms`, until the client
+    disconnects or, with `user_id`, the user loses access to one of them
+    """
+    heartbeat = heartbeat or getattr(settings, 'REALTIME_HEARTBEAT', DEFAULT_HEARTBEAT)
+    loop = asyncio.get_running_loop()
+    async with get_broker().subscribe(rooms) as subscription:
+        yield f'retry: {RETRY_MS}\n\n'
+        check_at = loop.time() + heartbeat
+        while True:
+            message = await subscription.get(timeout=heartbeat)
+            if user_id is not None and loop.time() >= check_at:
+                # Checked before handing out the message, which may belong to a revoked room
+                revoked = await sync_to_async(_revoked)(user_id, rooms)
+                if revoked:
+                    yield f'data: {json.dumps({"type": "revoked", "rooms": revoked})}\n\n'
+                    return
+                check_at = loop.time() + heartbeat
+            yield ': keepalive\n\n' if message is None else f'data: {message}\n\n'
+
+
+async def stream(request):
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'The event stream is only served by the ASGI application.'}, status=501)
+    user, rooms, error = await sync_to_async(_open)(request)
+    if error is not None:
+        return error
+    response = StreamingHttpResponse(event_stream(rooms, user_id=user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,33 @@
+"""
+Response cache for the report endpoints.
+
+Entries are keyed by user and a shared "data version" that is bumped whenever
+tasks, sprints, projects or project/team membership change (see reports.signals), so a
+cached report is never served after the data behind it moved. The version is
+kept in the database (projects.sequences) so a change made through any
+process reaches the entries cached by every other one.
+"""
+from django.core.cache import cache
+
+from projects import sequences
+
+VERSION_NAME = 'version:report-data'
+TIMEOUT = 60 * 15
+
+
+def data_version():
+    return sequences.version(VERSION_NAME)
+
+
+def invalidate():
+    sequences.bump_version(VERSION_NAME)
+
+
+def cached_for_user(name, user, compute, *args):
+    """Return `compute()` for this report/user/args, reusing the cached value while data is unchanged"""
+    key = ':'.join(['reports', name, str(user.pk), str(data_version()), *map(str, args)])
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, TIMEOUT)
+    return value
@@ -0,0 +1,208 @@
+"""
+CSV and PDF report rendering.
+
+Used inline by ReportsViewSet for small exports and by the background job
+handlers in reports.jobs for large ones. Renderers take an optional
+`progress(done, total)` callback so the worker can report progress.
+"""
+import csv
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+
+from projects.models import Project, Task
+from projects import access, stats
+
+REPORT_TYPES = ('tasks', 'projects', 'workload')
+FORMATS = ('csv', 'pdf')
+# Rows fetched per database round trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+# Progress is reported every this many rows
+PROGRESS_EVERY = 1000
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def projects_with_counters(user):
+    """User's projects with the ProjectTaskStats rollup and member count loaded"""
+    return access.accessible_projects(user).select_related('task_counters').with_member_count()
+
+
+def _report_tasks(user, project_id=None):
+    tasks = access.filter_accessible(Task.objects.all(), user)
+    if project_id:
+        tasks = tasks.filter(project_id=project_id)
+    return tasks
+
+
+def estimate_rows(report_type, user, project_id=None):
+    """Number of data rows a report will contain, used to decide whether to run it in the background"""
+    if report_type == 'tasks':
+        return _report_tasks(user, project_id).count()
+    if report_type == 'projects':
+        return len(access.accessible_project_ids(user))
+    # Workload is one row per assignee
+    return 0
+
+
+def csv_rows(report_type, user, project_id=None):
+    """Yield the header and rows of a CSV report, streaming querysets in chunks"""
+    if report_type == 'tasks':
+        # Export tasks
+        tasks = _report_tasks(user, project_id)
+
+        yield ['ID', 'Title', 'Project', 'Status', 'Priority', 'Assigned To', 'Due Date', 'Story Points']
+        rows = tasks.order_by('id').values_list(
+            'id', 'title', 'project__name', 'status', 'priority',
+            'assigned_to__username', 'due_date', 'story_points'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for task_id, title, project_name, status, priority, assignee, due_date, story_points in rows:
+            yield [
+                task_id,
+                title,
+                project_name,
+                status,
+                priority,
+                assignee or 'Unassigned',
+                due_date.strftime('%Y-%m-%d') if due_date else '',
+                story_points
+            ]
+
+    elif report_type == 'projects':
+        # Export projects
+        projects = projects_with_counters(user)
+        yield ['ID', 'Name', 'Status', 'Start Date', 'End Date', 'Total Tasks', 'Completed Tasks', 'Members']
+        for project in projects.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            counters = stats.counters_for(project)
+            yield [
+                project.id,
+                project.name,
+                project.status,
+                project.start_date.strftime('%Y-%m-%d'),
+                project.end_date.strftime('%Y-%m-%d') if project.end_date else '',
+                counters.total,
+                counters.done,
+                project.member_count
+            ]
+
+    elif report_type == 'workload':
+        # Export workload
+        projects = access.accessible_projects(user)
+        if project_id:
+            projects = projects.filter(id=project_id)
+
+        distribution = Task.objects.filter(project__in=projects).exclude(assigned_to=None).values(
+            'assigned_to__username'
+        ).annotate(
+            total_tasks=Count('id'),
+            open_tasks=Count('id', filter=Q(status__in=['TODO', 'IN_PROGRESS'])),
+            total_points=Sum('story_points')
+        )
+
+        yield ['User', 'Total Tasks', 'Open Tasks', 'Total Story Points']
+        for item in distribution:
+            yield [
+                item['assigned_to__username'],
+                item['total_tasks'],
+                item['open_tasks'],
+                item['total_points'] or 0
+            ]
+
+
+def write_csv(fileobj, report_type, user, project_id=None, progress=None):
+    """Write a CSV report to a text file object; returns the number of data rows"""
+    total = estimate_rows(report_type, user, project_id) if progress else 0
+    writer = csv.writer(fileobj)
+    count = -1
+    for count, row in enumerate(csv_rows(report_type, user, project_id)):
+        writer.writerow(row)
+        if progress and count and count % PROGRESS_EVERY == 0:
+            progress(count, total)
+    return max(count, 0)
+
+
+def pdf_rows(report_type, user, project_id=None):
+    """Yield the header and rows of the PDF table"""
+    if report_type == 'tasks':
+        yield ['ID', 'Title', 'Status', 'Priority', 'Assigned To', 'Due Date']
+        rows = _report_tasks(user, project_id).order_by('id').values_list(
+            'id', 'title', 'status', 'priority', 'assigned_to__username', 'due_date'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for task_id, title, status, priority, assignee, due_date in rows:
+            yield [
+                str(task_id),
+                title[:30] + '...' if len(title) > 30 else title,
+                status,
+                priority,
+                assignee or 'Unassigned',
+                due_date.strftime('%Y-%m-%d') if due_date else '-'
+            ]
+
+    elif report_type == 'projects':
+        yield ['Name', 'Status', 'Start Date', 'Tasks', 'Progress']
+        for p in projects_with_counters(user).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            counters = stats.counters_for(p)
+            total = counters.total
+            done = counters.done
+            yield [
+                p.name,
+                p.status,
+                p.start_date.strftime('%Y-%m-%d') if p.start_date else '-',
+                f"{done}/{total}",
+                f"{int(done/total*100)}%" if total > 0 else "0%"
+            ]
+
+
+def render_pdf(fileobj, report_type, user, project_id=None, progress=None):
+    """Build a PDF report into a binary file object; returns the number of data rows"""
+    doc = SimpleDocTemplate(fileobj, pagesize=landscape(letter))
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Title
+    title_text = f"{report_type.title()} Report"
+    if project_id:
+        project_name = Project.objects.filter(id=project_id).values_list('name', flat=True).first()
+        if project_name:
+            title_text += f" - {project_name}"
+
+    elements.append(Paragraph(title_text, styles['Title']))
+    elements.append(Spacer(1, 20))
+
+    total = estimate_rows(report_type, user, project_id) if progress else 0
+    data = []
+    for row in pdf_rows(report_type, user, project_id):
+        data.append(row)
+        if progress and len(data) % PROGRESS_EVERY == 0:
+            progress(len(data) - 1, total)
+
+    # Create Table
+    if len(data) > 1:
+        table = Table(data)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.gray),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        elements.append(table)
+    else:
+        elements.append(Paragraph("No data found for this report.", styles['Normal']))
+
+    elements.append(Spacer(1, 20))
+    elements.append(Paragraph(f"Generated on {timezone.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
+
+    doc.build(elements)
+    return max(len(data) - 1, 0)
@@ -0,0 +1,62 @@
+"""BackgroundJob handlers that render large CSV/PDF exports into the private job files directory"""
+import os
+
+from django.urls import reverse
+
+from automation import jobs
+from automation.models import BackgroundJob
+from . import exports
+
+EXPORT_DIR = 'reports'
+
+
+def validate_parameters(params):
+    # Report type and format end up in the file name, and job parameters come from the API
+    report_type = params.get('report_type', 'tasks')
+    fmt = params.get('format', 'csv')
+    if report_type not in exports.REPORT_TYPES:
+        raise ValueError(f"Unknown report type: {report_type!r}")
+    if fmt not in exports.FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    project_id = params.get('project_id')
+    if project_id is not None and not str(project_id).isdigit():
+        raise ValueError(f"Invalid project id: {project_id!r}")
+
+
+def output_file(job):
+    """The export's path relative to JOB_FILES_ROOT"""
+    params = job.parameters
+    validate_parameters(params)
+    return f"{EXPORT_DIR}/{params.get('report_type', 'tasks')}_report_{job.id}.{params.get('format', 'csv')}"
+
+
+@jobs.register(BackgroundJob.JobType.DATA_EXPORT, validate=validate_parameters, output=output_file)
+@jobs.register(BackgroundJob.JobType.REPORT_GENERATION, validate=validate_parameters, output=output_file)
+def render_report(job, progress):
+    params = job.parameters
+    relative_path = output_file(job)
+    fmt = params.get('format', 'csv')
+    report_type = params.get('report_type', 'tasks')
+    if job.created_by is None:
+        raise ValueError("Report jobs need the requesting user")
+
+    path = jobs.file_path(relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Render to a temporary name so a half-written file is never served
+    partial = path + '.part'
+    try:
+        if fmt == 'pdf':
+            with open(partial, 'wb') as fileobj:
+                rows = exports.render_pdf(fileobj, report_type, job.created_by, params.get('project_id'), progress)
+        else:
+            with open(partial, 'w', newline='') as fileobj:
+                rows = exports.write_csv(fileobj, report_type, job.created_by, params.get('project_id'), progress)
+    except BaseException:
+        # Failed or cancelled (jobs.JobCancelled from progress())
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+
+    return {'url': reverse('background-jobs-download', args=[job.id]), 'rows': rows}
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from projects.models import Project, Task, Sprint
+from users.models import Team
+from . import cache as report_cache
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=Sprint)
+@receiver(post_delete, sender=Sprint)
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_report_cache(sender, **kwargs):
+    # After commit, so the shared version row is not held locked for the rest of the writer's transaction
+    transaction.on_commit(report_cache.invalidate)
+
+
+@receiver(m2m_changed, sender=Project.members.through)
+@receiver(m2m_changed, sender=Team.members.through)
+def invalidate_report_cache_on_membership(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(report_cache.invalidate)
@@ -1,3 +1,245 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from automation import jobs
+from automation.models import BackgroundJob
+from projects import access
+from projects.models import Project, Sequence, Sprint, Task, TaskHistory
+from . import cache as report_cache, exports
+from .jobs import render_report
+
+User = get_user_model()
+
+
+class SprintChartsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='scrum', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(name='Charts', created_by=self.user)
+        today = timezone.localdate()
+        self.sprint = Sprint.objects.create(
+            project=self.project, name='S1',
+            start_date=today - timedelta(days=2), end_date=today + timedelta(days=2),
+        )
+        self.tasks = [
+            Task.objects.create(project=self.project, sprint=self.sprint, title=f'T{i}', story_points=points)
+            for i, points in enumerate([3, 5, 8])
+        ]
+        self.complete(self.tasks[0], days_ago=2)
+        self.complete(self.tasks[1], days_ago=0)
+
+    def complete(self, task, days_ago):
+        entry = TaskHistory.objects.create(task=task, status='DONE', story_points=task.story_points)
+        TaskHistory.objects.filter(pk=entry.pk).update(changed_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_burndown(self):
+        resp = self.client.get(f'/api/reports/analytics/burndown/?sprint_id={self.sprint.pk}')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data['ideal']), 5)
+        self.assertEqual(resp.data['ideal'][0]['points'], 16)
+        self.assertEqual([row['points'] for row in resp.data['actual']], [13, 13, 8])
+
+    def test_burnup(self):
+        resp = self.client.get(f'/api/reports/analytics/burnup/?sprint_id={self.sprint.pk}')
+        self.assertEqual([row['completed'] for row in resp.data], [3, 3, 8])
+        self.assertTrue(all(row['total_scope'] == 16 for row in resp.data))
+
+    def test_cached_until_history_changes(self):
+        url = f'/api/reports/analytics/burnup/?sprint_id={self.sprint.pk}'
+        self.client.get(url)
+        # Sprint lookup, latest TaskHistory id and the data version only
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        self.complete(self.tasks[2], days_ago=0)
+        resp = self.client.get(url)
+        self.assertEqual(resp.data[-1]['completed'], 16)
+
+    def test_scope_follows_tasks_leaving_the_sprint(self):
+        url = f'/api/reports/analytics/burnup/?sprint_id={self.sprint.pk}'
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tasks[2].sprint = None
+            self.tasks[2].save()
+            self.tasks[1].delete()
+        resp = self.client.get(url)
+        self.assertTrue(all(row['total_scope'] == 3 for row in resp.data))
+
+
+class VelocityKPITest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='lead', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(name='Velocity', created_by=self.user)
+        self.project.members.add(self.user)
+        today = timezone.localdate()
+        for i, points in enumerate([[5, 3], [8], []]):
+            sprint = Sprint.objects.create(
+                project=self.project, name=f'S{i}', status='COMPLETED',
+                start_date=today - timedelta(days=30 - i), end_date=today - timedelta(days=20 - i),
+            )
+            for p in points:
+                Task.objects.create(project=self.project, sprint=sprint, title='done', status='DONE', story_points=p)
+        Task.objects.create(project=self.project, title='open', status='TODO', story_points=13)
+
+    def test_velocity(self):
+        resp = self.client.get(f'/api/reports/analytics/velocity/?project_id={self.project.pk}')
+        self.assertEqual(resp.data, [{'sprint': 'S0', 'points': 8}, {'sprint': 'S1', 'points': 8}, {'sprint': 'S2', 'points': 0}])
+
+    def test_kpis(self):
+        access.accessible_project_ids(self.user)
+        report_cache.data_version()
+        # The data version, then two aggregates, each after reading the user's access version
+        with self.assertNumQueries(5):
+            resp = self.client.get('/api/reports/analytics/kpis/')
+        self.assertEqual(resp.data['task_completion_rate']['value'], 75)
+        self.assertEqual(resp.data['average_velocity']['value'], 5)
+
+        # Served from cache until a task changes
+        with self.assertNumQueries(1):
+            self.client.get('/api/reports/analytics/kpis/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.filter(status='TODO').get().delete()
+        resp = self.client.get('/api/reports/analytics/kpis/')
+        self.assertEqual(resp.data['task_completion_rate']['value'], 100)
+
+        # Written by another process, which only moves the version in the database
+        Task.objects.filter(story_points=8).update(status='TODO')
+        Sequence.objects.filter(name=report_cache.VERSION_NAME).update(value=F('value') + 1)
+        resp = self.client.get('/api/reports/analytics/kpis/')
+        self.assertEqual(resp.data['task_completion_rate']['value'], 66)
+
+
+class CSVExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(name='Export', created_by=self.user)
+        self.project.members.add(self.user)
+
+    def test_tasks_export_streams_with_constant_queries(self):
+        Task.objects.bulk_create([
+            Task(project=self.project, title=f'T{i}', assigned_to=self.user if i % 2 else None)
+            for i in range(50)
+        ])
+        resp = self.client.get('/api/reports/analytics/export_csv/?type=tasks')
+        self.assertTrue(resp.streaming)
+        # The user's access version, then the rows
+        with self.assertNumQueries(2):
+            lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 51)
+        self.assertEqual(lines[1].split(',')[2:6], ['Export', 'TODO', 'MEDIUM', 'Unassigned'])
+        self.assertEqual(lines[2].split(',')[5], 'exporter')
+
+
+@override_settings(REPORTS_ASYNC_EXPORT_THRESHOLD=10)
+class BackgroundExportTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.user = User.objects.create_user(username='bulk', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(name='Bulk', created_by=self.user)
+        self.project.members.add(self.user)
+        Task.objects.bulk_create([Task(project=self.project, title=f'T{i}') for i in range(25)])
+
+    def test_large_exports_run_as_jobs(self):
+        for fmt in ('csv', 'pdf'):
+            resp = self.client.get(f'/api/reports/analytics/export_{fmt}/?type=tasks')
+            self.assertEqual(resp.status_code, 202)
+            job = BackgroundJob.objects.get(id=resp.data['job_id'])
+            self.assertEqual(job.parameters['format'], fmt)
+
+        with self.settings(JOB_FILES_ROOT=self.media.name):
+            self.assertEqual(jobs.run_pending(), 2)
+
+            for job in BackgroundJob.objects.all():
+                self.assertEqual(job.status, BackgroundJob.Status.COMPLETED, job.error_message)
+                self.assertEqual(job.progress_percentage, 100)
+                self.assertEqual(job.result['rows'], 25)
+                self.assertTrue(os.path.exists(jobs.output_path(job)))
+                resp = self.client.get(job.result['url'])
+                self.assertEqual(resp.status_code, 200)
+                self.assertIn('attachment', resp['Content-Disposition'])
+
+            # Only the job's owner (or an admin) can fetch the file
+            other = User.objects.create_user(username='other', password='pass', role='MEMBER')
+            self.client.force_authenticate(user=other)
+            self.assertEqual(self.client.get(job.result['url']).status_code, 404)
+
+    def test_unknown_report_types_are_rejected(self):
+        resp = self.client.get('/api/reports/analytics/export_csv/?type=../../x&async=1')
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+        # Job parameters are checked again by the handler
+        job = BackgroundJob.objects.create(
+            job_type=BackgroundJob.JobType.DATA_EXPORT, job_name='Evil', created_by=self.user,
+            parameters={'report_type': 'tasks', 'format': '../../x'},
+        )
+        with self.settings(JOB_FILES_ROOT=self.media.name), self.assertLogs('automation.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.Status.FAILED)
+        self.assertEqual(os.listdir(self.media.name), [])
+
+    def test_jobs_cannot_claim_files_of_other_jobs(self):
+        resp = self.client.get('/api/reports/analytics/export_csv/?type=tasks&async=1')
+        with self.settings(JOB_FILES_ROOT=self.media.name):
+            jobs.run_pending()
+            victim_file = f"reports/tasks_report_{resp.data['job_id']}.csv"
+            self.assertTrue(os.path.exists(os.path.join(self.media.name, victim_file)))
+
+            attacker = User.objects.create_user(username='attacker', password='pass', role='MEMBER')
+            self.client.force_authenticate(user=attacker)
+            resp = self.client.post('/api/automation/jobs/', {
+                'job_type': 'DATA_EXPORT', 'job_name': 'Mine', 'parameters': {'report_type': 'tasks', 'format': 'csv'},
+                'status': 'COMPLETED', 'result': {'file': victim_file}, 'progress_percentage': 100,
+            }, format='json')
+            self.assertEqual(resp.status_code, 201)
+            job = BackgroundJob.objects.get(id=resp.data['id'])
+            self.assertEqual((job.status, job.result, job.progress_percentage), ('PENDING', {}, 0))
+            BackgroundJob.objects.filter(id=job.id).update(status='COMPLETED', result={'file': victim_file})
+            self.assertEqual(self.client.get(f'/api/automation/jobs/{job.id}/download/').status_code, 404)
+
+            resp = self.client.post('/api/automation/jobs/', {
+                'job_type': 'DATA_EXPORT', 'job_name': 'Evil', 'parameters': {'report_type': '../x'},
+            }, format='json')
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn('parameters', resp.data)
+
+    def test_cancelled_export_leaves_no_partial_file(self):
+        job = BackgroundJob.objects.create(
+            job_type=BackgroundJob.JobType.DATA_EXPORT, job_name='Tasks', created_by=self.user,
+            parameters={'report_type': 'tasks', 'format': 'csv'},
+        )
+
+        def progress(done, total):
+            raise jobs.JobCancelled()
+
+        with self.settings(JOB_FILES_ROOT=self.media.name), mock.patch.object(exports, 'PROGRESS_EVERY', 5):
+            with self.assertRaises(jobs.JobCancelled):
+                render_report(job, progress)
+        self.assertEqual(os.listdir(os.path.join(self.media.name, 'reports')), [])
+
+    def test_small_exports_stay_inline(self):
+        Task.objects.filter(pk__in=list(Task.objects.values_list('pk', flat=True)[:20])).delete()
+        resp = self.client.get('/api/reports/analytics/export_pdf/?type=tasks')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+        self.assertFalse(BackgroundJob.objects.exists())
@@ -2,30 +2,49 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count, Q, Avg, F, Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Avg, F, Sum, Max
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
-from django.http import HttpResponse
-from datetime import timedelta
+from django.http import HttpResponse, StreamingHttpResponse
+from datetime import datetime, time, timedelta
 from projects.models import Project, Task, Sprint, TaskHistory
+from projects import access, stats
 from tickets.models import Ticket
+from . import cache as report_cache
+from automation.models import BackgroundJob
+from . import exports
 import csv
-import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+
+# Entries are keyed on the latest TaskHistory id, the timeout only bounds memory
+SPRINT_PROGRESS_CACHE_TIMEOUT = 60 * 60 * 24
+# Exports with more rows than this are rendered by the job worker (manage.py run_jobs);
+# override with settings.REPORTS_ASYNC_EXPORT_THRESHOLD
+ASYNC_EXPORT_THRESHOLD = 5000
+
 
 class ReportsViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
+    def _overdue_by_project(self, projects):
+        """{project_id: overdue open tasks}, computed with one grouped query"""
+        return dict(
+            Task.objects.filter(
+                project__in=projects.values('pk'),
+                status__in=['TODO', 'IN_PROGRESS'],
+                due_date__lt=timezone.now().date()
+            ).order_by().values('project_id').annotate(total=Count('id')).values_list('project_id', 'total')
+        )
+
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
         """Aggregate stats for the main dashboard"""
         user = request.user
         
         # Determine scope
-        projects = Project.objects.filter(members=user)
-        tasks = Task.objects.filter(project__in=projects)
+        projects = access.accessible_projects(user)
+        tasks = access.filter_accessible(Task.objects.all(), user)
         tickets = Ticket.objects.filter(Q(assigned_to=user) | Q(submitted_by=user))
         
         # KPI 1: Task Completion Rate (This Month)
@@ -47,13 +66,15 @@ class ReportsViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def project_health(self, request):
         """Health metrics for all projects"""
-        projects = Project.objects.filter(members=request.user)
+        projects = exports.projects_with_counters(request.user)
+        overdue_by_project = self._overdue_by_project(projects)
         data = []
         
         for project in projects:
-            total_tasks = project.tasks.count()
-            completed = project.tasks.filter(status='DONE').count()
-            overdue = project.tasks.filter(status__in=['TODO', 'IN_PROGRESS'], due_date__lt=timezone.now().date()).count()
+            counters = stats.counters_for(project)
+            total_tasks = counters.total
+            completed = counters.done
+            overdue = overdue_by_project.get(project.id, 0)
             
             progress = int((completed / total_tasks * 100)) if total_tasks > 0 else 0
             
@@ -70,27 +91,77 @@ class ReportsViewSet(viewsets.ViewSet):
                 'completed_tasks': completed,
                 'overdue_tasks': overdue,
                 'health': health,
-                'members': project.members.count()
+                'members': project.member_count
             })
             
         return Response(data)
 
-    @action(detail=False, methods=['get'])
-    def burndown(self, request):
-        """Data for burndown chart"""
+    def _sprint_progress(self, sprint):
+        """
+        Sprint scope and story points completed per day, as
+        (total_points, [(day, points), ...]) covering every sprint day up to today.
+
+        Computed with two aggregate queries and cached per sprint; the key
+        includes the latest TaskHistory id and the reports data version, so a
+        status change as well as a task deleted or moved out of the sprint
+        (which writes no history) starts a fresh entry.
+        """
+        today = timezone.localdate()
+        latest_history = TaskHistory.objects.aggregate(latest=Max('id'))['latest'] or 0
+        key = (
+            f'reports:sprint-progress:{sprint.pk}:{sprint.start_date}:{sprint.end_date}:'
+            f'{latest_history}:{report_cache.data_version()}:{today}'
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        total_points = Task.objects.filter(sprint=sprint).aggregate(total=Sum('story_points'))['total'] or 0
+
+        # Range on the raw column (not changed_at__date) so the lookup stays indexable
+        tz = timezone.get_current_timezone()
+        window_start = datetime.combine(sprint.start_date, time.min, tzinfo=tz)
+        window_end = datetime.combine(sprint.end_date + timedelta(days=1), time.min, tzinfo=tz)
+        completed = dict(
+            TaskHistory.objects.filter(
+                task__sprint=sprint,
+                status='DONE',
+                changed_at__gte=window_start,
+                changed_at__lt=window_end,
+            ).annotate(day=TruncDate('changed_at')).order_by().values('day')
+            .annotate(points=Sum('story_points')).values_list('day', 'points')
+        )
+
+        days = (sprint.end_date - sprint.start_date).days + 1
+        series = []
+        for i in range(days):
+            current_day = sprint.start_date + timedelta(days=i)
+            if current_day > today:
+                break
+            series.append((current_day, completed.get(current_day) or 0))
+
+        result = (total_points, series)
+        cache.set(key, result, SPRINT_PROGRESS_CACHE_TIMEOUT)
+        return result
+
+    def _get_sprint(self, request):
         sprint_id = request.query_params.get('sprint_id')
         if not sprint_id:
-            return Response({'error': 'sprint_id is required'}, status=400)
-            
+            return None, Response({'error': 'sprint_id is required'}, status=400)
         try:
-            sprint = Sprint.objects.get(id=sprint_id)
+            return Sprint.objects.get(id=sprint_id), None
         except Sprint.DoesNotExist:
-            return Response({'error': 'Sprint not found'}, status=404)
-            
-        # Get all tasks that were ever in this sprint
-        tasks = Task.objects.filter(sprint=sprint)
-        total_points = sum(t.story_points for t in tasks)
-        
+            return None, Response({'error': 'Sprint not found'}, status=404)
+
+    @action(detail=False, methods=['get'])
+    def burndown(self, request):
+        """Data for burndown chart"""
+        sprint, error = self._get_sprint(request)
+        if error:
+            return error
+
+        total_points, series = self._sprint_progress(sprint)
+
         # Calculate ideal burndown
         days = (sprint.end_date - sprint.start_date).days + 1
         ideal_line = []
@@ -99,56 +170,48 @@ class ReportsViewSet(viewsets.ViewSet):
                 'day': (sprint.start_date + timedelta(days=i)).strftime('%Y-%m-%d'),
                 'points': total_points - (total_points / (days - 1) * i) if days > 1 else 0
             })
-            
-        # Calculate actual burndown
+
+        # Actual burndown: remaining points after each day's completions
         actual_line = []
         current_points = total_points
-        
-        for i in range(days):
-            current_day = sprint.start_date + timedelta(days=i)
-            
-            completed_points = TaskHistory.objects.filter(
-                task__sprint=sprint,
-                status='DONE',
-                changed_at__date=current_day
-            ).aggregate(total=Sum('story_points'))['total'] or 0
-            
+        for day, completed_points in series:
             current_points -= completed_points
-            if current_day <= timezone.now().date():
-                actual_line.append({
-                    'day': current_day.strftime('%Y-%m-%d'),
-                    'points': max(0, current_points)
-                })
-            
+            actual_line.append({
+                'day': day.strftime('%Y-%m-%d'),
+                'points': max(0, current_points)
+            })
+
         return Response({
             'ideal': ideal_line,
             'actual': actual_line
         })
 
+    def _completed_sprint_points(self, sprints):
+        """[{'id', 'name', 'points'}] for completed sprints, summed in one grouped query"""
+        return list(
+            sprints.filter(status='COMPLETED').order_by('end_date').values('id', 'name').annotate(
+                points=Coalesce(Sum('tasks__story_points', filter=Q(tasks__status='DONE')), 0)
+            )
+        )
+
     @action(detail=False, methods=['get'])
     def velocity(self, request):
         """Average story points completed per sprint"""
         project_id = request.query_params.get('project_id')
         if not project_id:
             return Response({'error': 'project_id is required'}, status=400)
-            
-        sprints = Sprint.objects.filter(project_id=project_id, status='COMPLETED').order_by('end_date')
-        data = []
-        
-        for sprint in sprints:
-            completed_points = Task.objects.filter(sprint=sprint, status='DONE').aggregate(total=Sum('story_points'))['total'] or 0
-            data.append({
-                'sprint': sprint.name,
-                'points': completed_points
-            })
-            
-        return Response(data)
+
+        def compute():
+            rows = self._completed_sprint_points(Sprint.objects.filter(project_id=project_id))
+            return [{'sprint': row['name'], 'points': row['points']} for row in rows]
+
+        return Response(report_cache.cached_for_user('velocity', request.user, compute, project_id))
 
     @action(detail=False, methods=['get'])
     def workload(self, request):
         """Detailed workload by user"""
         project_id = request.query_params.get('project_id')
-        projects = Project.objects.filter(members=request.user)
+        projects = access.accessible_projects(request.user)
         if project_id:
             projects = projects.filter(id=project_id)
             
@@ -166,215 +229,80 @@ class ReportsViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def burnup(self, request):
         """Total scope vs completed scope over time"""
-        sprint_id = request.query_params.get('sprint_id')
-        if not sprint_id:
-            return Response({'error': 'sprint_id is required'}, status=400)
-            
-        try:
-            sprint = Sprint.objects.get(id=sprint_id)
-        except Sprint.DoesNotExist:
-            return Response({'error': 'Sprint not found'}, status=404)
-            
-        days = (sprint.end_date - sprint.start_date).days + 1
+        sprint, error = self._get_sprint(request)
+        if error:
+            return error
+
+        total_scope, series = self._sprint_progress(sprint)
         data = []
-        
-        total_scope = Task.objects.filter(sprint=sprint).aggregate(total=Sum('story_points'))['total'] or 0
         completed_acc = 0
-        
-        for i in range(days):
-            current_day = sprint.start_date + timedelta(days=i)
-            if current_day > timezone.now().date():
-                break
-                
-            completed_that_day = TaskHistory.objects.filter(
-                task__sprint=sprint,
-                status='DONE',
-                changed_at__date=current_day
-            ).aggregate(total=Sum('story_points'))['total'] or 0
-            
+        for day, completed_that_day in series:
             completed_acc += completed_that_day
             data.append({
-                'day': current_day.strftime('%Y-%m-%d'),
+                'day': day.strftime('%Y-%m-%d'),
                 'total_scope': total_scope,
                 'completed': completed_acc
             })
-            
+
         return Response(data)
     
+    def _export_in_background(self, request, report_type, project_id, fmt):
+        """Queue a BackgroundJob for a large export; returns a 202 response or None for small ones"""
+        if request.query_params.get('async') not in ('1', 'true'):
+            threshold = getattr(settings, 'REPORTS_ASYNC_EXPORT_THRESHOLD', ASYNC_EXPORT_THRESHOLD)
+            if exports.estimate_rows(report_type, request.user, project_id) <= threshold:
+                return None
+        job = BackgroundJob.objects.create(
+            job_type=BackgroundJob.JobType.REPORT_GENERATION if fmt == 'pdf' else BackgroundJob.JobType.DATA_EXPORT,
+            job_name=f"{report_type.title()} report ({fmt.upper()})",
+            parameters={'report_type': report_type, 'project_id': project_id, 'format': fmt},
+            created_by=request.user,
+        )
+        return Response({'job_id': job.id, 'status': job.status}, status=202)
+
     @action(detail=False, methods=['get'])
     def export_csv(self, request):
-        """Export reports to CSV"""
+        """Export reports to CSV, streamed row by row or queued as a job when large"""
         report_type = request.query_params.get('type', 'tasks')
         project_id = request.query_params.get('project_id')
-        
-        response = HttpResponse(content_type='text/csv')
+        if report_type not in exports.REPORT_TYPES:
+            return Response({'error': f"type must be one of: {', '.join(exports.REPORT_TYPES)}"}, status=400)
+
+        queued = self._export_in_background(request, report_type, project_id, 'csv')
+        if queued:
+            return queued
+
+        writer = csv.writer(exports.Echo())
+        rows = exports.csv_rows(report_type, request.user, project_id)
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
         response['Content-Disposition'] = f'attachment; filename="{report_type}_report.csv"'
-        
-        writer = csv.writer(response)
-        
-        if report_type == 'tasks':
-            # Export tasks
-            tasks = Task.objects.filter(project__members=request.user)
-            if project_id:
-                tasks = tasks.filter(project_id=project_id)
-            
-            writer.writerow(['ID', 'Title', 'Project', 'Status', 'Priority', 'Assigned To', 'Due Date', 'Story Points'])
-            for task in tasks:
-                writer.writerow([
-                    task.id,
-                    task.title,
-                    task.project.name,
-                    task.status,
-                    task.priority,
-                    task.assigned_to.username if task.assigned_to else 'Unassigned',
-                    task.due_date.strftime('%Y-%m-%d') if task.due_date else '',
-                    task.story_points
-                ])
-        
-        elif report_type == 'projects':
-            # Export projects
-            projects = Project.objects.filter(members=request.user)
-            writer.writerow(['ID', 'Name', 'Status', 'Start Date', 'End Date', 'Total Tasks', 'Completed Tasks', 'Members'])
-            for project in projects:
-                total_tasks = project.tasks.count()
-                completed = project.tasks.filter(status='DONE').count()
-                writer.writerow([
-                    project.id,
-                    project.name,
-                    project.status,
-                    project.start_date.strftime('%Y-%m-%d'),
-                    project.end_date.strftime('%Y-%m-%d') if project.end_date else '',
-                    total_tasks,
-                    completed,
-                    project.members.count()
-                ])
-        
-        elif report_type == 'workload':
-            # Export workload
-            projects = Project.objects.filter(members=request.user)
-            if project_id:
-                projects = projects.filter(id=project_id)
-            
-            distribution = Task.objects.filter(project__in=projects).exclude(assigned_to=None).values(
-                'assigned_to__username'
-            ).annotate(
-                total_tasks=Count('id'),
-                open_tasks=Count('id', filter=Q(status__in=['TODO', 'IN_PROGRESS'])),
-                total_points=Sum('story_points')
-            )
-            
-            writer.writerow(['User', 'Total Tasks', 'Open Tasks', 'Total Story Points'])
-            for item in distribution:
-                writer.writerow([
-                    item['assigned_to__username'],
-                    item['total_tasks'],
-                    item['open_tasks'],
-                    item['total_points'] or 0
-                ])
-        
         return response
-    
+
     @action(detail=False, methods=['get'])
     def export_pdf(self, request):
-        """Export reports to PDF"""
+        """Export reports to PDF, or queue it as a job when large"""
         report_type = request.query_params.get('type', 'tasks')
         project_id = request.query_params.get('project_id')
-        
+        if report_type not in exports.REPORT_TYPES:
+            return Response({'error': f"type must be one of: {', '.join(exports.REPORT_TYPES)}"}, status=400)
+
+        queued = self._export_in_background(request, report_type, project_id, 'pdf')
+        if queued:
+            return queued
+
         response = HttpResponse(content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{report_type}_report.pdf"'
-        
-        doc = SimpleDocTemplate(response, pagesize=landscape(letter))
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title
-        title_text = f"{report_type.title()} Report"
-        if project_id:
-            try:
-                project = Project.objects.get(id=project_id)
-                title_text += f" - {project.name}"
-            except Project.DoesNotExist:
-                pass
-        
-        elements.append(Paragraph(title_text, styles['Title']))
-        elements.append(Spacer(1, 20))
-        
-        data = []
-        
-        if report_type == 'tasks':
-            # Header
-            headers = ['ID', 'Title', 'Status', 'Priority', 'Assigned To', 'Due Date']
-            data.append(headers)
-            
-            # Content
-            tasks = Task.objects.filter(project__members=request.user).distinct()
-            if project_id:
-                tasks = tasks.filter(project_id=project_id)
-                
-            for task in tasks:
-                assignee = task.assigned_to.username if task.assigned_to else 'Unassigned'
-                due_date = task.due_date.strftime('%Y-%m-%d') if task.due_date else '-'
-                data.append([
-                    str(task.id),
-                    task.title[:30] + '...' if len(task.title) > 30 else task.title,
-                    task.status,
-                    task.priority,
-                    assignee,
-                    due_date
-                ])
-                
-        elif report_type == 'projects':
-            headers = ['Name', 'Status', 'Start Date', 'Tasks', 'Progress']
-            data.append(headers)
-            
-            projects = Project.objects.filter(members=request.user).distinct()
-            for p in projects:
-                total = p.tasks.count()
-                done = p.tasks.filter(status='DONE').count()
-                progress = f"{int(done/total*100)}%" if total > 0 else "0%"
-                start_date = p.start_date.strftime('%Y-%m-%d') if p.start_date else '-'
-                
-                data.append([
-                    p.name,
-                    p.status,
-                    start_date,
-                    f"{done}/{total}",
-                    progress
-                ])
-        
-        # Create Table
-        if len(data) > 1:
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.gray),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            elements.append(table)
-        else:
-            elements.append(Paragraph("No data found for this report.", styles['Normal']))
-            
-        elements.append(Spacer(1, 20))
-        elements.append(Paragraph(f"Generated on {timezone.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
-        
-        doc.build(elements)
+        exports.render_pdf(response, report_type, request.user, project_id)
         return response
 
     @action(detail=False, methods=['get'])
     def kpis(self, request):
         """Get Key Performance Indicators"""
-        user = request.user
-        projects = Project.objects.filter(members=user)
-        tasks = Task.objects.filter(project__in=projects)
-        
-        now = timezone.now()
-        start_of_week = now - timedelta(days=now.weekday())
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
+        return Response(report_cache.cached_for_user('kpis', request.user, lambda: self._compute_kpis(request.user)))
+
+    def _compute_kpis(self, user):
+        tasks = access.filter_accessible(Task.objects.all(), user)
+
         # Calculate KPIs
         kpis = {
             'task_completion_rate': {
@@ -402,27 +330,27 @@ class ReportsViewSet(viewsets.ViewSet):
                 'trend': 'neutral'
             }
         }
-        
+
+        done = Q(status='DONE')
+        done_with_due_date = done & Q(due_date__isnull=False)
+        counts = tasks.aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=done),
+            with_due_date=Count('id', filter=done_with_due_date),
+            on_time=Count('id', filter=done_with_due_date & Q(updated_at__lte=F('due_date'))),
+        )
+
         # Task Completion Rate
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(status='DONE').count()
-        if total_tasks > 0:
-            kpis['task_completion_rate']['value'] = int((completed_tasks / total_tasks) * 100)
-        
+        if counts['total'] > 0:
+            kpis['task_completion_rate']['value'] = int((counts['completed'] / counts['total']) * 100)
+
         # Average Velocity
-        completed_sprints = Sprint.objects.filter(project__in=projects, status='COMPLETED')
-        if completed_sprints.exists():
-            total_velocity = 0
-            for sprint in completed_sprints:
-                points = Task.objects.filter(sprint=sprint, status='DONE').aggregate(total=Sum('story_points'))['total'] or 0
-                total_velocity += points
-            kpis['average_velocity']['value'] = int(total_velocity / completed_sprints.count())
-        
+        sprint_points = self._completed_sprint_points(access.filter_accessible(Sprint.objects.all(), user))
+        if sprint_points:
+            kpis['average_velocity']['value'] = int(sum(row['points'] for row in sprint_points) / len(sprint_points))
+
         # On-Time Delivery
-        completed_with_due_date = tasks.filter(status='DONE', due_date__isnull=False)
-        if completed_with_due_date.exists():
-            on_time = completed_with_due_date.filter(updated_at__lte=F('due_date')).count()
-            kpis['on_time_delivery']['value'] = int((on_time / completed_with_due_date.count()) * 100)
-        
-        return Response(kpis)
+        if counts['with_due_date'] > 0:
+            kpis['on_time_delivery']['value'] = int((counts['on_time'] / counts['with_due_date']) * 100)
 
+        return kpis
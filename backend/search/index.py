@@ -0,0 +1,271 @@
+"""
+Full-text search index.
+
+Every searchable object is mirrored into a SearchDocument row (see
+search.signals); the database indexes `title`/`body` of those rows:
+
+- SQLite: an external-content FTS5 table maintained by triggers, ranked with bm25()
+- PostgreSQL: a GIN index on to_tsvector('simple', ...), ranked with ts_rank_cd()
+
+Other databases fall back to icontains over SearchDocument. Every query
+term is prefix-matched so partially typed words hit, and results are
+limited per entity type inside the database with ROW_NUMBER().
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from projects import access
+from projects.models import Project, Task
+from tickets.models import Ticket
+from knowledge.models import Document, WikiPage
+from users.models import User
+from .models import SearchDocument
+
+EntityType = SearchDocument.EntityType
+
+# Result order and per-type limits of the global search
+RESULT_LIMITS = {
+    EntityType.PROJECT: 5,
+    EntityType.TASK: 10,
+    EntityType.TICKET: 10,
+    EntityType.USER: 5,
+    EntityType.DOCUMENT: 5,
+    EntityType.WIKI: 5,
+}
+
+# ?type= values accepted by SearchViewSet.search
+SEARCH_TYPES = {
+    'projects': [EntityType.PROJECT],
+    'tasks': [EntityType.TASK],
+    'tickets': [EntityType.TICKET],
+    'users': [EntityType.USER],
+    'knowledge': [EntityType.DOCUMENT, EntityType.WIKI],
+}
+
+TOKEN_RE = re.compile(r'\w+')
+REBUILD_BATCH_SIZE = 1000
+
+
+# Documents
+
+def _project_enterprise(project):
+    return project.team.enterprise_id if project.team_id else None
+
+
+def _project_document(p):
+    return dict(
+        title=p.name, body=f"{p.key or ''} {p.description or ''}",
+        preview=p.description[:100] if p.description else '', url=f'/projects/{p.id}',
+        project_id=p.id, enterprise_id=_project_enterprise(p),
+    )
+
+
+def _task_document(t):
+    return dict(
+        title=t.title, body=t.description or '',
+        preview=f"{t.project.name} - {t.status}", url=f'/projects/{t.project_id}/tasks/{t.id}',
+        project_id=t.project_id, enterprise_id=_project_enterprise(t.project),
+    )
+
+
+def _ticket_document(t):
+    return dict(
+        title=f"{t.ticket_number}: {t.title}", body=f"{t.ticket_number} {t.description or ''}",
+        preview=t.status, url=f'/tickets/{t.id}',
+        owner_id=t.submitted_by_id, assignee_id=t.assigned_to_id,
+        enterprise_id=t.submitted_by.enterprise_id,
+    )
+
+
+def _user_document(u):
+    return dict(
+        title=u.username, body=f"{u.email} {u.first_name} {u.last_name}",
+        preview=u.email, url=f'/users/{u.id}',
+        is_public=True, enterprise_id=u.enterprise_id,
+    )
+
+
+def _document_document(d):
+    return dict(
+        title=d.title, body=d.description or '',
+        preview=d.file.name if d.file else '', url=f'/knowledge/documents/{d.id}',
+        owner_id=d.uploaded_by_id, is_public=d.is_public,
+        enterprise_id=d.uploaded_by.enterprise_id if d.uploaded_by_id else None,
+    )
+
+
+def _wiki_document(w):
+    return dict(
+        title=w.title, body=w.content or '',
+        preview=w.slug, url=f'/knowledge/wiki/{w.slug}',
+        owner_id=w.created_by_id, is_public=w.is_public,
+        enterprise_id=_project_enterprise(w.project) if w.project_id else (
+            w.created_by.enterprise_id if w.created_by_id else None
+        ),
+    )
+
+
+# model -> (entity type, document builder, queryset used by rebuild)
+INDEXED_MODELS = {
+    Project: (EntityType.PROJECT, _project_document, lambda: Project.objects.select_related('team')),
+    Task: (EntityType.TASK, _task_document, lambda: Task.objects.select_related('project__team')),
+    Ticket: (EntityType.TICKET, _ticket_document, lambda: Ticket.objects.select_related('submitted_by')),
+    User: (EntityType.USER, _user_document, lambda: User.objects.all()),
+    Document: (EntityType.DOCUMENT, _document_document, lambda: Document.objects.select_related('uploaded_by')),
+    WikiPage: (EntityType.WIKI, _wiki_document, lambda: WikiPage.objects.select_related('project__team', 'created_by')),
+}
+
+
+def _build(instance):
+    entity_type, builder, _ = INDEXED_MODELS[type(instance)]
+    fields = builder(instance)
+    fields['title'] = fields['title'][:255]
+    fields['preview'] = fields['preview'][:255]
+    return entity_type, fields
+
+
+def update(instance):
+    """Index or re-index a single object; returns its SearchDocument"""
+    entity_type, fields = _build(instance)
+    document, _ = SearchDocument.objects.update_or_create(entity_type=entity_type, object_id=instance.pk, defaults=fields)
+    return document
+
+
+def update_project_children(project):
+    """Refresh what task and wiki documents copy from their project: its name and enterprise"""
+    enterprise_id = _project_enterprise(project)
+    task_documents = SearchDocument.objects.filter(entity_type=EntityType.TASK, project_id=project.pk)
+    tasks = Task.objects.filter(project_id=project.pk)
+    # One UPDATE per status, since the preview is "<project name> - <status>"
+    for status in tasks.order_by().values_list('status', flat=True).distinct():
+        task_documents.filter(object_id__in=tasks.filter(status=status).values('id')).update(
+            preview=f"{project.name} - {status}"[:255], enterprise_id=enterprise_id,
+        )
+    SearchDocument.objects.filter(
+        entity_type=EntityType.WIKI, object_id__in=WikiPage.objects.filter(project_id=project.pk).values('id'),
+    ).update(enterprise_id=enterprise_id)
+
+
+def remove(instance):
+    """Drop an object from the index; returns (entity_type, object_id)"""
+    entity_type = INDEXED_MODELS[type(instance)][0]
+    SearchDocument.objects.filter(entity_type=entity_type, object_id=instance.pk).delete()
+    return entity_type, instance.pk
+
+
+def rebuild(models=None):
+    """Re-index every object of the given models (all indexed models by default); returns rows written"""
+    written = 0
+    for model in models or INDEXED_MODELS:
+        entity_type, _, queryset = INDEXED_MODELS[model]
+        SearchDocument.objects.filter(entity_type=entity_type).delete()
+        batch = []
+        for instance in queryset().iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch.append(SearchDocument(entity_type=entity_type, object_id=instance.pk, **_build(instance)[1]))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                written += len(SearchDocument.objects.bulk_create(batch))
+                batch = []
+        written += len(SearchDocument.objects.bulk_create(batch))
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO search_searchdocument_fts(search_searchdocument_fts) VALUES ('optimize')")
+    return written
+
+
+# Queries
+
+def _access_clause(user, project_ids):
+    sql = "(d.is_public OR d.owner_id = %s OR d.assignee_id = %s"
+    params = [user.pk, user.pk]
+    if project_ids:
+        sql += f" OR d.project_id IN ({', '.join(['%s'] * len(project_ids))})"
+        params += project_ids
+    return sql + ")", params
+
+
+def _limit_clause(entity_types):
+    cases = ' '.join(f"WHEN '{t}' THEN {RESULT_LIMITS[t]}" for t in entity_types)
+    return f"rn <= CASE entity_type {cases} END"
+
+
+def _ranked_ids(tokens, entity_types, user):
+    """ids of the best matching SearchDocuments the user may see, best first within each type"""
+    access_sql, access_params = _access_clause(user, sorted(access.accessible_project_ids(user)))
+    type_sql = ', '.join(['%s'] * len(entity_types))
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        inner = f"""
+            SELECT d.id, d.entity_type, bm25(search_searchdocument_fts, 10.0, 1.0) AS score
+            FROM search_searchdocument_fts
+            JOIN search_searchdocument d ON d.id = search_searchdocument_fts.rowid
+            WHERE search_searchdocument_fts MATCH %s AND d.entity_type IN ({type_sql}) AND {access_sql}
+        """
+        order = "score"
+    elif connection.vendor == 'postgresql':
+        match = ' & '.join(f'{token}:*' for token in tokens)
+        inner = f"""
+            SELECT d.id, d.entity_type,
+                   ts_rank_cd(to_tsvector('simple', d.title || ' ' || d.body), q) AS score
+            FROM search_searchdocument d, to_tsquery('simple', %s) q
+            WHERE to_tsvector('simple', d.title || ' ' || d.body) @@ q
+              AND d.entity_type IN ({type_sql}) AND {access_sql}
+        """
+        order = "score DESC"
+    else:
+        return None
+
+    sql = f"""
+        SELECT id, entity_type FROM (
+            SELECT id, entity_type, ROW_NUMBER() OVER (PARTITION BY entity_type ORDER BY {order}, id) AS rn
+            FROM ({inner}) matches
+        ) ranked
+        WHERE {_limit_clause(entity_types)}
+        ORDER BY entity_type, rn
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *entity_types, *access_params])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_documents(tokens, entity_types, user):
+    project_ids = sorted(access.accessible_project_ids(user))
+    visible = Q(is_public=True) | Q(owner_id=user.pk) | Q(assignee_id=user.pk) | Q(project_id__in=project_ids)
+    documents = []
+    for entity_type in entity_types:
+        qs = SearchDocument.objects.filter(visible, entity_type=entity_type)
+        for token in tokens:
+            qs = qs.filter(Q(title__icontains=token) | Q(body__icontains=token))
+        documents.extend(qs.order_by('id')[:RESULT_LIMITS[entity_type]])
+    return documents
+
+
+def search(query, user, search_type='all'):
+    """Ranked, permission-filtered results as dicts, grouped by entity type"""
+    tokens = TOKEN_RE.findall(query.lower())
+    entity_types = list(RESULT_LIMITS) if search_type == 'all' else SEARCH_TYPES.get(search_type, [])
+    if not tokens or not entity_types:
+        return []
+
+    ids = _ranked_ids(tokens, entity_types, user)
+    if ids is None:
+        documents = _fallback_documents(tokens, entity_types, user)
+    else:
+        by_id = SearchDocument.objects.in_bulk(ids)
+        documents = [by_id[pk] for pk in ids]
+
+    type_order = {t: i for i, t in enumerate(RESULT_LIMITS)}
+    documents.sort(key=lambda d: type_order[d.entity_type])  # stable: keeps rank order within a type
+    return [
+        {
+            'type': d.entity_type,
+            'id': str(d.object_id) if d.entity_type == EntityType.USER else d.object_id,
+            'title': d.title,
+            'preview': d.preview,
+            'url': d.url,
+        }
+        for d in documents
+    ]
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from search import index, suggest
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help="Only re-index these models, e.g. projects.Task tickets.Ticket",
+        )
+
+    def handle(self, *args, **options):
+        by_label = {model._meta.label_lower: model for model in index.INDEXED_MODELS}
+        models = []
+        for label in options['models']:
+            if label.lower() not in by_label:
+                raise CommandError(f"{label} is not indexed; choose from {', '.join(sorted(by_label))}")
+            models.append(by_label[label.lower()])
+
+        count = index.rebuild(models or None)
+        suggest.reset()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} search document(s)"))
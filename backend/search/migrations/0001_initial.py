@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('PROJECT', 'Project'), ('TASK', 'Task'), ('TICKET', 'Ticket'), ('USER', 'User'), ('DOCUMENT', 'Document'), ('WIKI', 'Wiki Page')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('preview', models.CharField(blank=True, max_length=255)),
+                ('url', models.CharField(max_length=255)),
+                ('project_id', models.BigIntegerField(blank=True, null=True)),
+                ('owner_id', models.BigIntegerField(blank=True, null=True)),
+                ('assignee_id', models.BigIntegerField(blank=True, null=True)),
+                ('is_public', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entity_type', 'object_id'), name='search_document_unique_object')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+SQLITE_CREATE = [
+    # External-content FTS5 table over SearchDocument; prefix indexes make typeahead queries cheap
+    """CREATE VIRTUAL TABLE search_searchdocument_fts USING fts5(
+        title, body,
+        content='search_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER search_searchdocument_fts_ai AFTER INSERT ON search_searchdocument BEGIN
+        INSERT INTO search_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER search_searchdocument_fts_ad AFTER DELETE ON search_searchdocument BEGIN
+        INSERT INTO search_searchdocument_fts(search_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER search_searchdocument_fts_au AFTER UPDATE ON search_searchdocument BEGIN
+        INSERT INTO search_searchdocument_fts(search_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS search_searchdocument_fts_au",
+    "DROP TRIGGER IF EXISTS search_searchdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS search_searchdocument_fts_ai",
+    "DROP TABLE IF EXISTS search_searchdocument_fts",
+]
+
+POSTGRES_CREATE = [
+    """CREATE INDEX search_searchdocument_tsv_idx ON search_searchdocument
+       USING GIN (to_tsvector('simple', title || ' ' || body))""",
+]
+POSTGRES_DROP = ["DROP INDEX IF EXISTS search_searchdocument_tsv_idx"]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}),
+            _run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchdocument',
+            name='enterprise_id',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,3 +1,45 @@
 from django.db import models
 
-# Create your models here.
+
+class SearchDocument(models.Model):
+    """
+    One row per searchable object, kept in sync by search.signals.
+
+    The database full-text index (FTS5 on SQLite, a tsvector GIN index on
+    PostgreSQL) is built over `title` and `body`; the remaining columns are
+    what the result list and the access check need, so a search never has
+    to touch the source tables.
+    """
+    class EntityType(models.TextChoices):
+        PROJECT = 'PROJECT', 'Project'
+        TASK = 'TASK', 'Task'
+        TICKET = 'TICKET', 'Ticket'
+        USER = 'USER', 'User'
+        DOCUMENT = 'DOCUMENT', 'Document'
+        WIKI = 'WIKI', 'Wiki Page'
+
+    entity_type = models.CharField(max_length=20, choices=EntityType.choices)
+    object_id = models.PositiveBigIntegerField()
+
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    preview = models.CharField(max_length=255, blank=True)
+    url = models.CharField(max_length=255)
+
+    # Access control: visible if public, owned/assigned to the user, or in one of their projects
+    project_id = models.BigIntegerField(null=True, blank=True)
+    owner_id = models.BigIntegerField(null=True, blank=True)
+    assignee_id = models.BigIntegerField(null=True, blank=True)
+    is_public = models.BooleanField(default=False)
+    # Partition key of the in-memory suggestion index (see search.suggest)
+    enterprise_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entity_type', 'object_id'], name='search_document_unique_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.entity_type} {self.object_id}: {self.title}"
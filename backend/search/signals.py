@@ -0,0 +1,31 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from projects.models import Project
+from . import index, suggest
+
+
+def update_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        document = index.update(instance)
+        transaction.on_commit(partial(suggest.document_saved, document))
+
+
+def remove_search_document(sender, instance, **kwargs):
+    removed = index.remove(instance)
+    transaction.on_commit(partial(suggest.document_removed, *removed))
+
+
+def update_project_children(sender, instance, created, raw=False, **kwargs):
+    changes = instance.saved_changes
+    # Unknown changes (an instance built by hand) are treated as a possible rename
+    if raw or created or (changes is not None and not {'name', 'team_id'} & changes.keys()):
+        return
+    index.update_project_children(instance)
+
+
+for model in index.INDEXED_MODELS:
+    post_save.connect(update_search_document, sender=model, dispatch_uid=f'search_update_{model._meta.label}')
+    post_delete.connect(remove_search_document, sender=model, dispatch_uid=f'search_remove_{model._meta.label}')
+post_save.connect(update_project_children, sender=Project, dispatch_uid='search_update_project_children')
@@ -0,0 +1,210 @@
+"""
+In-memory prefix index behind the search-as-you-type suggestions endpoint.
+
+Each process keeps one PrefixIndex per enterprise, built from the
+SearchDocument table: a sorted list of (word, document key) pairs searched
+with bisect, plus an LRU cache of recent prefixes. Writes in this process
+(search.signals) update the structures in place; every write also bumps a
+version kept in the database (projects.sequences), and an index built at an
+older version, i.e. one that missed a write made by another process, is
+rebuilt from SearchDocument on its next use. Steady-state lookups read only
+that version.
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict, namedtuple
+
+from projects import access, sequences
+from .index import RESULT_LIMITS, TOKEN_RE
+from .models import SearchDocument
+
+VERSION_NAME = 'version:search-suggest'
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Prefixes remembered per enterprise
+LRU_SIZE = 256
+# Candidates ranked per prefix before permission filtering
+CANDIDATE_LIMIT = 200
+
+Suggestion = namedtuple('Suggestion', [
+    'entity_type', 'object_id', 'title', 'url', 'project_id', 'owner_id', 'assignee_id', 'is_public',
+])
+SUGGESTION_FIELDS = list(Suggestion._fields)
+TYPE_ORDER = {entity_type: i for i, entity_type in enumerate(RESULT_LIMITS)}
+
+
+def _words(title):
+    return set(TOKEN_RE.findall(title.lower()))
+
+
+def _ranking(phrase):
+    """Sort key: titles starting with the typed phrase first, then by entity type and length"""
+    return lambda s: (not s.title.lower().startswith(phrase), TYPE_ORDER[s.entity_type], len(s.title), s.object_id)
+
+
+class PrefixIndex:
+    def __init__(self, suggestions=(), version=None):
+        self.version = version
+        self._docs = {}
+        self._words = []
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        for suggestion in suggestions:
+            self._docs[(suggestion.entity_type, suggestion.object_id)] = suggestion
+        self._words = sorted(
+            (word, key) for key, suggestion in self._docs.items() for word in _words(suggestion.title)
+        )
+
+    def add(self, suggestion):
+        key = (suggestion.entity_type, suggestion.object_id)
+        with self._lock:
+            self._discard(key)
+            self._docs[key] = suggestion
+            for word in _words(suggestion.title):
+                insort(self._words, (word, key))
+            self._lru.clear()
+
+    def remove(self, key):
+        with self._lock:
+            if self._discard(key):
+                self._lru.clear()
+
+    def _discard(self, key):
+        suggestion = self._docs.pop(key, None)
+        if suggestion is None:
+            return False
+        for word in _words(suggestion.title):
+            i = bisect_left(self._words, (word, key))
+            if i < len(self._words) and self._words[i] == (word, key):
+                del self._words[i]
+        return True
+
+    def candidates(self, query):
+        """Ranked suggestions whose title has a word starting with every query token"""
+        tokens = TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return []
+        cache_key = ' '.join(tokens)
+        with self._lock:
+            if cache_key in self._lru:
+                self._lru.move_to_end(cache_key)
+                return self._lru[cache_key]
+
+            # Scan the range of the longest token, then check the rest against each title
+            lead = max(tokens, key=len)
+            keys = set()
+            i = bisect_left(self._words, (lead,))
+            while i < len(self._words) and self._words[i][0].startswith(lead):
+                keys.add(self._words[i][1])
+                i += 1
+
+            matches = []
+            for key in keys:
+                suggestion = self._docs[key]
+                words = _words(suggestion.title)
+                if all(any(word.startswith(token) for word in words) for token in tokens):
+                    matches.append(suggestion)
+
+            matches.sort(key=_ranking(' '.join(tokens)))
+            result = matches[:CANDIDATE_LIMIT]
+
+            self._lru[cache_key] = result
+            if len(self._lru) > LRU_SIZE:
+                self._lru.popitem(last=False)
+            return result
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _shared_version():
+    return sequences.version(VERSION_NAME)
+
+
+def _bump_version():
+    return sequences.bump_version(VERSION_NAME)
+
+
+def _load(enterprise_id, version):
+    rows = SearchDocument.objects.filter(enterprise_id=enterprise_id).values_list(*SUGGESTION_FIELDS)
+    return PrefixIndex((Suggestion(*row) for row in rows.iterator(chunk_size=5000)), version=version)
+
+
+def index_for(enterprise_id, version=None):
+    """The enterprise's PrefixIndex, (re)built if missing or older than the shared version"""
+    if version is None:
+        version = _shared_version()
+    index = _indexes.get(enterprise_id)
+    if index is None or index.version != version:
+        with _indexes_lock:
+            index = _indexes.get(enterprise_id)
+            if index is None or index.version != version:
+                index = _indexes[enterprise_id] = _load(enterprise_id, version)
+    return index
+
+
+def _apply(change):
+    version = _bump_version()
+    for index in list(_indexes.values()):
+        change(index)
+        # Only an index at the version this increment started from is current. If another
+        # process bumped in between, its write is missing here, so the index is left to reload.
+        if index.version == version - 1:
+            index.version = version
+
+
+def document_saved(document):
+    suggestion = Suggestion(*(getattr(document, field) for field in SUGGESTION_FIELDS))
+    key = (suggestion.entity_type, suggestion.object_id)
+
+    _apply(lambda index: index.remove(key))
+    target = _indexes.get(document.enterprise_id)
+    if target is not None:
+        target.add(suggestion)
+
+
+def document_removed(entity_type, object_id):
+    _apply(lambda index: index.remove((entity_type, object_id)))
+
+
+def reset():
+    """Forget every in-memory index, e.g. after rebuild_search_index"""
+    with _indexes_lock:
+        _indexes.clear()
+    _bump_version()
+
+
+def suggestions(query, user, limit=DEFAULT_LIMIT):
+    """Top `limit` suggestions for a partially typed query that `user` may see"""
+    project_ids = access.accessible_project_ids(user)
+
+    def visible(s):
+        return (
+            s.is_public or user.pk in (s.owner_id, s.assignee_id)
+            or (s.project_id is not None and s.project_id in project_ids)
+        )
+
+    enterprise_ids = [user.enterprise_id] if user.enterprise_id is None else [user.enterprise_id, None]
+    version = _shared_version()
+    results = []
+    for enterprise_id in enterprise_ids:
+        found = 0
+        for s in index_for(enterprise_id, version).candidates(query):
+            if visible(s):
+                results.append(s)
+                found += 1
+                if found >= limit:
+                    break
+    if len(enterprise_ids) > 1:
+        results.sort(key=_ranking(' '.join(TOKEN_RE.findall(query.lower()))))
+
+    return [
+        {
+            'type': s.entity_type,
+            'id': str(s.object_id) if s.entity_type == SearchDocument.EntityType.USER else s.object_id,
+            'title': s.title,
+            'url': s.url,
+        }
+        for s in results[:limit]
+    ]
@@ -1,3 +1,166 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from projects.models import Project, Sequence, Task
+from tickets.models import Ticket
+from knowledge.models import WikiPage
+from projects import access
+from users.models import Enterprise, Team
+from . import index, suggest
+from .models import SearchDocument
+
+User = get_user_model()
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='finder', email='finder@example.com', password='pass', role='MEMBER')
+        self.other = User.objects.create_user(username='outsider', password='pass', role='MEMBER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.project = Project.objects.create(name='Payments Platform', description='Billing', created_by=self.user)
+        self.project.members.add(self.user)
+        self.hidden = Project.objects.create(name='Payments Secret', created_by=self.other)
+        self.task = Task.objects.create(project=self.project, title='Refactor payment gateway', description='Stripe webhooks')
+        Task.objects.create(project=self.project, title='Payment reports', description='Monthly payment payment summary')
+        Task.objects.create(project=self.hidden, title='Hidden payment work')
+
+    def search(self, q, **params):
+        resp = self.client.get('/api/search/search/', {'q': q, **params})
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_prefix_match_and_permissions(self):
+        results = self.search('paym')
+        titles = [r['title'] for r in results]
+        self.assertEqual(titles[0], 'Payments Platform')
+        self.assertIn('Refactor payment gateway', titles)
+        self.assertNotIn('Payments Secret', titles)
+        self.assertNotIn('Hidden payment work', titles)
+
+        task = next(r for r in results if r['id'] == self.task.id and r['type'] == 'TASK')
+        self.assertEqual(task['preview'], 'Payments Platform - TODO')
+        self.assertEqual(task['url'], f'/projects/{self.project.id}/tasks/{self.task.id}')
+
+    def test_all_terms_required_and_ranked(self):
+        self.assertEqual([r['title'] for r in self.search('stripe gate', type='tasks')], ['Refactor payment gateway'])
+        self.assertEqual(self.search('payment', type='tasks')[0]['title'], 'Payment reports')
+
+    def test_kept_in_sync(self):
+        self.task.title = 'Renamed ledger task'
+        self.task.save()
+        self.assertEqual([r['title'] for r in self.search('ledger')], ['Renamed ledger task'])
+        self.task.delete()
+        self.assertEqual(self.search('ledger'), [])
+
+    def test_project_rename_and_team_change_reach_task_documents(self):
+        enterprise = Enterprise.objects.create(name='Acme', domain='acme.example')
+        team = Team.objects.create(name='Core', enterprise=enterprise)
+        project = Project.objects.get(pk=self.project.pk)
+        project.name = 'Ledger Platform'
+        project.team = team
+        project.save()
+        task = next(r for r in self.search('gateway') if r['type'] == 'TASK')
+        self.assertEqual(task['preview'], 'Ledger Platform - TODO')
+        self.assertEqual(
+            set(SearchDocument.objects.filter(entity_type='TASK', project_id=project.pk).values_list('enterprise_id', flat=True)),
+            {enterprise.id},
+        )
+
+    def test_fallback_without_full_text_support(self):
+        # Databases other than SQLite and PostgreSQL use icontains over SearchDocument
+        with mock.patch.object(index, '_ranked_ids', return_value=None):
+            titles = [r['title'] for r in self.search('payment gate')]
+        self.assertEqual(titles, ['Refactor payment gateway'])
+
+    def test_tickets_wiki_and_users(self):
+        ticket = Ticket.objects.create(title='Printer broken', description='', submitted_by=self.user)
+        WikiPage.objects.create(title='Printer setup', slug='printer-setup', content='How to', created_by=self.other)
+        results = self.search('printer')
+        self.assertEqual([r['type'] for r in results], ['TICKET', 'WIKI'])
+        self.assertEqual(results[0]['title'], f'{ticket.ticket_number}: Printer broken')
+        self.assertEqual(self.search(ticket.ticket_number)[0]['id'], ticket.id)
+        self.assertEqual(self.search('outsid', type='users'), [{
+            'type': 'USER', 'id': str(self.other.id), 'title': 'outsider', 'preview': '', 'url': f'/users/{self.other.id}'
+        }])
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.search('gateway'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('gateway')), 1)
+        self.assertEqual(SearchDocument.objects.filter(entity_type='TASK').count(), 3)
+
+
+class SuggestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        suggest.reset()
+        self.enterprise = Enterprise.objects.create(name='Acme', domain='acme.test')
+        self.user = User.objects.create_user(username='typer', password='pass', role='MEMBER', enterprise=self.enterprise)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        team = Team.objects.create(name='Acme team', enterprise=self.enterprise)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project = Project.objects.create(name='Roadmap', created_by=self.user, team=team)
+            Task.objects.create(project=self.project, title='Road signs')
+            Task.objects.create(project=self.project, title='Paint the road')
+            Project.objects.create(name='Road secret', created_by=User.objects.create_user(username='x', password='p', role='MEMBER'))
+
+    def suggest(self, q, **params):
+        resp = self.client.get('/api/search/suggest/', {'q': q, **params})
+        self.assertEqual(resp.status_code, 200)
+        return [r['title'] for r in resp.data]
+
+    def test_prefix_ranking_and_permissions(self):
+        self.assertEqual(self.suggest('roa'), ['Roadmap', 'Road signs', 'Paint the road'])
+        self.assertEqual(self.suggest('pai ro'), ['Paint the road'])
+        self.assertEqual(self.suggest('roa', limit=1), ['Roadmap'])
+
+    def test_served_from_memory_and_updated_on_write(self):
+        self.suggest('roa')
+        access.accessible_project_ids(self.user)
+        # Only the index version and the user's access version are read
+        with self.assertNumQueries(2):
+            self.suggest('road')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(project=self.project, title='Roadblock review')
+        self.assertIn('Roadblock review', self.suggest('roadb'))
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        self.assertEqual(self.suggest('roadb'), [])
+
+    def test_write_from_another_process_is_not_masked(self):
+        self.suggest('roa')
+        other = SearchDocument.objects.create(
+            entity_type='PROJECT', object_id=999999, title='Roadshow', url='/projects/999999',
+            is_public=True, enterprise_id=self.enterprise.id,
+        )
+        bump = suggest._bump_version
+
+        def bump_after_other_process():
+            # Another process indexed `other` just before this process's increment
+            bump()
+            return bump()
+
+        with mock.patch.object(suggest, '_bump_version', bump_after_other_process):
+            with self.captureOnCommitCallbacks(execute=True):
+                Task.objects.create(project=self.project, title='Road works')
+        self.assertIn(other.title, self.suggest('roads'))
 
-# Create your tests here.
+        # A write only another process saw: its bump reaches this one through the database
+        SearchDocument.objects.create(
+            entity_type='PROJECT', object_id=999998, title='Roadside', url='/projects/999998',
+            is_public=True, enterprise_id=self.enterprise.id,
+        )
+        Sequence.objects.filter(name=suggest.VERSION_NAME).update(value=F('value') + 1)
+        self.assertIn('Roadside', self.suggest('roadsi'))
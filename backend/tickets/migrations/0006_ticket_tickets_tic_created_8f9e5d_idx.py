@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0018_task_projects_ta_created_e65fcb_idx'),
+        ('tickets', '0005_slapolicy_escalate_on_breach_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['created_at', 'id'], name='tickets_tic_created_8f9e5d_idx'),
+        ),
+    ]
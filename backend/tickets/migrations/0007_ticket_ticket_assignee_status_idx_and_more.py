@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0020_task_task_project_status_idx_and_more'),
+        ('tickets', '0006_ticket_tickets_tic_created_8f9e5d_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['assigned_to', 'status'], name='ticket_assignee_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['submitted_by', 'status'], name='ticket_submitter_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['sla_due_date'], name='ticket_sla_due_idx'),
+        ),
+    ]
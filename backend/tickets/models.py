@@ -1,11 +1,12 @@
 from django.db import models
 from django.conf import settings
 from projects.models import Task, Tag
+from projects import sequences
+from projects.tracking import FieldTracker
 from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericRelation
 from activity.models import Comment, Attachment, AuditLog
 import datetime
-import random
 
 class TicketQueue(models.Model):
     """Ticket queues for organization"""
@@ -59,7 +60,7 @@ class SLAPolicy(models.Model):
     def __str__(self):
         return f"{self.priority} SLA ({self.resolution_time_hours}h)"
 
-class Ticket(models.Model):
+class Ticket(FieldTracker, models.Model):
     class Category(models.TextChoices):
         BUG = 'BUG', 'Bug'
         FEATURE = 'FEATURE', 'Feature'
@@ -121,11 +122,21 @@ class Ticket(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # pagination keyset
+            # "My tickets" queues and SLA reminders
+            models.Index(fields=['assigned_to', 'status'], name='ticket_assignee_status_idx'),
+            models.Index(fields=['submitted_by', 'status'], name='ticket_submitter_status_idx'),
+            models.Index(fields=['sla_due_date'], name='ticket_sla_due_idx'),
+        ]
+
+    # Fields save() recomputes from status and the SLA
+    DERIVED_FIELDS = ('resolved_at', 'sla_breached', 'escalated', 'escalated_at', 'escalation_reason', 'escalated_to')
+
     def save(self, *args, **kwargs):
         if not self.ticket_number:
-            date_str = datetime.datetime.now().strftime('%Y%m%d')
-            rand_suffix = ''.join(random.choices('0123456789', k=4))
-            self.ticket_number = f"TKT-{date_str}-{rand_suffix}"
+            self.ticket_number = sequences.next_ticket_number()
             
         # Calculate SLA if this is a new ticket
         if not self.pk:
@@ -142,7 +153,11 @@ class Ticket(models.Model):
             if not self.sla_breached:
                 self.sla_breached = True
                 self.trigger_escalation()
-            
+
+        # Partial saves must also write the fields derived above
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *self.DERIVED_FIELDS}
+
         super().save(*args, **kwargs)
 
     def calculate_sla(self):
@@ -1,51 +1,32 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Ticket
-from activity.models import AuditLog
-from django.contrib.contenttypes.models import ContentType
+from audit import pipeline as audit
 
-@receiver(pre_save, sender=Ticket)
-def track_ticket_changes(sender, instance, **kwargs):
-    if instance.pk:
-        # Get the previous version of the ticket
-        previous = Ticket.objects.get(pk=instance.pk)
-        changes = {}
-        
-        # List of fields we want to track
-        fields_to_track = ['status', 'priority', 'assigned_to', 'category']
-        
-        for field in fields_to_track:
-            old_val = getattr(previous, field)
-            new_val = getattr(instance, field)
-            
-            # Handle ForeignKeys (assigned_to)
-            if field == 'assigned_to':
-                old_val = old_val.username if old_val else 'Unassigned'
-                new_val = new_val.username if new_val else 'Unassigned'
-            
-            if old_val != new_val:
-                changes[field] = {
-                    'old': str(old_val),
-                    'new': str(new_val)
-                }
-        
-        if changes:
-            # Create AuditLog entry
-            # Note: We can't easily get the current user here without middleware or passing it in
-            # For now, we'll mark it as a system action or handle user in the view
-            AuditLog.objects.create(
-                action="UPDATE",
-                content_type=ContentType.objects.get_for_model(Ticket),
-                object_id=instance.id,
-                details={'changes': changes}
-            )
+# Fields whose changes are written to the audit log
+TRACKED_FIELDS = ['status', 'priority', 'assigned_to_id', 'category']
+
+@receiver(post_save, sender=Ticket)
+def track_ticket_changes(sender, instance, created, **kwargs):
+    # Diffed in memory against the values the ticket was loaded with (projects.tracking)
+    if created or not instance.saved_changes:
+        return
+    changes = {}
+    for field in TRACKED_FIELDS:
+        if field not in instance.saved_changes:
+            continue
+        old_val, new_val = instance.saved_changes[field]
+        if field == 'assigned_to_id':
+            # Logged by user id and shown by username when read: a save should not query users
+            changes['assigned_to'] = audit.change(old_val, new_val, Ticket._meta.get_field('assigned_to').related_model)
+        else:
+            changes[field] = audit.change(old_val, new_val)
+
+    if changes:
+        # The acting user comes from the request's audit context
+        audit.record("UPDATE", target=instance, details={'changes': changes})
 
 @receiver(post_save, sender=Ticket)
 def log_ticket_creation(sender, instance, created, **kwargs):
     if created:
-        AuditLog.objects.create(
-            action="CREATE",
-            content_type=ContentType.objects.get_for_model(Ticket),
-            object_id=instance.id,
-            details={'message': f"Ticket {instance.ticket_number} created"}
-        )
+        audit.record("CREATE", target=instance, details={'message': f"Ticket {instance.ticket_number} created"})
@@ -2,6 +2,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from users.utils import user_role_in
+from audit import pipeline as audit
 from .models import Ticket
 from .serializers import TicketSerializer
 from projects.models import Task, Project
@@ -19,24 +20,12 @@ class TicketViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(submitted_by=self.request.user)
+        audit.flush()
 
     def perform_update(self, serializer):
-        # We can track changes here to have the user context
-        instance = serializer.save()
-        # The signal in signals.py will handle the data tracking, 
-        # but if we wanted to add the user to that log, we might need a different approach.
-        # For MVP, we'll let the signal run, but we'll manually update the last log 
-        # entry with the user if it was created in the same request.
-        from activity.models import AuditLog
-        from django.contrib.contenttypes.models import ContentType
-        last_log = AuditLog.objects.filter(
-            content_type=ContentType.objects.get_for_model(Ticket),
-            object_id=instance.id
-        ).order_by('-timestamp').first()
-        
-        if last_log and not last_log.user:
-            last_log.user = self.request.user
-            last_log.save()
+        serializer.save()
+        # Write the UPDATE event (actor taken from the request) before the response lists audit_logs
+        audit.flush()
 
     @action(detail=True, methods=['post'], url_path='convert-to-task')
     def convert_to_task(self, request, pk=None):
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0018_task_projects_ta_created_e65fcb_idx'),
+        ('timetracking', '0002_timeentry_is_billable_timeentry_is_manual_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeentry',
+            index=models.Index(fields=['created_at', 'id'], name='timetrackin_created_fe7875_idx'),
+        ),
+    ]
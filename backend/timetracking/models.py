@@ -19,6 +19,11 @@ class TimeEntry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # pagination keyset
+        ]
+
     def save(self, *args, **kwargs):
         # Auto-calculate duration if end_time is set
         if self.start_time and self.end_time and not self.is_running:
@@ -3,6 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from users.utils import user_role_in
+from projects import access
 from .models import TimeEntry, WorkSchedule, ResourceHoliday
 from .serializers import TimeEntrySerializer, WorkScheduleSerializer, ResourceHolidaySerializer
 from django.utils import timezone
@@ -18,7 +19,7 @@ class TimeEntryViewSet(viewsets.ModelViewSet):
         if user_role_in(user, ['ADMIN', 'PROJECT_MANAGER']):
             return TimeEntry.objects.all()
         # Allow users to see their own entries or entries for projects they are in
-        return TimeEntry.objects.filter(Q(user=user) | Q(project__members=user)).distinct()
+        return access.filter_accessible(TimeEntry.objects.all(), user, extra=Q(user=user))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
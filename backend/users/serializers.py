@@ -83,9 +83,13 @@ class TeamProjectSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'background_color', 'task_stats']
 
     def get_task_stats(self, obj):
-        tasks = obj.tasks.all()
-        total = tasks.count()
-        done = tasks.filter(status='DONE').count()
+        counters = getattr(obj, 'task_counters', None)
+        if counters is not None:
+            total, done = counters.total, counters.done
+        else:
+            tasks = obj.tasks.all()
+            total = tasks.count()
+            done = tasks.filter(status='DONE').count()
         percentage = (done / total * 100) if total > 0 else 0
         return {
             'total': total,
@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import UserSerializer, RegisterSerializer, TeamInviteSerializer, TeamSerializer, UserUpdateSerializer
 from .models import User, TeamInvite, Team
-from django.core.mail import send_mail
+from notifications.models import EmailAlert
 
 # Role model removed, using CharField
 
@@ -17,6 +17,14 @@ class TeamViewSet(viewsets.ModelViewSet):
     serializer_class = TeamSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    def get_queryset(self):
+        from django.db.models import Prefetch
+        from projects.models import Project
+        return Team.objects.select_related('lead').prefetch_related(
+            'members',
+            Prefetch('projects', queryset=Project.objects.select_related('task_counters')),
+        )
+
     def perform_create(self, serializer):
         team = serializer.save(lead=self.request.user)
         team.members.add(self.request.user)
@@ -24,35 +32,21 @@ class TeamViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def activity(self, request, pk=None):
         team = self.get_object()
-        # Ensure audit app is used if that's the intention, or activity app
-        # Assuming audit app for now since I created it. 
-        # But if activity app exists, use it. 
-        # I'll use explicit check or generic logic?
-        # The user view code referenced 'activity.models.AuditLog'.
-        # I'll check if AuditLog exists in activity later. For now, try import.
-        try:
-            from activity.models import AuditLog
-        except ImportError:
-            from audit.models import AuditLog
-            
+        from activity.models import AuditLog
+        from activity.serializers import readable_details, reference_names
+
         members = team.members.all()
-        # AuditLog from audit app uses 'actor', not 'user'
-        # AuditLog from activity app might use 'user'
-        # I'll assume standard AuditLog structure or try to adapt
-        try:
-            logs = AuditLog.objects.filter(actor__in=members).order_by('-timestamp')[:50]
-        except:
-             # Fallback if field is named user
-             logs = AuditLog.objects.filter(user__in=members).order_by('-timestamp')[:50]
-        
+        logs = list(AuditLog.objects.filter(user__in=members).select_related('user').order_by('-timestamp')[:50])
+        names = reference_names(logs)
+
         data = []
         for log in logs:
             data.append({
-                'user': log.actor.username if hasattr(log, 'actor') else log.user.username,
+                'user': log.user.username,
                 'action': log.action,
                 'timestamp': log.timestamp,
-                'details': getattr(log, 'changes', getattr(log, 'details', {})),
-                'object': str(log.target_object) if hasattr(log, 'target_object') else str(log.content_object)
+                'details': readable_details(log.details, names),
+                'object': str(log.content_object)
             })
         return Response(data)
 
@@ -92,12 +86,11 @@ class TeamInviteViewSet(viewsets.ModelViewSet):
         
         # Send invitation email
         join_link = f"http://localhost:5173/register?token={invite.token}"
-        send_mail(
+        # Queued for the delivery worker (manage.py deliver_notifications) instead of sent inline
+        EmailAlert.objects.create(
+            to_email=invite.email,
             subject='Invitation to Join Mbabali PMS',
-            message=f'You have been invited to join Mbabali PMS.\n\nRole: {role_name}\n\nClick the link to join:\n{join_link}',
-            from_email='noreply@mbabali.com',
-            recipient_list=[invite.email],
-            fail_silently=False
+            body=f'You have been invited to join Mbabali PMS.\n\nRole: {role_name}\n\nClick the link to join:\n{join_link}',
         )
 
     def get_queryset(self):
@@ -130,9 +123,11 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 class UserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+    # Lookup list behind the assignee/member pickers, which need every user
+    queryset = User.objects.order_by('username')
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = None
     filter_backends = [filters.SearchFilter]
     search_fields = ['username', 'email', 'first_name', 'last_name']
 
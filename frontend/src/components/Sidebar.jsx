@@ -47,7 +47,7 @@ const Sidebar = ({ isOpen, onClose, isMobile }) => {
 
     const fetchStarred = async () => {
         try {
-            const res = await api.get('/projects/projects/');
+            const res = await api.getAll('/projects/projects/');
             setStarredProjects(res.data.filter(p => p.is_starred));
         } catch (error) { console.error('Failed to fetch projects', error); }
     };
@@ -37,7 +37,7 @@ const TimerWidget = () => {
 
     const fetchRecentTasks = async () => {
         try {
-            const res = await api.get('/projects/tasks/');
+            const res = await api.getAll('/projects/tasks/');
             const tasks = res.data.filter(t => t.status !== 'DONE').slice(0, 5);
             setRecentTasks(tasks);
         } catch (error) { }
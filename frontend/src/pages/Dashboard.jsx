@@ -20,10 +20,10 @@ const Dashboard = () => {
         const fetchData = async () => {
             try {
                 const [tRes, pRes, tkRes, actRes] = await Promise.all([
-                    api.get('/tickets/tickets/'),
-                    api.get('/projects/projects/'),
-                    api.get('/projects/tasks/'),
-                    api.get('/activity/audit-logs/')
+                    api.getAll('/tickets/tickets/'),
+                    api.getAll('/projects/projects/'),
+                    api.getAll('/projects/tasks/'),
+                    api.get('/activity/audit-logs/?page_size=6')
                 ]);
                 setStats({
                     tickets: tRes.data.length,
@@ -32,7 +32,7 @@ const Dashboard = () => {
                 });
                 setRecentProjects(pRes.data.slice(0, 6));
                 setUpcomingTasks(tkRes.data.filter(t => t.status !== 'DONE').slice(0, 5));
-                setRecentActivity(actRes.data.slice(0, 6));
+                setRecentActivity(actRes.data);
             } catch (error) { console.error(error); }
         };
         fetchData();
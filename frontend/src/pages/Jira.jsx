@@ -92,7 +92,7 @@ const Jira = () => {
 
     const fetchTasks = async () => {
         try {
-            const res = await api.get('/projects/tasks/');
+            const res = await api.getAll('/projects/tasks/');
             setTasks(res.data);
         } catch (error) {
             console.error('Failed to fetch jira tasks', error);
@@ -103,7 +103,7 @@ const Jira = () => {
 
     const fetchProjects = async () => {
         try {
-            const res = await api.get('/projects/projects/');
+            const res = await api.getAll('/projects/projects/');
             setProjects(res.data);
             if (res.data.length > 0) {
                 setNewTaskData(prev => ({ ...prev, project: res.data[0].id }));
@@ -6,6 +6,7 @@ import useAuthStore from '../store/authStore';
 const Notifications = () => {
     const { user } = useAuthStore();
     const [notifications, setNotifications] = useState([]);
+    const [nextPage, setNextPage] = useState(null);
     const [rules, setRules] = useState([]);
     const [activeTab, setActiveTab] = useState('alerts'); // alerts, rules
     const [isLoading, setIsLoading] = useState(true);
@@ -19,6 +20,7 @@ const Notifications = () => {
         try {
             const res = await api.get('/notifications/alerts/');
             setNotifications(res.data);
+            setNextPage(res.pagination?.next ?? null);
             setIsLoading(false);
         } catch (error) {
             console.error('Failed to fetch notifications', error);
@@ -26,6 +28,16 @@ const Notifications = () => {
         }
     };
 
+    const loadMore = async () => {
+        try {
+            const res = await api.get(nextPage);
+            setNotifications(prev => [...prev, ...res.data]);
+            setNextPage(res.pagination?.next ?? null);
+        } catch (error) {
+            console.error('Failed to fetch notifications', error);
+        }
+    };
+
     const fetchRules = async () => {
         try {
             const res = await api.get('/notifications/rules/');
@@ -128,6 +140,13 @@ const Notifications = () => {
                                     </div>
                                 </div>
                             ))}
+                            {nextPage && (
+                                <div className="p-4 text-center">
+                                    <button onClick={loadMore} className="text-sm text-[#0052CC] font-medium hover:underline">
+                                        Load more
+                                    </button>
+                                </div>
+                            )}
                         </div>
                     )}
                 </div>
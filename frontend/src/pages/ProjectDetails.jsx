@@ -100,6 +100,7 @@ const ProjectDetails = () => {
     // Collaboration & Communication
     const [announcements, setAnnouncements] = useState([]);
     const [chatMessages, setChatMessages] = useState([]);
+    const [olderChatPage, setOlderChatPage] = useState(null);
     const [notifications, setNotifications] = useState([]);
     const [collaborateMode, setCollaborateMode] = useState('chat'); // chat, announcements, notifications
     const [newChatText, setNewChatText] = useState('');
@@ -114,7 +115,7 @@ const ProjectDetails = () => {
         try {
             const [projectRes, tasksRes, userRes, sprintRes, releaseRes, retrosRes, capacityRes, activityRes, announceRes, notifyRes] = await Promise.all([
                 api.get(`/projects/projects/${id}/`),
-                api.get(`/projects/tasks/?project_id=${id}`),
+                api.getAll(`/projects/tasks/?project_id=${id}`),
                 api.get('/users/list/'),
                 api.get(`/projects/sprints/?project_id=${id}`),
                 api.get(`/projects/releases/?project_id=${id}`),
@@ -185,6 +186,17 @@ const ProjectDetails = () => {
         try {
             const res = await api.get(`/collaboration/chat/?content_type=project&object_id=${id}`);
             setChatMessages(res.data);
+            setOlderChatPage(res.pagination?.next ?? null);
+        } catch (error) { console.error("Chat fetch error:", error); }
+    };
+
+    // Chat pages walk back from the newest message, so each older page goes
+    // in front of what is already shown
+    const loadOlderChatMessages = async () => {
+        try {
+            const res = await api.get(olderChatPage);
+            setChatMessages(prev => [...res.data, ...prev]);
+            setOlderChatPage(res.pagination?.next ?? null);
         } catch (error) { console.error("Chat fetch error:", error); }
     };
 
@@ -2139,6 +2151,13 @@ const ProjectDetails = () => {
                                             </div>
                                         </div>
                                         <div className="flex-1 overflow-y-auto p-6 space-y-6 custom-scrollbar" id="chat-stream">
+                                            {olderChatPage && (
+                                                <div className="text-center">
+                                                    <button onClick={loadOlderChatMessages} className="text-sm text-[#0052CC] font-medium hover:underline">
+                                                        Load earlier messages
+                                                    </button>
+                                                </div>
+                                            )}
                                             {chatMessages.map((msg, i) => {
                                                 const isMe = msg.sender === user?.id;
                                                 return (
@@ -22,7 +22,7 @@ const Projects = () => {
     const fetchData = async () => {
         try {
             const [projRes, catRes] = await Promise.all([
-                api.get('/projects/projects/'),
+                api.getAll('/projects/projects/'),
                 api.get('/projects/categories/')
             ]);
             setProjects(projRes.data);
@@ -58,8 +58,8 @@ const Settings = () => {
 
     const fetchActivity = async () => {
         try {
-            const res = await api.get('/activity/audit-logs/');
-            setRecentActivity(res.data.slice(0, 15));
+            const res = await api.get('/activity/audit-logs/?page_size=15');
+            setRecentActivity(res.data);
         } catch (e) {
             console.error('Failed to fetch activity', e);
         }
@@ -36,7 +36,7 @@ const TicketDetails = () => {
         try {
             const [uRes, pRes] = await Promise.all([
                 api.get('/users/list/'),
-                api.get('/projects/projects/')
+                api.getAll('/projects/projects/')
             ]);
             setUsers(uRes.data);
             setProjects(pRes.data);
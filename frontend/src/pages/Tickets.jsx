@@ -15,7 +15,7 @@ const Tickets = () => {
 
     const fetchTickets = async () => {
         try {
-            const res = await api.get('/tickets/tickets/');
+            const res = await api.getAll('/tickets/tickets/');
             setTickets(res.data);
         } catch (err) { console.error(err); }
     };
@@ -13,7 +13,16 @@ api.interceptors.request.use((config) => {
 });
 
 api.interceptors.response.use(
-    (response) => response,
+    (response) => {
+        // List endpoints are cursor-paginated ({ next, previous, results }).
+        // Hand callers the rows directly and keep the cursors on the response.
+        const data = response.data;
+        if (data && Array.isArray(data.results) && 'next' in data && 'previous' in data) {
+            response.pagination = { next: data.next, previous: data.previous };
+            response.data = data.results;
+        }
+        return response;
+    },
     (error) => {
         if (error.response?.status === 401) {
             localStorage.removeItem('token');
@@ -23,4 +32,21 @@ api.interceptors.response.use(
     }
 );
 
+// Fetch every page of a cursor-paginated list by following `next`; for views
+// that need the complete set (project pickers, boards, counts).
+api.getAll = async (url, config) => {
+    const response = await api.get(url, config);
+    const rows = [...response.data];
+    let next = response.pagination?.next;
+    while (next) {
+        // `next` is absolute and already carries the query string
+        const page = await api.get(next);
+        rows.push(...page.data);
+        next = page.pagination?.next;
+    }
+    response.data = rows;
+    response.pagination = { next: null, previous: null };
+    return response;
+};
+
 export default api;